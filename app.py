@@ -1,25 +1,261 @@
 import streamlit as st
-import openai
-from assistants import ASSISTANT_MAP
-from feedback_assistants import FEEDBACK_ASSISTANTS
-from patient_prompts import get_patient_prompt
+from case_registry import CaseRegistryLoader, CaseError
+from chat_backend import ASSISTANTS, make_backend, stream_text
+from run_poller import RunPoller, RunPollTimeout, retrieve_run
+from transcript import Transcript, FEEDBACK_TOKEN_BUDGET
+from feedback import FEEDBACK_DOMAINS, WHOLE, DOMAINS, feedback_requester
+from feedback_jobs import FeedbackJobQueue, QueueFull, QUEUED, DONE
+from feedback_cache import FeedbackCache
+from thread_pool import OpenAIThreadPool, create_thread
+from session_store import SessionStore
+from shared_state import SharedState
+from run_tracker import RunTracker, SUPERSEDED, SWITCHED, TIMED_OUT
+from openai_client import OpenAIConnectionPool, MAX_CONNECTIONS
+from metrics import REGISTRY as METRICS, COUNT_BUCKETS, start_metrics_server, start_log_dump
+from rate_limiter import RateLimiter, AdmissionTimeout, CHAT, FEEDBACK, POLL, PREGRADE, estimate_tokens
+from resilience import CircuitBreaker, CircuitOpen, RETRYABLE_ERRORS, call_with_retry, is_retryable
+from collections import deque
+from concurrent.futures import TimeoutError as FutureTimeout
+import os
+import queue
+import threading
 import time
+import uuid
 
 # Configuration
 MIN_MESSAGES_FOR_FEEDBACK = 5
-POLLING_INTERVAL = 2  # seconds - increased to reduce API calls
+POLLING_INTERVAL = 2  # seconds - ceiling for the shared poller's per-run backoff
 FEEDBACK_TIMEOUT = 180  # 3 minutes for feedback generation
 CHAT_TIMEOUT = 90  # 90 seconds for regular chat
+CANCEL_SETTLE_TIMEOUT = 10  # seconds to wait for a cancelled run to stop before posting to its thread
+STREAM_RESPONSES = True  # render patient replies token by token; falls back to polling
+CHAT_BACKEND = os.environ.get("VPE_CHAT_BACKEND", ASSISTANTS)  # "assistants" (threads and runs) or "completions"
+FEEDBACK_MODE = os.environ.get("VPE_FEEDBACK_MODE", WHOLE)  # "whole" (one run) or "domains" (a run per domain)
+FEEDBACK_STATUS_REFRESH = 2  # seconds between feedback job status checks
+CHAT_TAIL_LIMIT = 20  # messages the chat fragment re-renders before a full rerun folds them into the page
+FEEDBACK_CACHE_DIR = os.environ.get("VPE_FEEDBACK_CACHE_DIR")  # optional on-disk cache tier
+METRICS_PORT = os.environ.get("VPE_METRICS_PORT")  # serve Prometheus metrics on this port
+METRICS_LOG_INTERVAL = os.environ.get("VPE_METRICS_LOG_INTERVAL")  # seconds between JSON metric log dumps
+SESSION_DB = os.environ.get("VPE_SESSION_DB", "vpe_sessions.db")  # SQLite file interviews are kept in
+SHARED_STATE = os.environ.get("VPE_SHARED_STATE")  # SQLite file through which replicas share jobs, reports and threads
+ANALYTICS_CACHE = os.environ.get("VPE_ANALYTICS_CACHE")  # optional file that keeps cohort analytics between restarts
+LATENCY_HISTORY = 20  # turns kept in each session's latency breakdown
+REQUESTS_PER_MINUTE = int(os.environ.get("VPE_REQUESTS_PER_MINUTE", 3000))  # org request budget
+TOKENS_PER_MINUTE = int(os.environ.get("VPE_TOKENS_PER_MINUTE", 1000000))  # org token budget
+ADMISSION_TIMEOUT = {CHAT: 30, FEEDBACK: 120, POLL: 10, PREGRADE: 10}  # seconds a call may queue for admission
+CHAT_RUN_TOKENS = 1500  # persona instructions plus a patient reply, on top of the conversation
+FEEDBACK_RUN_TOKENS = 3000  # rubric instructions plus the report, on top of the transcript
+FEEDBACK_TRANSCRIPT_TOKENS = int(os.environ.get(  # transcript size beyond which older turns are condensed
+    "VPE_FEEDBACK_TRANSCRIPT_TOKENS", FEEDBACK_TOKEN_BUDGET))
+PREGRADE_ENABLED = os.environ.get("VPE_PREGRADE", "1") != "0"  # grade in the background once feedback is available
+PREGRADE_TOKEN_BUDGET = int(os.environ.get(  # estimated tokens each conversation may spend on background grading
+    "VPE_PREGRADE_TOKEN_BUDGET", 60000))
+PREGRADE_EVERY = int(os.environ.get("VPE_PREGRADE_EVERY", 3))  # patient replies between background grading passes
+VOICE_MAX_SESSIONS = int(os.environ.get("VPE_VOICE_MAX_SESSIONS", 20))  # voice interviews one process runs at once
+VOICE_LATENCY_TARGET = float(os.environ.get(  # seconds from end of speech to the patient's first audio
+    "VPE_VOICE_LATENCY_TARGET", 1.5))
+VOICE_POLL_INTERVAL = 0.25  # seconds between checks for a finished utterance
+STT_BACKEND = os.environ.get("VPE_STT_BACKEND", "openai")  # "openai" or "local" (stand-in for development)
+TTS_BACKEND = os.environ.get("VPE_TTS_BACKEND", "openai")  # "openai" or "local" (stand-in for development)
+TTS_VOICE = os.environ.get("VPE_TTS_VOICE", "alloy")  # OpenAI voice the patients speak with
+OPENAI_MAX_CONNECTIONS = int(os.environ.get(  # keep-alive connections to OpenAI, enough for every concurrent call
+    "VPE_OPENAI_MAX_CONNECTIONS", MAX_CONNECTIONS))
+
+
+class StreamUnavailable(Exception):
+    """Raised when a streamed chat run can't be used and polling must take over."""
+
+    def __init__(self, run_id=None):
+        super().__init__(run_id)
+        # Set when the run was already started, so polling resumes it instead of starting another
+        self.run_id = run_id
+
+
+def record_run_polls(outcome, polls):
+    """Record how many status checks a run needed."""
+    METRICS.observe("run_polls", polls, COUNT_BUCKETS, outcome=outcome)
+
+
+@st.cache_resource
+def get_openai_pool(api_key):
+    """Process-wide OpenAI connection pool, installed under the client every component calls through."""
+    return OpenAIConnectionPool(api_key, timeout=CHAT_TIMEOUT, max_connections=OPENAI_MAX_CONNECTIONS).install()
+
+
+@st.cache_resource
+def get_rate_limiter():
+    """Process-wide admission control shared by every session."""
+    return RateLimiter(REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)
+
+
+@st.cache_resource
+def get_circuit_breaker():
+    """Process-wide circuit breaker tracking OpenAI's health for every session."""
+    return CircuitBreaker()
+
+
+def admit_feedback_call(tokens=0):
+    """Admission for calls made by background feedback jobs."""
+    get_rate_limiter().admit(FEEDBACK, tokens, timeout=ADMISSION_TIMEOUT[FEEDBACK])
+
+
+class JobAdmission:
+    """
+    Admission for one feedback job's calls, at a priority that can be raised while the job runs.
+
+    A background grading pass starts at PREGRADE; once a student asks for the
+    report it is producing, escalate() moves its calls, including any already
+    waiting, up to FEEDBACK.
+    """
+    
+    def __init__(self, priority):
+        self.priority = priority
+    
+    def escalate(self, priority=FEEDBACK):
+        self.priority = min(self.priority, priority)
+    
+    def __call__(self, tokens=0):
+        priority = self.priority
+        try:
+            get_rate_limiter().admit(priority, tokens, timeout=ADMISSION_TIMEOUT[priority],
+                                     escalation=lambda: self.priority)
+        except AdmissionTimeout:
+            if self.priority == priority:
+                raise
+            # Escalated while waiting on the shorter budget; a student is waiting now, so allow theirs
+            get_rate_limiter().admit(self.priority, tokens, timeout=ADMISSION_TIMEOUT[self.priority])
+
+
+@st.cache_resource
+def start_metrics_export():
+    """Start the metrics endpoint and/or log dump once per process, if configured."""
+    if METRICS_PORT:
+        start_metrics_server(int(METRICS_PORT))
+    if METRICS_LOG_INTERVAL:
+        start_log_dump(float(METRICS_LOG_INTERVAL))
+    return True
+
+
+@st.cache_resource
+def get_run_poller():
+    """Process-wide run status poller shared by every session."""
+    limited_retrieve = get_rate_limiter().limited(retrieve_run, POLL, timeout=ADMISSION_TIMEOUT[POLL])
+    return RunPoller(
+        retrieve=METRICS.instrument("openai.runs.retrieve", get_circuit_breaker().guard(limited_retrieve)),
+        max_delay=POLLING_INTERVAL,
+        on_finish=record_run_polls,
+        # A poll that isn't admitted, is refused by the breaker or hits a blip is simply tried again later
+        transient_errors=(AdmissionTimeout, CircuitOpen) + RETRYABLE_ERRORS,
+    )
+
+
+@st.cache_resource
+def get_shared_state():
+    """State shared with the other replicas through VPE_SHARED_STATE, or None when this process serves alone."""
+    return SharedState(SHARED_STATE) if SHARED_STATE else None
+
+
+@st.cache_resource
+def get_feedback_queue():
+    """Process-wide feedback worker pool shared by every session."""
+    return FeedbackJobQueue(shared=get_shared_state())
+
+
+@st.cache_resource
+def get_feedback_cache():
+    """Process-wide feedback report cache shared by every session."""
+    return FeedbackCache(directory=FEEDBACK_CACHE_DIR, shared=get_shared_state())
+
+
+@st.cache_resource
+def get_chat_backend():
+    """Process-wide chat backend for this deployment, chosen with VPE_CHAT_BACKEND."""
+    return make_backend(CHAT_BACKEND)
+
+
+@st.cache_resource
+def get_run_tracker():
+    """Process-wide record of the chat runs every session has in flight."""
+    return RunTracker()
+
+
+@st.cache_resource
+def get_thread_pool():
+    """Process-wide pool of pre-created threads shared by every session."""
+    limited_create = get_rate_limiter().limited(create_thread, POLL, timeout=ADMISSION_TIMEOUT[POLL])
+    guarded_create = get_circuit_breaker().guard(limited_create)
+    return OpenAIThreadPool(create=METRICS.instrument("openai.threads.create", guarded_create),
+                            shared=get_shared_state())
+
+
+@st.cache_resource
+def get_session_store():
+    """Process-wide durable session store shared by every session."""
+    return SessionStore(SESSION_DB)
+
+
+@st.cache_resource
+def get_case_registry():
+    """Process-wide case registry, reloaded when the case data file changes."""
+    return CaseRegistryLoader()
+
+
+@st.cache_resource
+def get_encounter_log():
+    """Process-wide cohort analytics over the session store, ingested incrementally."""
+    # Imported here: pandas is only needed once an admin opens the analytics
+    from cohort_analytics import EncounterLog
+    return EncounterLog(SESSION_DB, cases=get_case_registry().current(), cache_path=ANALYTICS_CACHE)
+
+
+@st.cache_resource
+def get_voice_sessions():
+    """Process-wide set of voice interviews, capped at VOICE_MAX_SESSIONS."""
+    # Imported here: numpy and the audio pipeline are only needed once someone turns voice on
+    from voice import VoiceSessionRegistry
+    return VoiceSessionRegistry(VOICE_MAX_SESSIONS)
+
+
+def record_voice_latency(seconds):
+    """Record how long a student waited between finishing speaking and hearing the patient."""
+    outcome = "ok" if seconds <= VOICE_LATENCY_TARGET else "over_target"
+    METRICS.observe("operation_seconds", seconds, operation="voice.first_audio", outcome=outcome)
+
+
+def create_voice_session():
+    """Build a voice pipeline with this deployment's speech backends."""
+    from voice import VoiceSession, make_speech_to_text, make_text_to_speech
+    return VoiceSession(make_speech_to_text(STT_BACKEND), make_text_to_speech(TTS_BACKEND, TTS_VOICE),
+                        latency_target=VOICE_LATENCY_TARGET, on_latency=record_voice_latency)
+
 
 class VPEApp:
     def __init__(self):
+        # Per-operation durations of the turn in progress, if any
+        self.breakdown = None
+        # time.monotonic() after which the turn in progress starts no more retries
+        self.deadline = None
+        # SpokenReply the turn in progress streams its text into, when the student spoke
+        self.spoken_reply = None
+        # TrackedRun answering the turn in progress, once its message is posted
+        self.tracked_run = None
+        self.cases = self.load_cases()
         self.setup_openai()
         self.init_session_state()
+        start_metrics_export()
+    
+    def load_cases(self):
+        """Return the current case registry, stopping with an error if the case data is invalid."""
+        try:
+            return get_case_registry().current()
+        except CaseError as e:
+            st.error(f"Could not load the virtual patient cases: {e}")
+            st.stop()
     
     def setup_openai(self):
-        """Initialize OpenAI client with API key from secrets."""
+        """Connect OpenAI calls to the process-wide client, set up once with the API key from secrets."""
         try:
-            openai.api_key = st.secrets["OPENAI_API_KEY"]
+            self.openai_pool = get_openai_pool(st.secrets["OPENAI_API_KEY"])
         except KeyError:
             st.error("OpenAI API key not found in secrets. Please configure OPENAI_API_KEY.")
             st.stop()
@@ -29,17 +265,74 @@ class VPEApp:
     
     def init_session_state(self):
         """Initialize session state variables."""
+        if "session_token" not in st.session_state:
+            st.session_state.session_token = self.get_session_token()
+            self.restore_session()
+        elif get_session_store().version(st.session_state.session_token) > st.session_state.get("store_version", 0):
+            # Another replica (or tab) moved this session on since this one last saw it
+            self.restore_session()
         if "messages" not in st.session_state:
             st.session_state.messages = []
+        if "transcript" not in st.session_state:
+            st.session_state.transcript = Transcript.from_messages(st.session_state.messages)
         if "thread_id" not in st.session_state:
-            st.session_state.thread_id = self.create_thread()
+            # Created lazily when the first message is sent
+            st.session_state.thread_id = None
+        if "latency_breakdowns" not in st.session_state:
+            st.session_state.latency_breakdowns = deque(maxlen=LATENCY_HISTORY)
         # Don't set selected_actor to None - let it be unset initially
     
+    def get_session_token(self):
+        """Return the token identifying this browser session in the session store."""
+        token = st.query_params.get("session")
+        if not token:
+            token = uuid.uuid4().hex
+            # Kept in the URL so a refresh, reconnect or server restart finds the same session
+            st.query_params["session"] = token
+        return token
+    
+    def restore_session(self):
+        """Rehydrate a stored session's conversation, without calling the API."""
+        saved = get_session_store().load(st.session_state.session_token)
+        if saved is None:
+            return
+        st.session_state.store_version = saved["version"]
+        if saved["actor"] not in self.cases:
+            return
+        st.session_state.messages = saved["messages"]
+        st.session_state.transcript = Transcript.from_messages(saved["messages"])
+        st.session_state.thread_id = saved["thread_id"]
+        st.session_state.selected_actor = saved["actor"]
+        # Put the selector back on the restored patient so it doesn't count as a switch
+        st.session_state.actor_selector = saved["actor"]
+        # Anything this replica had going for the session is out of date
+        self.cancel_pregrade()
+        st.session_state.pop("pregrade_turn", None)
+        previous_job_id = st.session_state.pop("feedback_job_id", None)
+        st.session_state.pop("feedback_compaction", None)
+        if saved["feedback"] is not None:
+            job_id = get_feedback_queue().record_result(saved["feedback"])
+            st.session_state.feedback_job_id = st.session_state.feedback_saved_job = job_id
+        elif saved["feedback_job"] is not None:
+            # Still being produced, possibly by another replica
+            st.session_state.feedback_job_id = saved["feedback_job"]
+            get_feedback_queue().follow(saved["feedback_job"])
+        if previous_job_id is not None:
+            self.release_feedback_job(previous_job_id)
+    
+    def save_session(self, write, *args):
+        """Apply a session store write for this session, counting it towards the version this replica has seen."""
+        write(st.session_state.session_token, *args)
+        st.session_state.store_version = st.session_state.get("store_version", 0) + 1
+    
     def create_thread(self):
-        """Create a new OpenAI thread and return its ID."""
+        """Take a thread from the shared pool (creating one if it is empty) and return its ID."""
         try:
-            thread = openai.beta.threads.create()
-            return thread.id
+            with self.timed("thread.acquire"):
+                return call_with_retry(get_thread_pool().acquire, deadline=self.deadline)
+        except CircuitOpen as e:
+            st.warning(str(e))
+            st.stop()
         except Exception as e:
             st.error(f"Failed to create thread: {e}")
             st.stop()
@@ -53,7 +346,17 @@ class VPEApp:
         if previous_actor != current_actor:
             st.session_state.selected_actor = current_actor
             st.session_state.messages = []
-            st.session_state.thread_id = self.create_thread()
+            st.session_state.transcript = Transcript()
+            st.session_state.thread_id = None
+            # Replies still coming for the previous patient would never be read
+            self.cancel_runs(SWITCHED)
+            self.cancel_feedback()
+            st.session_state.pop("feedback_job_id", None)
+            st.session_state.pop("feedback_compaction", None)
+            self.cancel_pregrade()
+            st.session_state.pregrade_tokens = 0
+            st.session_state.pop("pregrade_turn", None)
+            self.save_session(get_session_store().start_conversation, current_actor)
             
             # Optional: Show confirmation message
             if previous_actor is not None:  # Not the first load
@@ -62,166 +365,566 @@ class VPEApp:
                 st.rerun()
     
     def get_patient_name(self, actor_name):
-        """Extract patient name from actor selection."""
-        # Split by '(' and take the first part, then strip whitespace
-        return actor_name.split('(')[0].strip()
+        """Look up the patient name for an actor selection."""
+        case = self.cases.get(actor_name)
+        return case.patient if case is not None else actor_name
     
-    def get_feedback_assistant_key(self, actor_name):
-        """Generate feedback assistant key from actor name."""
+    def get_feedback_assistant_id(self, actor_name):
+        """Look up the feedback assistant ID for an actor selection."""
         patient_name = self.get_patient_name(actor_name)
-        feedback_key = f"{patient_name} Feedback"
-        
-        # Fallback to a default if the specific feedback assistant doesn't exist
-        if feedback_key not in FEEDBACK_ASSISTANTS:
-            # Use the first available feedback assistant as fallback
-            available_keys = list(FEEDBACK_ASSISTANTS.keys())
-            if available_keys:
-                st.warning(f"Feedback assistant for '{patient_name}' not found. Using default feedback assistant.")
-                return available_keys[0]
-            else:
-                st.error("No feedback assistants available.")
-                st.stop()
+        assistant_id, fallback = self.cases.feedback_assistant(patient_name)
+        
+        if assistant_id is None:
+            st.error("No feedback assistants available.")
+            st.stop()
+        if fallback:
+            st.warning(f"Feedback assistant for '{patient_name}' not found. Using default feedback assistant.")
         
-        return feedback_key
+        return assistant_id
     
-    def get_transcript(self, thread_id):
-        """Retrieve and format conversation transcript."""
+    def metric_labels(self):
+        """Labels attached to this session's metrics."""
+        actor = st.session_state.get("selected_actor")
+        return {"patient": self.get_patient_name(actor)} if actor else {}
+    
+    def timed(self, operation):
+        """Time an operation, tagged with the current patient and added to the turn's breakdown."""
+        return METRICS.timed(operation, breakdown=self.breakdown, **self.metric_labels())
+    
+    def record_duration(self, operation, seconds):
+        """Record a duration that wasn't measured with timed(), e.g. time to first token."""
+        METRICS.observe("operation_seconds", seconds, operation=operation, outcome="ok", **self.metric_labels())
+        if self.breakdown is not None:
+            self.breakdown[operation] = seconds
+    
+    def time_left(self):
+        """Seconds left before the turn's deadline, for a stream's timeout so no single read outlasts the turn."""
+        if self.deadline is None:
+            return CHAT_TIMEOUT
+        return max(1.0, self.deadline - time.monotonic())
+    
+    def admit(self, priority, tokens=0):
+        """Wait for the shared rate limiter, showing the student's place in line while queued."""
+        status = None
+        
+        def show_position(position):
+            nonlocal status
+            if status is None:
+                status = st.empty()
+            status.info(f"⏳ Lots of students are chatting right now. You're number {position} in line...")
+        
         try:
-            messages = openai.beta.threads.messages.list(
-                thread_id=thread_id,
-                limit=100
-            )
-            
-            transcript = ""
-            # Reverse to get chronological order (oldest first)
-            for msg in reversed(messages.data):
-                role_label = "STUDENT" if msg.role == "user" else "PATIENT"
-                content = msg.content[0].text.value
-                transcript += f"{role_label}: {content}\n\n"
-            
-            return transcript
-        except Exception as e:
-            st.error(f"Failed to retrieve transcript: {e}")
-            return ""
+            with self.timed("admission"):
+                get_rate_limiter().admit(priority, tokens, timeout=ADMISSION_TIMEOUT[priority],
+                                         on_wait=show_position)
+        finally:
+            if status is not None:
+                status.empty()
+    
+    def call_openai(self, operation, fn, priority=CHAT, tokens=0, reconcile=None, **kwargs):
+        """Call OpenAI through the rate limiter and circuit breaker, retrying transient failures."""
+        def call():
+            self.admit(priority, tokens)
+            with self.timed(operation):
+                return fn(**kwargs)
+        
+        def check_earlier_attempt():
+            self.admit(priority)
+            return reconcile()
+        
+        def record_retry(attempt, delay, error):
+            METRICS.observe("retry_delay_seconds", delay, operation=operation, **self.metric_labels())
+        
+        return call_with_retry(call, deadline=self.deadline, breaker=get_circuit_breaker(),
+                               reconcile=check_earlier_attempt if reconcile else None, on_retry=record_retry)
+    
+    def speak(self, text):
+        """Pass reply text on to be spoken, when the turn in progress came from the student's voice."""
+        if self.spoken_reply is not None:
+            self.spoken_reply.feed(text)
+    
+    def chat_run_tokens(self):
+        """Estimate the tokens a chat run will consume: the conversation so far plus the reply."""
+        return estimate_tokens(st.session_state.transcript.chars) + CHAT_RUN_TOKENS
+    
+    def record_turn(self, role, content, seconds=None):
+        """Add a completed turn to the chat history and the running transcript."""
+        st.session_state.messages.append({"role": role, "content": content})
+        st.session_state.transcript.append(role, content)
+        self.save_session(get_session_store().append_turn, role, content, seconds)
+    
+    def get_transcript(self, thread_id):
+        """Return the conversation transcript formatted for feedback, condensed if it is over budget."""
+        transcript = st.session_state.transcript
+        backend = get_chat_backend()
+        if not transcript.matches(st.session_state.messages) and not backend.uses_threads:
+            # Without a thread the chat history is the conversation
+            transcript = st.session_state.transcript = Transcript.from_messages(st.session_state.messages)
+        elif not transcript.matches(st.session_state.messages):
+            # Local copy is out of step with the chat; recover it from the thread
+            try:
+                transcript = self.call_openai("transcript.fetch", backend.fetch_transcript, priority=FEEDBACK,
+                                              thread_id=thread_id)
+                st.session_state.transcript = transcript
+            except Exception as e:
+                st.error(f"Failed to retrieve transcript: {e}")
+                return ""
+        
+        # The rolling summary is kept up to date turn by turn, so this is only string assembly
+        text, compaction = transcript.compact(FEEDBACK_TRANSCRIPT_TOKENS)
+        st.session_state.feedback_compaction = compaction
+        return text
+    
+    def check_run_status(self, run_status, operation):
+        """Report a finished run's status; return True if it completed."""
+        if run_status.status == "completed":
+            return True
+        elif run_status.status in ("failed", "cancelled", "expired", "incomplete"):
+            st.error(f"{operation.title()} failed with status: {run_status.status}")
+            if hasattr(run_status, 'last_error') and run_status.last_error:
+                st.error(f"Error details: {run_status.last_error}")
+            return False
+        elif run_status.status == "requires_action":
+            st.error(f"{operation.title()} requires action. This shouldn't happen with these assistants.")
+            return False
+        
+        st.error(f"{operation.title()} ended with unexpected status: {run_status.status}")
+        return False
     
     def wait_for_run_completion(self, thread_id, run_id, timeout=60, operation="operation"):
         """Wait for OpenAI run to complete with timeout (simple version)."""
-        start_time = time.time()
-        
-        while time.time() - start_time < timeout:
+        with self.timed(f"wait.{operation.replace(' ', '_')}") as timer:
+            future = get_run_poller().watch(thread_id, run_id, timeout)
+            
             try:
-                run_status = openai.beta.threads.runs.retrieve(
-                    thread_id=thread_id,
-                    run_id=run_id
-                )
-                
-                if run_status.status == "completed":
-                    return True
-                elif run_status.status in ("failed", "cancelled", "expired"):
-                    st.error(f"{operation.title()} failed with status: {run_status.status}")
-                    if hasattr(run_status, 'last_error') and run_status.last_error:
-                        st.error(f"Error details: {run_status.last_error}")
-                    return False
-                elif run_status.status == "requires_action":
-                    st.error(f"{operation.title()} requires action. This shouldn't happen with these assistants.")
-                    return False
-                
-                time.sleep(POLLING_INTERVAL)
+                run_status = future.result(timeout=timeout)
+            except (FutureTimeout, RunPollTimeout):
+                timer.outcome = "timeout"
+                # Left alone, the run would go on producing a reply nobody waits for
+                if self.cancel_run(thread_id, run_id):
+                    get_run_tracker().record_cancelled(TIMED_OUT)
+                st.error(f"{operation.title()} timed out after {int(timeout)} seconds. Please try again.")
+                return False
             except Exception as e:
+                timer.outcome = "error"
                 st.error(f"Error checking {operation} status: {e}")
                 return False
-        
-        st.error(f"{operation.title()} timed out after {timeout} seconds. Please try again.")
-        return False
+            
+            timer.outcome = run_status.status
+            return self.check_run_status(run_status, operation)
 
-    def wait_for_run_completion_with_progress(self, thread_id, run_id, timeout=60, operation="operation"):
-        """Wait for OpenAI run to complete with progress updates."""
-        start_time = time.time()
-        progress_placeholder = st.empty()
-        
-        while time.time() - start_time < timeout:
-            elapsed = int(time.time() - start_time)
-            progress_placeholder.info(f"⏱️ {operation.title()} in progress... {elapsed}s elapsed")
+    def send_message_to_patient(self, prompt, assistant_id, attached=None):
+        """Send message to virtual patient (or wait on the `attached` run already answering it), render the response and return it."""
+        self.breakdown = {}
+        self.deadline = time.monotonic() + CHAT_TIMEOUT
+        with self.timed("chat.turn") as turn:
+            response = self.exchange_with_patient(prompt, assistant_id, attached)
+            if response is None:
+                turn.outcome = "failed"
+        # Only reached if the turn ran its course; a script run Streamlit stops leaves its run tracked
+        if self.tracked_run is not None:
+            get_run_tracker().finish(self.tracked_run.request_id)
+            self.tracked_run = None
+        self.breakdown["chat.turn"] = turn.duration
+        st.session_state.latency_breakdowns.append(self.breakdown)
+        self.breakdown = None
+        self.deadline = None
+        return response
+    
+    def exchange_with_patient(self, prompt, assistant_id, attached=None):
+        """Post the student's message, then stream (or poll for) the patient's reply."""
+        backend = get_chat_backend()
+        try:
+            start_time = time.time()
+            if not backend.uses_threads:
+                return self.complete_patient_response(assistant_id, start_time)
+            
+            if attached is not None:
+                # The message is posted and its run started (or finished) already; wait on that run
+                self.tracked_run = attached
+                with st.chat_message("assistant"):
+                    placeholder = st.empty()
+                return self.poll_patient_response(assistant_id, placeholder, start_time, attached.request_id,
+                                                  attached.run_id, check_existing=True)
+            
+            # Anything still running answers a message the student has moved on from
+            self.cancel_runs(SUPERSEDED)
             
+            new_thread = st.session_state.thread_id is None
+            if new_thread:
+                st.session_state.thread_id = self.create_thread()
+            thread_id = st.session_state.thread_id
+            self.settle_cancelled_runs(thread_id)
+            
+            # Tags this turn's message and run so retries can recognise an attempt that landed
+            self.tracked_run = get_run_tracker().begin(st.session_state.session_token, thread_id, prompt)
+            request_id = self.tracked_run.request_id
+            
+            # Add user message to thread
             try:
-                run_status = openai.beta.threads.runs.retrieve(
+                self.call_openai(
+                    "openai.messages.create", backend.post_message,
+                    reconcile=lambda: backend.find_message(thread_id, request_id),
                     thread_id=thread_id,
-                    run_id=run_id
+                    content=prompt,
+                    request_id=request_id,
                 )
+            except Exception as e:
+                # A retryable failure may still have written the message, so only a clean refusal frees the thread
+                if new_thread and not is_retryable(e):
+                    # Nothing was written, so the thread can serve another conversation
+                    get_thread_pool().release(thread_id)
+                    st.session_state.thread_id = None
+                raise
+            # Posted, or found already on the thread; only now is there a run a resubmission can wait on
+            get_run_tracker().posted(request_id)
+            if new_thread:
+                self.save_session(get_session_store().set_thread, thread_id)
+            
+            with st.chat_message("assistant"):
+                placeholder = st.empty()
+            
+            run_id = None
+            if STREAM_RESPONSES:
+                try:
+                    return self.stream_patient_response(assistant_id, placeholder, start_time, request_id)
+                except StreamUnavailable as e:
+                    run_id = e.run_id
+            
+            return self.poll_patient_response(assistant_id, placeholder, start_time, request_id, run_id,
+                                              check_existing=STREAM_RESPONSES)
                 
-                if run_status.status == "completed":
-                    progress_placeholder.empty()
-                    return True
-                elif run_status.status in ("failed", "cancelled", "expired"):
-                    progress_placeholder.empty()
-                    st.error(f"{operation.title()} failed with status: {run_status.status}")
-                    if hasattr(run_status, 'last_error') and run_status.last_error:
-                        st.error(f"Error details: {run_status.last_error}")
-                    return False
-                elif run_status.status == "requires_action":
-                    progress_placeholder.empty()
-                    st.error(f"{operation.title()} requires action. This shouldn't happen with these assistants.")
-                    return False
-                
-                time.sleep(POLLING_INTERVAL)
+        except (AdmissionTimeout, CircuitOpen) as e:
+            st.warning(str(e))
+            return None
+        except Exception as e:
+            st.error(f"Failed to send message: {e}")
+            return None
+    
+    def stream_patient_response(self, assistant_id, placeholder, start_time, request_id):
+        """Start a run and stream the patient's reply into the placeholder as it arrives."""
+        thread_id = st.session_state.thread_id
+        run_id = None
+        response = ""
+        first_token = None
+        placeholder.markdown("▌")
+        
+        with self.timed("chat.stream") as timer:
+            self.admit(CHAT, self.chat_run_tokens())
+            breaker = get_circuit_breaker()
+            breaker.before_call()
+            try:
+                stream = get_chat_backend().start_run(thread_id, assistant_id, request_id,
+                                                      stream=True, timeout=self.time_left())
             except Exception as e:
-                progress_placeholder.empty()
-                st.error(f"Error checking {operation} status: {e}")
-                return False
+                # Not retried here: polling checks for a run this attempt may have started
+                breaker.record_error(e)
+                raise StreamUnavailable()
+            breaker.record_success()
+            
+            try:
+                with stream:
+                    for event in stream:
+                        if event.event == "thread.run.created":
+                            run_id = event.data.id
+                            get_run_tracker().started(request_id, run_id)
+                        elif event.event == "thread.message.delta":
+                            for part in event.data.delta.content or []:
+                                if part.type == "text" and part.text and part.text.value:
+                                    response += part.text.value
+                                    self.speak(part.text.value)
+                            if first_token is None and response:
+                                first_token = time.time() - start_time
+                                self.record_duration("chat.first_token", first_token)
+                            placeholder.markdown(response + "▌")
+                        elif event.event == "thread.run.completed":
+                            # Only the stream's closing event follows; reading it lets the connection be reused
+                            continue
+                        elif event.event in ("thread.run.failed", "thread.run.incomplete", "thread.run.cancelled",
+                                             "thread.run.expired"):
+                            placeholder.empty()
+                            status = event.event.rsplit(".", 1)[-1]
+                            timer.outcome = status
+                            st.error(f"Chat response failed with status: {status}")
+                            if getattr(event.data, 'last_error', None):
+                                st.error(f"Error details: {event.data.last_error}")
+                            return None
+                        elif event.event == "thread.run.requires_action":
+                            placeholder.empty()
+                            timer.outcome = "requires_action"
+                            st.error("Chat response requires action. This shouldn't happen with these assistants.")
+                            return None
+                        elif event.event == "error":
+                            raise StreamUnavailable(run_id)
+                        
+                        if time.time() - start_time > CHAT_TIMEOUT:
+                            placeholder.empty()
+                            timer.outcome = "timeout"
+                            if self.cancel_run(thread_id, run_id):
+                                get_run_tracker().record_cancelled(TIMED_OUT)
+                            st.error(f"Chat response timed out after {CHAT_TIMEOUT} seconds. Please try again.")
+                            return None
+            except StreamUnavailable:
+                raise
+            except Exception:
+                # Connection dropped mid-stream; let polling pick up the run where it is
+                raise StreamUnavailable(run_id)
+            
+            if not response:
+                raise StreamUnavailable(run_id)
+            
+            placeholder.markdown(response)
+            return response
+    
+    def poll_patient_response(self, assistant_id, placeholder, start_time, request_id, run_id=None,
+                              check_existing=False):
+        """Start (or resume) a run, poll until it completes and render the reply."""
+        thread_id = st.session_state.thread_id
+        backend = get_chat_backend()
         
-        progress_placeholder.empty()
-        st.error(f"⏰ {operation.title()} timed out after {timeout} seconds.")
-        st.info("""
-        **What you can try:**
-        - Click the 'Generate Feedback!' button again to retry
-        - Check your internet connection
-        - If this persists, the OpenAI servers may be experiencing high load
-        """)
-        return False
+        # Start run
+        if run_id is None:
+            run = None
+            if check_existing:
+                # A broken stream may have started the run before reporting its ID
+                run = self.call_openai("openai.runs.list", backend.find_run,
+                                       thread_id=thread_id, request_id=request_id)
+            if run is None:
+                run = self.call_openai(
+                    "openai.runs.create", backend.start_run,
+                    tokens=self.chat_run_tokens(),
+                    reconcile=lambda: backend.find_run(thread_id, request_id),
+                    thread_id=thread_id,
+                    assistant_id=assistant_id,
+                    request_id=request_id,
+                )
+            run_id = run.id
+            get_run_tracker().started(request_id, run_id)
+        
+        # Wait for completion within whatever is left of the chat timeout
+        remaining = max(0, CHAT_TIMEOUT - (time.time() - start_time))
+        with st.spinner("Waiting for response..."):
+            if not self.wait_for_run_completion(thread_id, run_id,
+                                              timeout=remaining, operation="chat response"):
+                placeholder.empty()
+                return None
+        
+        # Get latest response
+        response = self.call_openai("openai.messages.list", backend.latest_reply, thread_id=thread_id)
+        
+        if response is not None:
+            placeholder.markdown(response)
+            self.speak(response)
+            return response
+        else:
+            placeholder.empty()
+            st.error("No response received from virtual patient.")
+            return None
     
-    def send_message_to_patient(self, prompt, assistant_id):
-        """Send message to virtual patient and get response."""
+    def cancel_run(self, thread_id, run_id):
+        """Best-effort cancellation of a run that is no longer wanted; return True if it was cancelled."""
+        if run_id is None:
+            return False
         try:
-            # Add user message to thread
-            openai.beta.threads.messages.create(
-                thread_id=st.session_state.thread_id,
-                role="user",
-                content=prompt,
-            )
-            
-            # Start run
-            run = openai.beta.threads.runs.create(
-                thread_id=st.session_state.thread_id,
+            run = self.call_openai("openai.runs.cancel", get_chat_backend().cancel_run,
+                                   run_id=run_id, thread_id=thread_id)
+        except Exception:
+            # Typically the run finished first
+            return False
+        if run.status == "cancelling":
+            # Runs stop asynchronously, and until this one has its thread refuses new messages
+            st.session_state.setdefault("cancelling_runs", []).append((thread_id, run_id))
+        return run.status in ("cancelling", "cancelled")
+    
+    def settle_cancelled_runs(self, thread_id):
+        """Wait for runs cancelled on this thread to stop, so the next message can be posted to it."""
+        runs = st.session_state.pop("cancelling_runs", [])
+        timeout = min(CANCEL_SETTLE_TIMEOUT, self.time_left())
+        futures = [get_run_poller().watch(run_thread, run_id, timeout)
+                   for run_thread, run_id in runs if run_thread == thread_id]
+        if not futures:
+            return
+        with self.timed("wait.cancelled_runs"):
+            for future in futures:
+                try:
+                    future.result(timeout=timeout)
+                except Exception:
+                    # Posting reports it if the run still holds the thread
+                    pass
+    
+    def cancel_runs(self, reason):
+        """Cancel the chat runs this session still has going, counting them under `reason`."""
+        backend = get_chat_backend()
+        tracker = get_run_tracker()
+        for run in tracker.abandon(st.session_state.session_token):
+            run_id = run.run_id
+            if run_id is None:
+                # Stopped before the run reported its ID, or before it was started at all
+                try:
+                    found = self.call_openai("openai.runs.list", backend.find_run,
+                                             thread_id=run.thread_id, request_id=run.request_id)
+                except Exception:
+                    found = None
+                run_id = found.id if found is not None else None
+            if self.cancel_run(run.thread_id, run_id):
+                tracker.record_cancelled(reason)
+    
+    def pending_run(self, prompt):
+        """Return the run still answering this same message from a stopped script run, or None."""
+        thread_id = st.session_state.thread_id
+        if not get_chat_backend().uses_threads or thread_id is None:
+            return None
+        return get_run_tracker().attach(st.session_state.session_token, thread_id, prompt)
+    
+    def complete_patient_response(self, assistant_id, start_time):
+        """Stream the patient's reply to the whole conversation as one chat completion."""
+        with st.chat_message("assistant"):
+            placeholder = st.empty()
+        placeholder.markdown("▌")
+        response = ""
+        first_token = None
+        
+        with self.timed("chat.stream") as timer:
+            # Nothing is written server-side, so opening the stream is safe to retry
+            stream = self.call_openai(
+                "openai.chat.completions.create", get_chat_backend().stream_reply,
+                tokens=self.chat_run_tokens(),
                 assistant_id=assistant_id,
+                messages=st.session_state.messages,
+                timeout=self.time_left(),
             )
+            try:
+                with stream:
+                    for text in stream_text(stream):
+                        response += text
+                        self.speak(text)
+                        if first_token is None:
+                            first_token = time.time() - start_time
+                            self.record_duration("chat.first_token", first_token)
+                        placeholder.markdown(response + "▌")
+                        
+                        if time.time() - start_time > CHAT_TIMEOUT:
+                            placeholder.empty()
+                            timer.outcome = "timeout"
+                            st.error(f"Chat response timed out after {CHAT_TIMEOUT} seconds. Please try again.")
+                            return None
+            except Exception as e:
+                get_circuit_breaker().record_error(e)
+                placeholder.empty()
+                timer.outcome = "failed"
+                st.error(f"Chat response was interrupted: {e}")
+                return None
             
-            # Wait for completion
-            with st.spinner("Waiting for response..."):
-                if not self.wait_for_run_completion(st.session_state.thread_id, run.id, 
-                                                  timeout=CHAT_TIMEOUT, operation="chat response"):
-                    return None
-            
-            # Get latest response
-            messages = openai.beta.threads.messages.list(
-                thread_id=st.session_state.thread_id,
-                limit=1
-            )
-            
-            if messages.data:
-                return messages.data[0].content[0].text.value
-            else:
+            if not response:
+                placeholder.empty()
+                timer.outcome = "failed"
                 st.error("No response received from virtual patient.")
                 return None
-                
-        except Exception as e:
-            st.error(f"Failed to send message: {e}")
-            return None
+            
+            placeholder.markdown(response)
+            return response
+    
+    def start_feedback(self, assistant_id, patient_name, transcript, admit=admit_feedback_call, cancel=None,
+                       background=False):
+        """Return (cache key, cached report or None, job ID or None) for a transcript, queueing a job if needed."""
+        queue = get_feedback_queue()
+        cache = get_feedback_cache()
+        cache_key = cache.make_key(assistant_id, transcript, None if FEEDBACK_MODE == WHOLE else FEEDBACK_MODE)
+        if cancel is None:
+            cancel = threading.Event()
+        
+        backend = get_chat_backend()
+        
+        def submit(token):
+            # Filled in by the worker as each domain is graded, for the progress view to show
+            sections = {} if FEEDBACK_MODE == DOMAINS else None
+            options = {} if sections is None else {"on_section": sections.__setitem__}
+            job_id = queue.submit(
+                cache.compute, cache_key, feedback_requester(FEEDBACK_MODE), assistant_id, patient_name, transcript,
+                poller=get_run_poller(), timeout=FEEDBACK_TIMEOUT,
+                thread_pool=get_thread_pool() if backend.uses_threads else None,
+                admit=admit, reply_tokens=FEEDBACK_RUN_TOKENS, breaker=get_circuit_breaker(), cancel=cancel,
+                backend=backend, background=background, token=token, **options,
+            )
+            job = queue.get(job_id)
+            job.sections = sections
+            job.cancel = cancel
+            return job_id
+        
+        # Identical transcripts reuse a cached report or attach to the run already producing it
+        feedback, job_id = cache.get_or_submit(cache_key, submit, withdraw=lambda _: cancel.set())
+        if job_id is not None:
+            # Whether this call started the job or attached to it, the job now has one more session waiting on it
+            queue.follow(job_id)
+        return cache_key, feedback, job_id
+    
+    def pregrade(self):
+        """Start grading the conversation so far in the background, so feedback is ready sooner when asked for."""
+        if not PREGRADE_ENABLED or self.get_user_message_count() < MIN_MESSAGES_FOR_FEEDBACK:
+            return
+        # A pass costs a full grading run, so not after every reply
+        turns = self.get_user_message_count()
+        last = st.session_state.get("pregrade_turn")
+        if last is not None and turns - last < PREGRADE_EVERY:
+            return
+        transcript = st.session_state.transcript
+        if not transcript.matches(st.session_state.messages):
+            return
+        # Only on idle workers; a backlog means students who asked for feedback are waiting
+        if get_feedback_queue().stats()["queued"]:
+            return
+        
+        patient_name = self.get_patient_name(st.session_state.selected_actor)
+        assistant_id, _ = self.cases.feedback_assistant(patient_name)
+        text, _ = transcript.compact(FEEDBACK_TRANSCRIPT_TOKENS)
+        # Grading domains separately sends the transcript once per domain
+        copies = len(FEEDBACK_DOMAINS) if FEEDBACK_MODE == DOMAINS else 1
+        tokens = estimate_tokens(text) * copies + FEEDBACK_RUN_TOKENS
+        spent = st.session_state.get("pregrade_tokens", 0)
+        if assistant_id is None or spent + tokens > PREGRADE_TOKEN_BUDGET:
+            return
+        
+        # The previous pass graded a transcript that has since grown; its report would never be used
+        self.cancel_pregrade()
+        admit = JobAdmission(PREGRADE)
+        try:
+            cache_key, feedback, job_id = self.start_feedback(
+                assistant_id, patient_name, text, admit=admit, background=True)
+        except QueueFull:
+            return
+        st.session_state.pregrade_turn = turns
+        if feedback is None:
+            st.session_state.pregrade_tokens = spent + tokens
+            st.session_state.pregrade = {"key": cache_key, "job_id": job_id, "admit": admit}
+    
+    def cancel_pregrade(self):
+        """Cancel this session's background grading pass, if one is in progress."""
+        pending = st.session_state.pop("pregrade", None)
+        if pending is not None:
+            self.release_feedback_job(pending["job_id"])
+    
+    def cancel_feedback(self):
+        """Stop waiting on the feedback this session asked for, cancelling it if no other session is."""
+        job_id = st.session_state.get("feedback_job_id")
+        if job_id is not None:
+            self.release_feedback_job(job_id)
+    
+    def release_feedback_job(self, job_id):
+        """Stop waiting on a feedback job; one nobody waits on is cancelled and no longer attached to."""
+        if get_feedback_queue().release(job_id):
+            get_feedback_cache().abandon(job_id)
     
     def generate_feedback(self, selected_actor):
-        """Generate feedback for the conversation."""
-        feedback_assistant_key = self.get_feedback_assistant_key(selected_actor)
+        """Queue feedback generation for the conversation."""
+        assistant_id = self.get_feedback_assistant_id(selected_actor)
         patient_name = self.get_patient_name(selected_actor)
-        assistant_id = FEEDBACK_ASSISTANTS[feedback_assistant_key]
+        
+        # A request for this conversation is already queued or running
+        job_id = st.session_state.get("feedback_job_id")
+        if job_id is not None:
+            job = get_feedback_queue().get(job_id)
+            if job is not None and not job.finished:
+                return
         
         # Get transcript
         transcript = self.get_transcript(st.session_state.thread_id)
@@ -230,60 +933,263 @@ class VPEApp:
             return
         
         try:
-            # Create new thread for feedback
-            feedback_thread = openai.beta.threads.create()
-            
-            # Prepare feedback prompt
-            feedback_prompt = f"""
-You are an expert clinical skills rater. Use the five-domain assessment framework.
-
-Transcript of the student's chat with virtual standardized patient {patient_name}:
-
-{transcript}
-"""
-            
-            # Send transcript to feedback assistant
-            openai.beta.threads.messages.create(
-                thread_id=feedback_thread.id,
-                role="user",
-                content=feedback_prompt
-            )
-            
-            # Start feedback generation
-            feedback_run = openai.beta.threads.runs.create(
-                thread_id=feedback_thread.id,
-                assistant_id=assistant_id,
-            )
-            
-            # Wait for feedback completion
-            if not self.wait_for_run_completion_with_progress(feedback_thread.id, feedback_run.id, 
-                                                            timeout=FEEDBACK_TIMEOUT, 
-                                                            operation="feedback generation"):
-                return
-            
-            # Get feedback
-            feedback_messages = openai.beta.threads.messages.list(
-                thread_id=feedback_thread.id,
-                limit=1
-            )
-            
-            if feedback_messages.data and feedback_messages.data[0].role == "assistant":
-                feedback_text = feedback_messages.data[0].content[0].text.value
-                
-                # Display feedback
-                st.subheader("📋 Comprehensive Feedback")
-                st.markdown(f"*Feedback from {patient_name} encounter*")
-                st.markdown(feedback_text)
+            cache_key, feedback, job_id = self.start_feedback(assistant_id, patient_name, transcript)
+        except QueueFull as e:
+            st.error(str(e))
+            return
+        
+        pending = st.session_state.get("pregrade")
+        if pending is not None and pending["job_id"] == job_id:
+            # The background pass is producing exactly this report; adopt it rather than cancel it later
+            del st.session_state.pregrade
+            self.release_feedback_job(job_id)
+            # and serve it as the request a student is now waiting on
+            pending["admit"].escalate()
+            get_feedback_queue().promote(job_id)
+        else:
+            # Finished, failed or for an older transcript
+            self.cancel_pregrade()
+        
+        if feedback is not None:
+            job_id = get_feedback_queue().record_result(feedback)
+        st.session_state.feedback_job_id = job_id
+        self.save_session(get_session_store().set_feedback_job, job_id)
+    
+    def display_feedback(self, selected_actor):
+        """Show the status or result of this session's feedback job."""
+        job_id = st.session_state.get("feedback_job_id")
+        if job_id is None:
+            return
+        
+        job = get_feedback_queue().get(job_id)
+        if job is None:
+            st.session_state.pop("feedback_job_id", None)
+            st.warning("Your previous feedback request has expired. Please generate feedback again.")
+        elif not job.finished:
+            self.display_feedback_progress(job_id)
+        elif job.status == DONE:
+            # Display feedback
+            patient_name = self.get_patient_name(selected_actor)
+            if st.session_state.get("feedback_saved_job") != job_id:
+                self.save_session(get_session_store().record_feedback, selected_actor, job.result)
+                st.session_state.feedback_saved_job = job_id
+            st.subheader("📋 Comprehensive Feedback")
+            st.markdown(f"*Feedback from {patient_name} encounter*")
+            compaction = st.session_state.get("feedback_compaction")
+            if compaction and compaction["verbatim"] < compaction["turns"]:
+                st.caption(f"This was a long interview, so only the last {compaction['verbatim']} of its "
+                           f"{compaction['turns']} messages were graded word for word; earlier ones were "
+                           f"condensed ({compaction['summarized']}) or left out ({compaction['omitted']}).")
+            st.markdown(job.result)
+        else:
+            st.error(job.error or "Failed to generate feedback.")
+            st.info("""
+        **What you can try:**
+        - Click the 'Generate Feedback!' button again to retry
+        - Check your internet connection
+        - If this persists, the OpenAI servers may be experiencing high load
+        """)
+    
+    @st.fragment(run_every=FEEDBACK_STATUS_REFRESH)
+    def display_feedback_progress(self, job_id):
+        """Refresh a pending feedback job's status without rerunning the whole page."""
+        queue = get_feedback_queue()
+        job = queue.get(job_id)
+        if job is None or job.finished:
+            # Full rerun so the result renders outside this auto-refreshing fragment
+            st.rerun()
+        
+        if job.status == QUEUED:
+            position = queue.position(job_id)
+            if position:
+                st.info(f"🕒 Feedback request queued (position {position} of "
+                        f"{queue.stats()['queued']}, {int(job.wait_time)}s waiting)")
             else:
-                st.error("No feedback generated. Please try again.")
-                
-        except Exception as e:
-            st.error(f"Failed to generate feedback: {e}")
+                # Queued on another replica, which alone knows its place in line
+                st.info(f"🕒 Feedback request queued ({int(job.wait_time)}s waiting)")
+        else:
+            st.info(f"⏱️ Feedback generation in progress... {int(job.run_time)}s elapsed")
+            if job.sections is not None:
+                self.display_feedback_sections(job.sections)
+    
+    def display_feedback_sections(self, sections):
+        """Show each domain's feedback as soon as it is graded, in report order."""
+        sections = dict(sections)
+        for domain in FEEDBACK_DOMAINS:
+            if domain not in sections:
+                st.caption(f"⏳ Grading {domain}...")
+            elif sections[domain] is None:
+                st.warning(f"{domain} could not be graded; the report will note it.")
+            else:
+                st.markdown(sections[domain])
     
     def display_chat_history(self):
         """Display existing chat messages."""
         for msg in st.session_state.messages:
             st.chat_message(msg["role"]).markdown(msg["content"])
+        # Later turns are shown by the chat fragment until the next full rerun
+        st.session_state.rendered_messages = len(st.session_state.messages)
+    
+    def display_new_turns(self):
+        """Show turns from earlier fragment runs; everything before them is already on the page."""
+        with self.timed("render.chat"):
+            for msg in st.session_state.messages[st.session_state.rendered_messages:]:
+                st.chat_message(msg["role"]).markdown(msg["content"])
+    
+    def take_turn(self, prompt, assistant_id, spoken_reply=None):
+        """Show the student's message with the patient's reply, speaking the reply if given a SpokenReply."""
+        # Sent again while its reply is still coming (e.g. resubmitted after a rerun): it is shown already
+        attached = self.pending_run(prompt)
+        if attached is None:
+            # Add user message to display
+            self.record_turn("user", prompt)
+            st.chat_message("user").markdown(prompt)
+        
+        # Get response from virtual patient (rendered, and spoken, as it arrives)
+        self.spoken_reply = spoken_reply
+        try:
+            response = self.send_message_to_patient(prompt, assistant_id, attached)
+        finally:
+            self.spoken_reply = None
+        
+        if spoken_reply is not None:
+            if response:
+                spoken_reply.close()
+            else:
+                spoken_reply.cancel()
+        
+        if response:
+            self.record_turn("assistant", response, st.session_state.latency_breakdowns[-1].get("chat.turn"))
+            self.pregrade()
+        
+        unrendered = len(st.session_state.messages) - st.session_state.rendered_messages
+        # Full rerun when the feedback section should appear, or to keep the fragment's share small
+        if self.get_user_message_count() == MIN_MESSAGES_FOR_FEEDBACK or unrendered > CHAT_TAIL_LIMIT:
+            st.rerun(scope="app")
+    
+    @st.fragment
+    def chat_area(self, assistant_id):
+        """Take the next message and show it with the reply, rerunning only this fragment."""
+        self.display_new_turns()
+        
+        if prompt := st.chat_input("Start chatting with the virtual patient..."):
+            self.take_turn(prompt, assistant_id)
+    
+    def voice_area(self, assistant_id):
+        """Connect the student's microphone and speakers, falling back to typing when voice is full."""
+        session = get_voice_sessions().open(st.session_state.session_token, create_voice_session)
+        if session is None:
+            st.warning("🎙️ Voice interviews are full right now. Please type your questions instead.")
+            self.chat_area(assistant_id)
+            return
+        st.session_state.voice_open = True
+        
+        # Imported here: WebRTC (aiortc and its codecs) is only loaded once someone turns voice on
+        from streamlit_webrtc import webrtc_streamer, WebRtcMode
+        
+        # Audio frames are handled on streamlit-webrtc's thread, outside any script run
+        context = webrtc_streamer(
+            key="voice",
+            mode=WebRtcMode.SENDRECV,
+            audio_frame_callback=session.process_frame,
+            media_stream_constraints={"audio": True, "video": False},
+        )
+        if context.state.playing:
+            self.voice_turns(assistant_id)
+        else:
+            st.caption("Press Start and allow microphone access to talk to the patient.")
+            self.display_new_turns()
+    
+    @st.fragment(run_every=VOICE_POLL_INTERVAL)
+    def voice_turns(self, assistant_id):
+        """Answer the student's finished utterances, checking for one a few times a second."""
+        self.display_new_turns()
+        
+        session = get_voice_sessions().open(st.session_state.session_token, create_voice_session)
+        if session is None:
+            return
+        try:
+            utterance = session.utterances.get_nowait()
+        except queue.Empty:
+            return
+        if utterance.error:
+            st.toast(f"Sorry, that couldn't be transcribed: {utterance.error}")
+            return
+        self.take_turn(utterance.text, assistant_id, spoken_reply=session.reply(utterance.ended_at))
+    
+    def is_admin(self):
+        """Admin panels are shown when the page is opened with ?admin=<ADMIN_TOKEN>."""
+        token = st.secrets.get("ADMIN_TOKEN")
+        return bool(token) and st.query_params.get("admin") == token
+    
+    def display_admin_panel(self):
+        """Show this session's per-turn latency breakdown and process-wide metrics."""
+        with st.sidebar.expander("⏱️ Latency breakdown (admin)"):
+            breakdowns = list(st.session_state.latency_breakdowns)
+            if breakdowns:
+                st.caption("This session, most recent turn last (seconds)")
+                st.dataframe([{k: round(v, 3) for k, v in b.items()} for b in breakdowns])
+            else:
+                st.caption("No turns yet in this session.")
+            
+            st.caption("All sessions")
+            st.dataframe([
+                {
+                    "operation": row["labels"].get("operation"),
+                    "patient": row["labels"].get("patient", ""),
+                    "outcome": row["labels"].get("outcome"),
+                    "count": row["count"],
+                    "p50": row["p50"],
+                    "p95": row["p95"],
+                }
+                for row in METRICS.snapshot() if row["name"] == "operation_seconds"
+            ])
+            st.json({
+                "poller": get_run_poller().stats(),
+                "feedback_queue": get_feedback_queue().stats(),
+                "feedback_cache": get_feedback_cache().stats(),
+                "chat_backend": get_chat_backend().stats(),
+                "thread_pool": get_thread_pool().stats() if get_chat_backend().uses_threads else None,
+                "runs": get_run_tracker().stats(),
+                "session_store": get_session_store().stats(),
+                "shared_state": get_shared_state().stats() if get_shared_state() is not None else None,
+                "rate_limiter": get_rate_limiter().stats(),
+                "circuit_breaker": get_circuit_breaker().stats(),
+                "cases": get_case_registry().stats(),
+                "voice": get_voice_sessions().stats(),
+                "analytics": get_encounter_log().stats(),
+                "openai_connections": self.openai_pool.stats(),
+            }, expanded=False)
+    
+    def display_cohort_analytics(self):
+        """Show cohort-level patterns across every stored encounter, with a CSV export."""
+        with st.expander("📊 Cohort analytics (admin)"):
+            from cohort_analytics import case_timing, question_counts, score_percentiles, slow_cases
+            log = get_encounter_log()
+            log.cases = self.cases
+            encounters = log.encounters()
+            if encounters.empty:
+                st.caption("No encounters recorded yet.")
+                return
+            
+            columns = st.columns(3)
+            columns[0].metric("Encounters", len(encounters))
+            columns[1].metric("Graded", int(encounters["graded"].sum()))
+            columns[2].metric("Median questions", f"{encounters['questions'].median():.0f}")
+            
+            slow = slow_cases(log)
+            if not slow.empty:
+                st.warning("Slow cases (median reply vs. the cohort's): " + ", ".join(
+                    f"{case} ({ratio:.1f}x)" for case, ratio in slow["ratio"].items()))
+            st.caption("Patient reply time by case (seconds)")
+            st.dataframe(case_timing(log).round(2))
+            st.caption("Questions per encounter by case")
+            st.dataframe(question_counts(log).round(1))
+            st.caption("Feedback scores by case and domain (fraction of the domain's scale)")
+            st.dataframe(score_percentiles(log).round(2))
+            # Built only when clicked
+            st.download_button("Download encounters (CSV)", encounters.to_csv,
+                               file_name="vpe_encounters.csv", mime="text/csv", on_click="ignore")
     
     def get_user_message_count(self):
         """Count user messages in the current conversation."""
@@ -293,28 +1199,42 @@ Transcript of the student's chat with virtual standardized patient {patient_name
         """Main application loop."""
         st.title("Virtual Patient Encounters (VPE)")
         
+        if get_circuit_breaker().is_open:
+            st.warning("⚠️ Running in degraded mode: OpenAI isn't responding, so new messages "
+                       "and feedback requests may be refused until it recovers.")
+        
         # Sidebar: Actor selection
-        if not ASSISTANT_MAP:
+        if not self.cases:
             st.error("No virtual patients available. Please check your assistant configuration.")
             st.stop()
         
         selected_actor = st.sidebar.selectbox(
             "Choose a Virtual Patient Encounter",
-            list(ASSISTANT_MAP.keys()),
+            self.cases.labels,
             key="actor_selector"
         )
+        voice_mode = st.sidebar.toggle("🎙️ Voice interview", key="voice_mode",
+                                       help="Talk to the patient through your microphone and hear the replies.")
         
-        assistant_id = ASSISTANT_MAP[selected_actor]
+        case = self.cases.get(selected_actor)
+        if case is None:
+            # The selected case was removed from the data file while this session was open
+            st.session_state.pop("actor_selector", None)
+            st.rerun()
+        assistant_id = case.assistant_id
         
         # Reset conversation if actor changed
         self.reset_conversation_if_needed(selected_actor)
         
+        if self.is_admin():
+            self.display_admin_panel()
+        
         # Show which patient we're talking to
         patient_name = self.get_patient_name(selected_actor)
         st.subheader(f"💬 Conversation with {patient_name}")
         
         # Display patient intro prompt - FIXED FOR DARK MODE
-        patient_prompt = get_patient_prompt(patient_name)
+        patient_prompt = case.prompt
         if patient_prompt:
             with st.expander("📋 Case Introduction - Click to read", expanded=True):
                 st.markdown(f"""
@@ -337,18 +1257,14 @@ Transcript of the student's chat with virtual standardized patient {patient_name
         # Display chat history
         self.display_chat_history()
         
-        # Chat input
-        if prompt := st.chat_input("Start chatting with the virtual patient..."):
-            # Add user message to display
-            st.session_state.messages.append({"role": "user", "content": prompt})
-            st.chat_message("user").markdown(prompt)
-            
-            # Get response from virtual patient
-            response = self.send_message_to_patient(prompt, assistant_id)
-            
-            if response:
-                st.session_state.messages.append({"role": "assistant", "content": response})
-                st.chat_message("assistant").markdown(response)
+        # Chat input; a new message reruns only the chat fragment, not the whole page
+        if voice_mode:
+            self.voice_area(assistant_id)
+        else:
+            # Frees the voice slot as soon as the student switches back to typing
+            if st.session_state.pop("voice_open", False):
+                get_voice_sessions().close(st.session_state.session_token)
+            self.chat_area(assistant_id)
         
         # Feedback section
         user_count = self.get_user_message_count()
@@ -360,6 +1276,11 @@ Transcript of the student's chat with virtual standardized patient {patient_name
             if st.button("Generate Feedback!", type="primary"):
                 with st.spinner("Preparing feedback generation..."):
                     self.generate_feedback(selected_actor)
+            
+            self.display_feedback(selected_actor)
+        
+        if self.is_admin():
+            self.display_cohort_analytics()
 
 # Run the application
 if __name__ == "__main__":
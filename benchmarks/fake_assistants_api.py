@@ -0,0 +1,594 @@
+# fake_assistants_api.py
+#
+# Local stand-in for the parts of the OpenAI API the app uses: Assistants API
+# threads, messages, runs (polled, streamed or listed), retrieve and cancel, plus
+# assistant retrieval and (streamed) chat completions for the completions backend.
+#
+# Run it on its own and point the app at it:
+#     python benchmarks/fake_assistants_api.py --port 8765 --run-latency 1.5
+#     OPENAI_BASE_URL=http://127.0.0.1:8765/v1/ streamlit run app.py
+
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+DOMAIN_PROMPT = "grade only the"  # how a feedback prompt asks for a single domain's section
+
+
+class FakeConfig:
+    """Knobs controlling how the fake API behaves."""
+
+    def __init__(self, run_latency=1.5, run_jitter=0.5, feedback_latency=20.0,
+                 first_token_fraction=0.2, run_failure_rate=0.0, error_rate=0.0,
+                 rate_limit=0.0, lost_response_rate=0.0, reply_words=40, feedback_words=600,
+                 feedback_sections=5, cancel_latency=0.5, feedback_assistants=()):
+        self.run_latency = run_latency  # mean seconds a chat run takes
+        self.run_jitter = run_jitter  # +/- seconds of uniform jitter on every run
+        self.feedback_latency = feedback_latency  # mean seconds a feedback run takes
+        self.first_token_fraction = first_token_fraction  # share of a streamed run before its first token
+        self.run_failure_rate = run_failure_rate  # share of runs that end "failed"
+        self.error_rate = error_rate  # share of requests answered with HTTP 500
+        self.rate_limit = rate_limit  # requests per second before HTTP 429 (0 = unlimited)
+        self.lost_response_rate = lost_response_rate  # share of message/run creates applied but answered with HTTP 500
+        self.reply_words = reply_words
+        self.feedback_words = feedback_words
+        self.feedback_sections = feedback_sections  # sections in a full report; one alone takes its share of the time
+        self.cancel_latency = cancel_latency  # seconds a cancelled run spends "cancelling" before it stops
+        self.feedback_assistants = set(feedback_assistants)
+
+
+class FakeAssistantsState:
+    """In-memory threads, messages and runs plus per-endpoint call counters."""
+
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.Lock()
+        self.threads = {}
+        self.runs = {}
+        self.calls = Counter()
+        self.calls_by_thread = Counter()
+        self.status_codes = Counter()
+        # Connections clients opened; each would be a TLS handshake against the real API
+        self.connections = 0
+        self._ids = itertools.count(1)
+        self._bucket_tokens = config.rate_limit
+        self._bucket_time = time.monotonic()
+        self.random = random.Random(0)
+
+    def new_id(self, prefix):
+        return f"{prefix}_{next(self._ids):08d}"
+
+    def admit(self):
+        """Token-bucket check; returns False when the request should get a 429."""
+        if not self.config.rate_limit:
+            return True
+        now = time.monotonic()
+        rate = self.config.rate_limit
+        self._bucket_tokens = min(rate, self._bucket_tokens + (now - self._bucket_time) * rate)
+        self._bucket_time = now
+        if self._bucket_tokens < 1:
+            return False
+        self._bucket_tokens -= 1
+        return True
+
+    def share(self, prompt):
+        """Part of a full feedback report a prompt asks for: one section, or all of them."""
+        return 1 / self.config.feedback_sections if DOMAIN_PROMPT in prompt.lower() else 1.0
+
+    def run_duration(self, assistant_id, share=1.0):
+        # Feedback runs take as long as the text they write
+        if assistant_id in self.config.feedback_assistants:
+            mean = self.config.feedback_latency * share
+        else:
+            mean = self.config.run_latency
+        return max(0.0, mean + self.random.uniform(-self.config.run_jitter, self.config.run_jitter))
+
+    def last_prompt(self, thread_id):
+        prompts = [msg["content"][0]["text"]["value"] for msg in self.threads[thread_id]["messages"]
+                   if msg["role"] == "user"]
+        return prompts[-1] if prompts else ""
+
+    def reply_text(self, assistant_id, thread_id, share=1.0):
+        user_turns = sum(1 for msg in self.threads[thread_id]["messages"] if msg["role"] == "user")
+        return self.simulated_reply(assistant_id, user_turns, share)
+
+    def simulated_reply(self, assistant_id, user_turns, share=1.0):
+        if assistant_id in self.config.feedback_assistants:
+            words = max(1, round(self.config.feedback_words * share))
+        else:
+            words = self.config.reply_words
+        return f"Simulated reply {user_turns}: " + " ".join("lorem" for _ in range(words))
+
+    @staticmethod
+    def instructions(assistant_id):
+        # Completions requests carry these as their system message, which is how they are told apart
+        return f"Simulated instructions for {assistant_id}."
+
+    def message(self, thread_id, role, text, run_id=None, assistant_id=None, metadata=None):
+        msg = {
+            "id": self.new_id("msg"),
+            "object": "thread.message",
+            "created_at": int(time.time()),
+            "thread_id": thread_id,
+            "role": role,
+            "status": "completed",
+            "content": [{"type": "text", "text": {"value": text, "annotations": []}}],
+            "assistant_id": assistant_id,
+            "run_id": run_id,
+            "attachments": [],
+            "metadata": metadata or {},
+        }
+        self.threads[thread_id]["messages"].append(msg)
+        return msg
+
+    def run_object(self, run):
+        return {
+            "id": run["id"],
+            "object": "thread.run",
+            "created_at": int(run["created_at"]),
+            "thread_id": run["thread_id"],
+            "assistant_id": run["assistant_id"],
+            "status": run["status"],
+            "last_error": run["last_error"],
+            "metadata": run["metadata"],
+        }
+
+    def advance(self, run):
+        """Move a run along according to the wall clock; returns the run."""
+        if run["status"] == "cancelling" and time.monotonic() - run["cancelled"] >= self.config.cancel_latency:
+            run["status"] = "cancelled"
+        if run["status"] in ("queued", "in_progress"):
+            elapsed = time.monotonic() - run["started"]
+            if elapsed >= run["duration"]:
+                self.finish(run)
+            elif elapsed > 0:
+                run["status"] = "in_progress"
+        return run
+
+    def active_run(self, thread_id):
+        """Return the thread's run that is still going (which blocks new messages and runs), or None."""
+        now = time.monotonic()
+        for run in self.runs.values():
+            if run["thread_id"] != thread_id:
+                continue
+            # Not advanced here: a streamed run is finished by its stream
+            if run["status"] in ("queued", "in_progress") and now - run["started"] < run["duration"]:
+                return run
+            if run["status"] == "cancelling" and now - run["cancelled"] < self.config.cancel_latency:
+                return run
+        return None
+
+    def finish(self, run):
+        if run["will_fail"]:
+            run["status"] = "failed"
+            run["last_error"] = {"code": "server_error", "message": "Simulated run failure"}
+        else:
+            run["status"] = "completed"
+            self.message(run["thread_id"], "assistant", run["reply"], run["id"], run["assistant_id"])
+
+    def stats(self):
+        with self.lock:
+            chat_threads = {run["thread_id"] for run in self.runs.values()
+                            if run["assistant_id"] not in self.config.feedback_assistants}
+            chat_calls = sum(count for thread_id, count in self.calls_by_thread.items() if thread_id in chat_threads)
+            return {
+                "calls": dict(self.calls),
+                "total_calls": sum(self.calls.values()),
+                "chat_thread_calls": chat_calls,
+                "status_codes": {str(code): count for code, count in self.status_codes.items()},
+                "connections": self.connections,
+                "threads": len(self.threads),
+                "runs": len(self.runs),
+                "runs_by_status": dict(Counter(run["status"] for run in self.runs.values())),
+            }
+
+
+class FakeAssistantsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        with self.state.lock:
+            self.state.connections += 1
+
+    def handle(self):
+        try:
+            super().handle()
+        except ConnectionError:
+            # The client dropped the connection, e.g. closing a stream it stopped reading
+            pass
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def dispatch(self, method):
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split("/") if part]
+        if parts and parts[0] == "v1":
+            parts = parts[1:]
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+
+        if parts == ["_stats"]:
+            return self.send_json(200, self.state.stats())
+
+        state = self.state
+        with state.lock:
+            operation = self.operation_name(method, parts, body)
+            state.calls[operation] += 1
+            if len(parts) >= 2 and parts[0] == "threads":
+                state.calls_by_thread[parts[1]] += 1
+            if not state.admit():
+                return self.send_error_json(429, "rate_limit_exceeded", "Simulated rate limit")
+            if state.random.random() < state.config.error_rate:
+                return self.send_error_json(500, "server_error", "Simulated server error")
+
+        try:
+            handler = getattr(self, f"handle_{operation.replace('.', '_')}")
+        except AttributeError:
+            return self.send_error_json(404, "not_found", f"No fake endpoint for {method} {url.path}")
+        handler(parts, body, query)
+
+    @staticmethod
+    def operation_name(method, parts, body):
+        if parts == ["threads"]:
+            return "threads.create"
+        if len(parts) == 3 and parts[2] == "messages":
+            return "messages.create" if method == "POST" else "messages.list"
+        if len(parts) == 3 and parts[2] == "runs":
+            if method == "GET":
+                return "runs.list"
+            return "runs.stream" if body.get("stream") else "runs.create"
+        if len(parts) == 4 and parts[2] == "runs":
+            return "runs.retrieve"
+        if len(parts) == 5 and parts[4] == "cancel":
+            return "runs.cancel"
+        if len(parts) == 2 and parts[0] == "assistants" and method == "GET":
+            return "assistants.retrieve"
+        if parts == ["chat", "completions"]:
+            return "chat.completions.stream" if body.get("stream") else "chat.completions.create"
+        return "unknown"
+
+    def handle_threads_create(self, parts, body, query):
+        state = self.state
+        with state.lock:
+            thread_id = state.new_id("thread")
+            state.threads[thread_id] = {"messages": [], "created_at": int(time.time())}
+        self.send_json(200, {"id": thread_id, "object": "thread", "created_at": int(time.time()), "metadata": {}})
+
+    def handle_messages_create(self, parts, body, query):
+        state = self.state
+        with state.lock:
+            if parts[1] not in state.threads:
+                return self.send_error_json(404, "not_found", "No such thread")
+            active = state.active_run(parts[1])
+            if active is not None:
+                return self.send_error_json(400, "invalid_request_error",
+                                            f"Can't add messages to {parts[1]} while a run {active['id']} is active.")
+            msg = state.message(parts[1], body.get("role", "user"), body.get("content", ""),
+                                metadata=body.get("metadata"))
+            if state.random.random() < state.config.lost_response_rate:
+                return self.send_error_json(500, "server_error", "Simulated lost response")
+        self.send_json(200, msg)
+
+    def handle_messages_list(self, parts, body, query):
+        state = self.state
+        with state.lock:
+            if parts[1] not in state.threads:
+                return self.send_error_json(404, "not_found", "No such thread")
+            messages = list(state.threads[parts[1]]["messages"])
+        if query.get("order", "desc") == "desc":
+            messages.reverse()
+        if "after" in query:
+            ids = [msg["id"] for msg in messages]
+            messages = messages[ids.index(query["after"]) + 1:] if query["after"] in ids else []
+        limit = int(query.get("limit", 20))
+        page = messages[:limit]
+        self.send_json(200, {
+            "object": "list",
+            "data": page,
+            "first_id": page[0]["id"] if page else None,
+            "last_id": page[-1]["id"] if page else None,
+            "has_more": len(messages) > limit,
+        })
+
+    def start_run(self, parts, body):
+        """Create a run; returns it, or the (status, type, message) of the error if the thread can't take one."""
+        state = self.state
+        with state.lock:
+            if parts[1] not in state.threads:
+                return 404, "not_found", "No such thread"
+            active = state.active_run(parts[1])
+            if active is not None:
+                return 400, "invalid_request_error", f"Thread {parts[1]} already has an active run {active['id']}."
+            assistant_id = body.get("assistant_id", "")
+            share = state.share(state.last_prompt(parts[1]))
+            run = {
+                "id": state.new_id("run"),
+                "thread_id": parts[1],
+                "assistant_id": assistant_id,
+                "status": "queued",
+                "last_error": None,
+                "created_at": time.time(),
+                "started": time.monotonic(),
+                "duration": state.run_duration(assistant_id, share),
+                "will_fail": state.random.random() < state.config.run_failure_rate,
+                "reply": state.reply_text(assistant_id, parts[1], share),
+                "metadata": body.get("metadata") or {},
+            }
+            state.runs[run["id"]] = run
+            return run
+
+    def handle_runs_create(self, parts, body, query):
+        run = self.start_run(parts, body)
+        if isinstance(run, tuple):
+            return self.send_error_json(*run)
+        with self.state.lock:
+            if self.state.random.random() < self.state.config.lost_response_rate:
+                return self.send_error_json(500, "server_error", "Simulated lost response")
+            self.send_json(200, self.state.run_object(run))
+
+    def handle_runs_list(self, parts, body, query):
+        state = self.state
+        with state.lock:
+            if parts[1] not in state.threads:
+                return self.send_error_json(404, "not_found", "No such thread")
+            runs = [state.run_object(state.advance(run)) for run in state.runs.values() if run["thread_id"] == parts[1]]
+        runs.sort(key=lambda run: run["created_at"], reverse=query.get("order", "desc") == "desc")
+        page = runs[:int(query.get("limit", 20))]
+        self.send_json(200, {
+            "object": "list",
+            "data": page,
+            "first_id": page[0]["id"] if page else None,
+            "last_id": page[-1]["id"] if page else None,
+            "has_more": len(runs) > len(page),
+        })
+
+    def handle_runs_stream(self, parts, body, query):
+        state = self.state
+        run = self.start_run(parts, body)
+        if isinstance(run, tuple):
+            return self.send_error_json(*run)
+
+        self.start_stream()
+        with state.lock:
+            self.send_event("thread.run.created", state.run_object(run))
+        words = run["reply"].split(" ")
+        first_token_at = run["duration"] * state.config.first_token_fraction
+        step = (run["duration"] - first_token_at) / max(1, len(words))
+        time.sleep(first_token_at)
+        if run["will_fail"]:
+            with state.lock:
+                state.finish(run)
+                self.send_event("thread.run.failed", state.run_object(run))
+            return self.send_done()
+
+        message_id = state.new_id("msg")
+        for index, word in enumerate(words):
+            with state.lock:
+                cancelled = run["status"] in ("cancelling", "cancelled")
+            if cancelled:
+                # Like the real API, a run keeps going for a moment after it is asked to stop
+                time.sleep(state.config.cancel_latency)
+                with state.lock:
+                    self.send_event("thread.run.cancelled", state.run_object(state.advance(run)))
+                return self.send_done()
+            text = word if index == 0 else " " + word
+            self.send_event("thread.message.delta", {
+                "id": message_id,
+                "object": "thread.message.delta",
+                "delta": {"content": [{"index": 0, "type": "text", "text": {"value": text, "annotations": []}}]},
+            })
+            time.sleep(step)
+        with state.lock:
+            state.finish(run)
+            self.send_event("thread.run.completed", state.run_object(run))
+        self.send_done()
+
+    def handle_runs_retrieve(self, parts, body, query):
+        state = self.state
+        with state.lock:
+            run = state.runs.get(parts[3])
+            if run is None:
+                return self.send_error_json(404, "not_found", "No such run")
+            self.send_json(200, state.run_object(state.advance(run)))
+
+    def handle_runs_cancel(self, parts, body, query):
+        state = self.state
+        with state.lock:
+            run = state.runs.get(parts[3])
+            if run is None:
+                return self.send_error_json(404, "not_found", "No such run")
+            if run["status"] in ("queued", "in_progress"):
+                run["status"] = "cancelling"
+                run["cancelled"] = time.monotonic()
+            self.send_json(200, state.run_object(run))
+
+    def handle_assistants_retrieve(self, parts, body, query):
+        self.send_json(200, {
+            "id": parts[1],
+            "object": "assistant",
+            "created_at": int(time.time()),
+            "name": None,
+            "description": None,
+            "model": "gpt-4o",
+            "instructions": self.state.instructions(parts[1]),
+            "tools": [],
+            "metadata": {},
+            "temperature": 1.0,
+            "top_p": 1.0,
+        })
+
+    def completion_reply(self, body):
+        """Work out which assistant a completions request speaks for; returns (assistant_id, reply, duration)."""
+        state = self.state
+        messages = body.get("messages") or []
+        system = messages[0]["content"] if messages and messages[0]["role"] == "system" else ""
+        assistant_id = system.removeprefix("Simulated instructions for ").removesuffix(".")
+        user_turns = sum(1 for msg in messages if msg["role"] == "user")
+        share = state.share(messages[-1]["content"] if messages else "")
+        with state.lock:
+            return (assistant_id, state.simulated_reply(assistant_id, user_turns, share),
+                    state.run_duration(assistant_id, share))
+
+    def completion_chunk(self, completion_id, body, delta, finish_reason=None):
+        return {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": body.get("model", ""),
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+
+    def handle_chat_completions_create(self, parts, body, query):
+        _, reply, duration = self.completion_reply(body)
+        time.sleep(duration)
+        self.send_json(200, {
+            "id": self.state.new_id("chatcmpl"),
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", ""),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": reply}}],
+        })
+
+    def handle_chat_completions_stream(self, parts, body, query):
+        _, reply, duration = self.completion_reply(body)
+        completion_id = self.state.new_id("chatcmpl")
+        self.start_stream()
+        words = reply.split(" ")
+        first_token_at = duration * self.state.config.first_token_fraction
+        step = (duration - first_token_at) / max(1, len(words))
+        time.sleep(first_token_at)
+        self.send_data(self.completion_chunk(completion_id, body, {"role": "assistant", "content": ""}))
+        for index, word in enumerate(words):
+            text = word if index == 0 else " " + word
+            self.send_data(self.completion_chunk(completion_id, body, {"content": text}))
+            time.sleep(step)
+        self.send_data(self.completion_chunk(completion_id, body, {}, finish_reason="stop"))
+        self.send_data("[DONE]")
+        self.end_stream()
+
+    def send_json(self, code, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.state.status_codes[code] += 1
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if code == 429:
+            self.send_header("Retry-After", "1")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_error_json(self, code, error_type, message):
+        self.send_json(code, {"error": {"message": message, "type": error_type, "code": error_type}})
+
+    def start_stream(self):
+        # Chunked, as the real API streams, so the connection can carry the next request
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def send_chunk(self, text):
+        data = text.encode("utf-8")
+        try:
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+        except OSError:
+            # The client went away mid-stream; the connection can't be reused
+            self.close_connection = True
+
+    def end_stream(self):
+        self.send_chunk("")
+
+    def send_event(self, event, data):
+        self.send_chunk(f"event: {event}\ndata: {json.dumps(data)}\n\n")
+
+    def send_done(self):
+        self.send_event("done", "[DONE]")
+        self.end_stream()
+
+    def send_data(self, data):
+        payload = data if isinstance(data, str) else json.dumps(data)
+        self.send_chunk(f"data: {payload}\n\n")
+
+
+class FakeAssistantsAPI:
+    """A fake Assistants API server running on a background thread."""
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.state = FakeAssistantsState(config or FakeConfig())
+        self.server = ThreadingHTTPServer((host, port), FakeAssistantsHandler)
+        self.server.daemon_threads = True
+        self.server.state = self.state
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1/"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fake-assistants-api", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local fake of the OpenAI Assistants API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--run-latency", type=float, default=1.5)
+    parser.add_argument("--feedback-latency", type=float, default=20.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0)
+    parser.add_argument("--lost-response-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from case_registry import load_registry
+
+    config = FakeConfig(
+        run_latency=args.run_latency,
+        feedback_latency=args.feedback_latency,
+        run_failure_rate=args.failure_rate,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+        lost_response_rate=args.lost_response_rate,
+        feedback_assistants=[case.feedback_assistant_id for case in load_registry()],
+    )
+    api = FakeAssistantsAPI(config, args.host, args.port)
+    print(f"Fake Assistants API listening on {api.base_url}")
+    try:
+        api.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
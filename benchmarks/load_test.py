@@ -0,0 +1,336 @@
+# load_test.py
+#
+# Drives simulated students through app.py against the local fake Assistants API
+# and reports latency, API traffic, thread and memory figures as JSON.
+#
+#     python benchmarks/load_test.py --students 30 --turns 6 --output results.json
+#     python benchmarks/load_test.py --baseline results.json   # fail on regressions
+
+import argparse
+import json
+import math
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import openai
+import streamlit as st
+from streamlit.runtime.runtime import Runtime
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.runtime.secrets import Secrets
+from streamlit.testing.v1 import AppTest
+
+from case_registry import load_registry
+from chat_backend import ASSISTANTS, BACKENDS
+from feedback import FEEDBACK_MODES, WHOLE
+from fake_assistants_api import FakeAssistantsAPI, FakeConfig
+
+# The SDK flags every Assistants call as deprecated; that is noise here
+warnings.filterwarnings("ignore", category=DeprecationWarning)
+
+APP_PATH = os.path.join(ROOT, "app.py")
+FEEDBACK_HEADER = "📋 Comprehensive Feedback"
+
+# AppTest compiles the script afresh on every run, and concurrent ast.parse calls
+# can trip an interpreter race, so compilation is serialized across students
+COMPILE_LOCK = threading.Lock()
+_get_bytecode = ScriptCache.get_bytecode
+
+
+def get_bytecode_serialized(self, script_path):
+    with COMPILE_LOCK:
+        return _get_bytecode(self, script_path)
+
+
+ScriptCache.get_bytecode = get_bytecode_serialized
+
+# Each AppTest run installs a stand-in Runtime and clears it when done, which pulls it
+# out from under students still running; they fall back to the last one installed
+_last_runtime = None
+
+
+@classmethod
+def runtime_instance(cls):
+    global _last_runtime
+    if cls._instance is not None:
+        _last_runtime = cls._instance
+    if _last_runtime is None:
+        raise RuntimeError("Runtime hasn't been created!")
+    return _last_runtime
+
+
+Runtime.instance = runtime_instance
+
+# Metrics compared against a baseline run; a rise beyond the tolerance is a regression
+REGRESSION_METRICS = (
+    ("turn_latency", "p95"),
+    ("feedback_latency", "p95"),
+    ("api_calls_per_turn", None),
+    ("peak_threads", None),
+    ("peak_rss_mb", None),
+)
+
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile.
+
+    Args:
+        values (list): Samples
+        pct (float): Percentile between 0 and 100
+
+    Returns:
+        float: The percentile, or None if there are no samples
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(values):
+    """Return count/mean/p50/p95/p99/max of a list of latencies."""
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values),
+    }
+
+
+class ThreadSampler:
+    """Samples the process's live thread count in the background."""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, threading.active_count())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def rendered(at, result):
+    """
+    Check a script run produced a page, recording why not in `result`.
+
+    An exception raised by the app is an app failure. A page with nothing on it
+    means the script never ran (e.g. it failed to compile), which is a harness
+    problem rather than anything the app did.
+    """
+    if at.exception:
+        result["errors"].extend(f"Script raised: {exception.message}" for exception in at.exception)
+        return False
+    if not at.sidebar.selectbox:
+        result["harness_errors"].append("Script run rendered nothing")
+        return False
+    return True
+
+
+def simulate_student(index, args):
+    """Run one student's interview and feedback request; returns their timings."""
+    actors = load_registry().labels
+    result = {"turn_latencies": [], "feedback_latency": None, "errors": [], "harness_errors": []}
+
+    at = AppTest.from_file(APP_PATH, default_timeout=args.script_timeout)
+    at.run()
+    if not rendered(at, result):
+        return result
+    at.sidebar.selectbox[0].select(actors[index % len(actors)]).run()
+    if not rendered(at, result):
+        return result
+
+    for turn in range(args.turns):
+        start = time.perf_counter()
+        at.chat_input[0].set_value(f"Question {turn + 1} from student {index}").run()
+        result["turn_latencies"].append(time.perf_counter() - start)
+        if not rendered(at, result):
+            return result
+        result["errors"].extend(error.value for error in at.error)
+
+    if args.feedback:
+        feedback_buttons = [button for button in at.button if button.label == "Generate Feedback!"]
+        if not feedback_buttons:
+            result["errors"].append("Feedback button not shown")
+            return result
+        start = time.perf_counter()
+        feedback_buttons[0].click().run()
+        while time.perf_counter() - start < args.feedback_timeout:
+            if not rendered(at, result):
+                return result
+            if any(header.value == FEEDBACK_HEADER for header in at.subheader):
+                result["feedback_latency"] = time.perf_counter() - start
+                break
+            if at.error:
+                result["errors"].extend(error.value for error in at.error)
+                break
+            time.sleep(args.feedback_poll)
+            at.run()
+        else:
+            result["errors"].append("Feedback did not arrive in time")
+
+    return result
+
+
+def run_benchmark(args):
+    """Start the fake API, run every student concurrently and collect the report."""
+    config = FakeConfig(
+        run_latency=args.run_latency,
+        run_jitter=args.run_jitter,
+        feedback_latency=args.feedback_latency,
+        run_failure_rate=args.failure_rate,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+        lost_response_rate=args.lost_response_rate,
+        feedback_assistants=[case.feedback_assistant_id for case in load_registry()],
+    )
+    api = FakeAssistantsAPI(config).start()
+    openai.base_url = api.base_url
+    openai.api_key = "sk-fake"
+    # AppTest swaps st.secrets globally around each run when given per-test secrets,
+    # which races between concurrent students; install them once for everyone instead
+    st.secrets = Secrets()
+    st.secrets._secrets = {"OPENAI_API_KEY": "sk-fake"}
+    # Keep benchmark sessions out of the real session store
+    os.environ.setdefault("VPE_SESSION_DB", os.path.join(tempfile.mkdtemp(), "sessions.db"))
+    os.environ["VPE_CHAT_BACKEND"] = args.backend
+    os.environ["VPE_FEEDBACK_MODE"] = args.feedback_mode
+
+    started = time.perf_counter()
+    with ThreadSampler() as sampler, ThreadPoolExecutor(max_workers=args.students) as pool:
+        results = list(pool.map(lambda i: simulate_student(i, args), range(args.students)))
+    wall_time = time.perf_counter() - started
+
+    api_stats = api.state.stats()
+    api.stop()
+
+    turn_latencies = [latency for result in results for latency in result["turn_latencies"]]
+    feedback_latencies = [result["feedback_latency"] for result in results if result["feedback_latency"] is not None]
+    errors = [error for result in results for error in result["errors"]]
+    harness_errors = [error for result in results for error in result["harness_errors"]]
+
+    return {
+        "label": args.label,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "students": args.students,
+            "turns": args.turns,
+            "feedback": args.feedback,
+            "run_latency": args.run_latency,
+            "feedback_latency": args.feedback_latency,
+            "failure_rate": args.failure_rate,
+            "error_rate": args.error_rate,
+            "rate_limit": args.rate_limit,
+            "lost_response_rate": args.lost_response_rate,
+            "backend": args.backend,
+            "feedback_mode": args.feedback_mode,
+        },
+        "wall_time": wall_time,
+        "turn_latency": summarize(turn_latencies),
+        "feedback_latency": summarize(feedback_latencies),
+        # Chat thread calls for the assistants backend, chat completions for the completions backend
+        "api_calls_per_turn": (api_stats["chat_thread_calls"] + api_stats["calls"].get("chat.completions.stream", 0))
+                              / len(turn_latencies) if turn_latencies else None,
+        "api": api_stats,
+        "peak_threads": sampler.peak,
+        # ru_maxrss is reported in kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "error_count": len(errors),
+        "errors": sorted(set(errors))[:20],
+        # Problems driving the app rather than in it; a run with any is not a fair measurement
+        "harness_error_count": len(harness_errors),
+        "harness_errors": sorted(set(harness_errors))[:20],
+    }
+
+
+def compare(report, baseline, tolerance):
+    """
+    Compare a report to a baseline.
+
+    Returns:
+        list: Descriptions of metrics that got worse by more than the tolerance
+    """
+    regressions = []
+    for metric, field in REGRESSION_METRICS:
+        current = report.get(metric)
+        previous = baseline.get(metric)
+        if field is not None:
+            current = (current or {}).get(field)
+            previous = (previous or {}).get(field)
+        if current is None or not previous:
+            continue
+        if current > previous * (1 + tolerance):
+            name = f"{metric}.{field}" if field else metric
+            regressions.append(f"{name}: {previous:.3f} -> {current:.3f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test app.py against a fake Assistants API.")
+    parser.add_argument("--students", type=int, default=20, help="concurrent simulated students")
+    parser.add_argument("--turns", type=int, default=6, help="chat turns per student")
+    parser.add_argument("--no-feedback", dest="feedback", action="store_false", help="skip feedback generation")
+    parser.add_argument("--run-latency", type=float, default=1.5, help="mean seconds per chat run")
+    parser.add_argument("--run-jitter", type=float, default=0.5, help="+/- seconds of run latency jitter")
+    parser.add_argument("--feedback-latency", type=float, default=10.0, help="mean seconds per feedback run")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of runs that fail")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with HTTP 500")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="requests/second before HTTP 429 (0 = off)")
+    parser.add_argument("--lost-response-rate", type=float, default=0.0,
+                        help="share of message/run creates applied but answered with HTTP 500")
+    parser.add_argument("--backend", choices=BACKENDS, default=ASSISTANTS, help="chat backend the app uses")
+    parser.add_argument("--feedback-mode", choices=FEEDBACK_MODES, default=WHOLE,
+                        help="grade feedback in one run or one run per domain")
+    parser.add_argument("--script-timeout", type=float, default=120.0, help="seconds allowed per script run")
+    parser.add_argument("--feedback-timeout", type=float, default=240.0, help="seconds to wait for feedback")
+    parser.add_argument("--feedback-poll", type=float, default=0.5, help="seconds between feedback reruns")
+    parser.add_argument("--label", default="", help="free-form label stored in the report, e.g. a release tag")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative slowdown vs the baseline")
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    if report["harness_error_count"]:
+        print(f"HARNESS ERRORS {report['harness_error_count']}; results are not comparable", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+# render_benchmark.py
+#
+# Measures how the cost of a chat turn grows with conversation length. For each
+# history size it times a full-page rerun and a chat turn run the way the browser
+# runs it (only the chat fragment), against the local fake Assistants API. Turn
+# overheads exclude the turn's own API time (its "chat.turn" latency), leaving
+# the rerun work that history length can affect.
+#
+#     python benchmarks/render_benchmark.py --history 0 20 40 60 120
+#
+# Exits non-zero if the fragment turn overhead at the longest history is more
+# than --max-growth times the overhead at the shortest.
+
+import argparse
+import functools
+import json
+import os
+import sys
+import tempfile
+import time
+import warnings
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import openai
+import streamlit as st
+from streamlit.runtime.scriptrunner_utils.script_requests import RerunData
+from streamlit.runtime.secrets import Secrets
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1 import local_script_runner
+
+from case_registry import load_registry
+from fake_assistants_api import FakeAssistantsAPI, FakeConfig
+
+# The SDK flags every Assistants call as deprecated; that is noise here
+warnings.filterwarnings("ignore", category=DeprecationWarning)
+
+APP_PATH = os.path.join(ROOT, "app.py")
+
+
+def seeded_history(turns):
+    """Return `turns` user/assistant message pairs of realistic length."""
+    messages = []
+    for turn in range(turns):
+        messages.append({"role": "user", "content": f"Question {turn}: " + "could you tell me more " * 4})
+        messages.append({"role": "assistant", "content": f"Reply {turn}: " + "lorem ipsum dolor sit amet " * 12})
+    return messages
+
+
+def run_fragment(at):
+    """
+    Rerun only the app's chat fragment, as the browser does after a chat input.
+
+    AppTest always reruns the whole script, so the rerun request is given the
+    fragment's ID the way Streamlit's own session would.
+    """
+    fragment_ids = list(at._fragment_storage._fragments)
+    with mock.patch.object(local_script_runner, "RerunData",
+                           functools.partial(RerunData, fragment_id_queue=fragment_ids)):
+        return at.run()
+
+
+def time_turn(at, prompt, fragment):
+    """Send one chat message; return its wall time and the part spent outside the API."""
+    at.chat_input[0].set_value(prompt)
+    started = time.perf_counter()
+    if fragment:
+        run_fragment(at)
+    else:
+        at.run()
+    elapsed = time.perf_counter() - started
+    api_time = at.session_state["latency_breakdowns"][-1].get("chat.turn", 0.0)
+    return elapsed, elapsed - api_time
+
+
+def measure(turns, args):
+    """Time full reruns and chat turns (full-page and fragment-only) with `turns` turns of history."""
+    actor = load_registry().labels[0]
+    at = AppTest.from_file(APP_PATH, default_timeout=args.script_timeout)
+    at.session_state["selected_actor"] = actor
+    at.session_state["actor_selector"] = actor
+    at.session_state["messages"] = seeded_history(turns)
+    at.run()
+    # Warm up: the first turn also takes a thread and opens connections
+    time_turn(at, "Warm-up question", fragment=False)
+
+    started = time.perf_counter()
+    for _ in range(args.reps):
+        at.run()
+    full_rerun = (time.perf_counter() - started) / args.reps
+
+    # A chat turn before the chat area became a fragment: the whole page reruns
+    full_turns = [time_turn(at, f"Full-page question {rep}", fragment=False) for rep in range(args.reps)]
+    # The same turn now: only the chat fragment reruns
+    fragment_turns = [time_turn(at, f"Fragment question {rep}", fragment=True) for rep in range(args.reps)]
+
+    def mean_ms(samples, index):
+        return sum(sample[index] for sample in samples) / len(samples) * 1000
+
+    return {
+        "history_turns": turns,
+        "full_rerun_ms": full_rerun * 1000,
+        "full_page_turn_ms": mean_ms(full_turns, 0),
+        "full_page_turn_overhead_ms": mean_ms(full_turns, 1),
+        "fragment_turn_ms": mean_ms(fragment_turns, 0),
+        "fragment_turn_overhead_ms": mean_ms(fragment_turns, 1),
+        "errors": [error.value for error in at.error],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chat rerun cost against conversation length.")
+    parser.add_argument("--history", type=int, nargs="+", default=[0, 20, 40, 60, 120],
+                        help="turns of seeded history to measure")
+    parser.add_argument("--reps", type=int, default=5, help="reruns and turns timed per history size")
+    parser.add_argument("--script-timeout", type=float, default=60.0, help="seconds allowed per script run")
+    parser.add_argument("--max-growth", type=float, default=1.5,
+                        help="allowed fragment turn overhead at the longest history vs the shortest")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    # Instant runs, so the timings are the app's own work plus local HTTP
+    api = FakeAssistantsAPI(FakeConfig(run_latency=0.0, run_jitter=0.0, reply_words=40)).start()
+    openai.base_url = api.base_url
+    openai.api_key = "sk-fake"
+    st.secrets = Secrets()
+    st.secrets._secrets = {"OPENAI_API_KEY": "sk-fake"}
+    # Keep benchmark sessions out of the real session store
+    os.environ.setdefault("VPE_SESSION_DB", os.path.join(tempfile.mkdtemp(), "sessions.db"))
+
+    results = [measure(turns, args) for turns in sorted(args.history)]
+    api.stop()
+
+    first, last = results[0]["fragment_turn_overhead_ms"], results[-1]["fragment_turn_overhead_ms"]
+    growth = last / first if first else None
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+        "fragment_turn_growth": growth,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if growth is not None and growth > args.max_growth:
+        print(f"REGRESSION fragment turn overhead grew {growth:.2f}x with history "
+              f"(allowed {args.max_growth:.2f}x)", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# replica_benchmark.py
+#
+# Runs the load test in N separate processes that share one session database
+# and one shared state file, the way replicas behind a load balancer would,
+# and compares their combined chat throughput with a single process carrying
+# the same number of students each.
+#
+#     python benchmarks/replica_benchmark.py --replicas 4 --students 20 --turns 4
+#
+# Exits non-zero if N replicas manage less than --min-efficiency of N times the
+# single-process throughput.
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+LOAD_TEST = os.path.join(HERE, "load_test.py")
+
+
+def run_replicas(count, args, directory):
+    """Run `count` load test processes at once on shared state files and return their reports."""
+    env = dict(os.environ,
+               VPE_SESSION_DB=os.path.join(directory, f"sessions-{count}.db"),
+               VPE_SHARED_STATE=os.path.join(directory, f"shared-{count}.db"))
+    outputs = [os.path.join(directory, f"replica-{count}-{index}.json") for index in range(count)]
+    command = [sys.executable, LOAD_TEST, "--students", str(args.students), "--turns", str(args.turns),
+               "--run-latency", str(args.run_latency), "--backend", args.backend]
+    if not args.feedback:
+        command.append("--no-feedback")
+    processes = [subprocess.Popen(command + ["--output", output], env=env, stdout=subprocess.DEVNULL)
+                 for output in outputs]
+    for process in processes:
+        if process.wait() != 0:
+            sys.exit(f"a load test process exited with {process.returncode}")
+    reports = []
+    for output in outputs:
+        with open(output, encoding="utf-8") as f:
+            reports.append(json.load(f))
+    return reports
+
+
+def throughput(reports):
+    """Chat turns per second across the reports, over the slowest one's wall time."""
+    turns = sum(report["turn_latency"]["count"] for report in reports)
+    return turns / max(report["wall_time"] for report in reports)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark throughput across app replicas sharing state.")
+    parser.add_argument("--replicas", type=int, default=4, help="processes to run side by side")
+    parser.add_argument("--students", type=int, default=20, help="concurrent simulated students per process")
+    parser.add_argument("--turns", type=int, default=4, help="chat turns per student")
+    parser.add_argument("--run-latency", type=float, default=1.5, help="mean seconds per chat run")
+    parser.add_argument("--no-feedback", dest="feedback", action="store_false", help="skip feedback generation")
+    parser.add_argument("--backend", default="assistants", help="chat backend the app uses")
+    parser.add_argument("--min-efficiency", type=float, default=0.7,
+                        help="required share of linear scaling from one process to --replicas")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    single = run_replicas(1, args, directory)
+    several = run_replicas(args.replicas, args, directory)
+    single_throughput = throughput(single)
+    several_throughput = throughput(several)
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "replicas": args.replicas,
+        "students_per_replica": args.students,
+        "turns_per_second_1": single_throughput,
+        f"turns_per_second_{args.replicas}": several_throughput,
+        "scaling_efficiency": several_throughput / (args.replicas * single_throughput),
+        "turn_latency_p95_1": single[0]["turn_latency"]["p95"],
+        f"turn_latency_p95_{args.replicas}": max(report["turn_latency"]["p95"] for report in several),
+        "errors": sum(report["error_count"] for report in single + several),
+        "harness_errors": sum(report["harness_error_count"] for report in single + several),
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if report["scaling_efficiency"] < args.min_efficiency:
+        print(f"REGRESSION {args.replicas} replicas reached {report['scaling_efficiency']:.2f} of linear "
+              f"throughput (required {args.min_efficiency:.2f})", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
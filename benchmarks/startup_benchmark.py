@@ -0,0 +1,117 @@
+# startup_benchmark.py
+#
+# Measures what the app costs before it does any work for a student: the first
+# script run in a fresh process (imports included), each later rerun of an idle
+# page, and the connections to the API opened per chat turn once the process
+# is warm. Runs against the local fake API.
+#
+#     python benchmarks/startup_benchmark.py --reruns 30 --turns 10
+#
+# Exits non-zero if warm chat turns open more than --max-connections-per-turn
+# new connections, or if a module only some pages need was loaded at startup.
+
+import argparse
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import streamlit as st
+from streamlit.runtime.secrets import Secrets
+from streamlit.testing.v1 import AppTest
+
+from fake_assistants_api import FakeAssistantsAPI, FakeConfig
+
+# Loaded only once a page needs them: analytics for admins, WebRTC for voice
+DEFERRED_MODULES = ("pandas", "streamlit_webrtc", "aiortc", "numpy")
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark startup, rerun overhead and connection reuse.")
+    parser.add_argument("--reruns", type=int, default=30, help="idle reruns to time")
+    parser.add_argument("--warmup-turns", type=int, default=3, help="chat turns before connections are counted")
+    parser.add_argument("--turns", type=int, default=10, help="chat turns to count connections over")
+    parser.add_argument("--run-latency", type=float, default=0.3, help="mean seconds per chat run")
+    parser.add_argument("--max-connections-per-turn", type=float, default=0.1,
+                        help="allowed new connections per warm chat turn")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore")
+    api = FakeAssistantsAPI(FakeConfig(run_latency=args.run_latency, run_jitter=0)).start()
+    # Through the environment, so the first script run is the one that imports openai
+    os.environ["OPENAI_BASE_URL"] = api.base_url
+    os.environ.setdefault("VPE_SESSION_DB", os.path.join(tempfile.mkdtemp(), "sessions.db"))
+    # Background grading would open connections of its own alongside the turns
+    os.environ["VPE_PREGRADE"] = "0"
+    st.secrets = Secrets()
+    st.secrets._secrets = {"OPENAI_API_KEY": "sk-fake"}
+
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=120)
+    started = time.perf_counter()
+    at.run()
+    first_run = time.perf_counter() - started
+    loaded_at_startup = [name for name in DEFERRED_MODULES if name in sys.modules]
+
+    reruns = []
+    for _ in range(args.reruns):
+        started = time.perf_counter()
+        at.run()
+        reruns.append(time.perf_counter() - started)
+
+    for turn in range(args.warmup_turns):
+        at.chat_input[0].set_value(f"Warm-up question {turn + 1}").run()
+    before = api.state.stats()
+    turn_times = []
+    for turn in range(args.turns):
+        started = time.perf_counter()
+        at.chat_input[0].set_value(f"Question {turn + 1}").run()
+        turn_times.append(time.perf_counter() - started)
+    after = api.state.stats()
+    api.stop()
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "first_run_seconds": first_run,
+        "rerun_p50": percentile(reruns, 50),
+        "rerun_p95": percentile(reruns, 95),
+        "turn_p50": percentile(turn_times, 50),
+        "api_calls_per_turn": (after["total_calls"] - before["total_calls"]) / args.turns,
+        "new_connections_per_turn": (after["connections"] - before["connections"]) / args.turns,
+        "deferred_modules_loaded_at_startup": loaded_at_startup,
+        "errors": [error.value for error in at.error],
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    failures = []
+    if report["new_connections_per_turn"] > args.max_connections_per_turn:
+        failures.append(f"warm chat turns opened {report['new_connections_per_turn']:.2f} connections each "
+                        f"(allowed {args.max_connections_per_turn:.2f})")
+    if loaded_at_startup:
+        failures.append(f"{', '.join(loaded_at_startup)} loaded by the first script run")
+    if report["errors"]:
+        failures.append(f"the app showed errors: {report['errors'][:3]}")
+    for failure in failures:
+        print(f"REGRESSION {failure}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
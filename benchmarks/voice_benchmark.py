@@ -0,0 +1,167 @@
+# voice_benchmark.py
+#
+# Runs concurrent voice sessions on synthetic microphone audio with the local
+# speech-to-text and text-to-speech stand-ins, and reports the end-of-speech to
+# first-audio latency and the share of a CPU core each session's audio
+# callback uses. The stand-ins' delays, and the chat model's time to first
+# token, are simulated with the --*-delay options.
+#
+#     python benchmarks/voice_benchmark.py --sessions 20 --utterances 3
+#
+# Exits non-zero if the p95 latency is over --latency-target or any session's
+# callback uses more than --max-cpu-share of a core.
+
+import argparse
+import json
+import math
+import os
+import queue
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+from voice import LocalSpeechToText, LocalTextToSpeech, VoiceSession
+
+RATE = 48000  # what browsers send over WebRTC
+CHANNELS = 2
+FRAME_SAMPLES = 960  # 20 ms
+REPLY = ("I've had this pain for about three days now. It started after dinner. "
+         "It gets worse when I lie down, and nothing I take seems to help.")
+
+
+def synthetic_frames(seconds, level, rng, start=0):
+    """Yield 20 ms interleaved stereo frames of room noise, plus a voiced tone if `level` is set."""
+    for index in range(int(seconds * RATE / FRAME_SAMPLES)):
+        t = (np.arange(FRAME_SAMPLES) + (start + index) * FRAME_SAMPLES) / RATE
+        signal = rng.normal(0, 40, FRAME_SAMPLES)
+        if level:
+            # A 150 Hz voice with harmonics, its loudness varying like syllables
+            voice = sum(np.sin(2 * np.pi * 150 * k * t) / k for k in range(1, 6))
+            signal += level * voice * (0.6 + 0.4 * np.sin(2 * np.pi * 4 * t))
+        yield np.repeat(np.clip(signal, -32768, 32767).astype(np.int16), CHANNELS)
+
+
+def run_session(index, args, results):
+    """Feed one session `args.utterances` utterances in real time, answering each like the app would."""
+    rng = np.random.default_rng(index)
+    session = VoiceSession(LocalSpeechToText(delay=args.stt_delay), LocalTextToSpeech(delay=args.tts_delay),
+                           latency_target=args.latency_target)
+    done = threading.Event()
+
+    def answer():
+        # Stands in for the app's voice fragment and the chat model
+        answered = 0
+        while answered < args.utterances and not done.is_set():
+            try:
+                utterance = session.utterances.get(timeout=args.poll_interval)
+            except queue.Empty:
+                continue
+            reply = session.reply(utterance.ended_at)
+            time.sleep(args.reply_delay)
+            for word in REPLY.split(" "):
+                reply.feed(word + " ")
+                time.sleep(args.token_interval)
+            reply.close()
+            answered += 1
+
+    answerer = threading.Thread(target=answer, daemon=True)
+    answerer.start()
+    out = np.zeros(FRAME_SAMPLES * CHANNELS, dtype=np.int16)
+    started = time.perf_counter()
+    position = 0
+    script = [(0.5, 0)] + [(args.speech_seconds, 6000), (args.pause_seconds, 0)] * args.utterances
+    for seconds, level in script:
+        for frame in synthetic_frames(seconds, level, rng, position):
+            session.process_pcm(frame, CHANNELS, RATE, out)
+            position += 1
+            # Real time, as WebRTC delivers frames
+            delay = started + position * FRAME_SAMPLES / RATE - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+    done.set()
+    answerer.join(timeout=5)
+    session.close()
+    results[index] = {"latencies": list(session.latencies), **session.stats()}
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark voice session latency and CPU use.")
+    parser.add_argument("--sessions", type=int, default=20, help="concurrent voice sessions")
+    parser.add_argument("--utterances", type=int, default=3, help="utterances each session speaks")
+    parser.add_argument("--speech-seconds", type=float, default=2.0, help="length of each utterance")
+    parser.add_argument("--pause-seconds", type=float, default=4.0, help="silence after each utterance")
+    parser.add_argument("--stt-delay", type=float, default=0.3, help="simulated transcription time")
+    parser.add_argument("--tts-delay", type=float, default=0.2, help="simulated time to first synthesized audio")
+    parser.add_argument("--reply-delay", type=float, default=0.4, help="simulated chat model time to first token")
+    parser.add_argument("--token-interval", type=float, default=0.02, help="simulated time between reply tokens")
+    parser.add_argument("--poll-interval", type=float, default=0.25,
+                        help="how often finished utterances are picked up (app.py's VOICE_POLL_INTERVAL)")
+    parser.add_argument("--latency-target", type=float, default=1.5,
+                        help="allowed p95 seconds from end of speech to first audio")
+    parser.add_argument("--max-cpu-share", type=float, default=0.02,
+                        help="allowed share of a CPU core per session's audio callback")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    results = [None] * args.sessions
+    cpu_started = time.process_time()
+    wall_started = time.perf_counter()
+    threads = [threading.Thread(target=run_session, args=(index, args, results)) for index in range(args.sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - wall_started
+    cpu = time.process_time() - cpu_started
+
+    latencies = [latency for result in results for latency in result["latencies"]]
+    max_cpu_share = max(result["cpu_share"] for result in results)
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "sessions": args.sessions,
+        "utterances": sum(result["utterances"] for result in results),
+        "replies_heard": len(latencies),
+        "first_audio_p50": percentile(latencies, 0.5),
+        "first_audio_p95": percentile(latencies, 0.95),
+        "first_audio_max": max(latencies, default=None),
+        "callback_cpu_share_max": max_cpu_share,
+        "process_cpu_share_per_session": cpu / wall / args.sessions,
+        "errors": sum(result["errors"] for result in results),
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    failures = []
+    p95 = report["first_audio_p95"]
+    if p95 is None or p95 > args.latency_target:
+        failures.append(f"p95 first-audio latency {p95} is over {args.latency_target}s")
+    if max_cpu_share > args.max_cpu_share:
+        failures.append(f"a session's audio callback used {max_cpu_share:.3f} of a core "
+                        f"(allowed {args.max_cpu_share:.3f})")
+    if report["replies_heard"] < report["utterances"] or report["utterances"] < args.sessions * args.utterances:
+        failures.append(f"{report['utterances']} utterances detected and {report['replies_heard']} replies heard, "
+                        f"expected {args.sessions * args.utterances}")
+    for failure in failures:
+        print(f"REGRESSION {failure}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
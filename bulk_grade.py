@@ -0,0 +1,328 @@
+# bulk_grade.py
+#
+# Grades saved interview transcripts from the command line, e.g. to regrade a
+# cohort after a rubric change:
+#
+#     python bulk_grade.py cohort.jsonl --output grades.jsonl --concurrency 16
+#     python bulk_grade.py transcripts/ --output grades.jsonl   # rerun to resume
+#
+# Input is a JSONL file or a directory of .json/.jsonl files. Each record is an
+# object with an optional "id", the patient as "patient" (a name) or "actor" (the
+# app's selection label), and the conversation as "transcript" (rendered text) or
+# "messages" ([{"role": ..., "content": ...}, ...]).
+#
+# Results are appended to the output JSONL as they finish, one line per record.
+# Records already graded successfully there are skipped, so an interrupted run
+# picks up where it stopped; failed ones are tried again.
+#
+# Reads OPENAI_API_KEY (and OPENAI_BASE_URL, if set) from the environment.
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from case_registry import load_registry
+from chat_backend import ASSISTANTS, BACKENDS, make_backend
+from feedback import request_feedback
+from feedback_cache import FeedbackCache
+from openai_client import OpenAIConnectionPool, MAX_CONNECTIONS
+from rate_limiter import RateLimiter, AdmissionTimeout, FEEDBACK, POLL
+from resilience import CircuitBreaker, CircuitOpen, RETRYABLE_ERRORS
+from run_poller import RunPoller, retrieve_run
+from transcript import Transcript, FEEDBACK_TOKEN_BUDGET
+
+DEFAULT_CONCURRENCY = 8  # feedback runs in flight at once
+FEEDBACK_TIMEOUT = 180  # seconds allowed per transcript, as in the app
+FEEDBACK_RUN_TOKENS = 3000  # rubric instructions plus the report, on top of the transcript
+POLL_ADMISSION_TIMEOUT = 10  # seconds a status poll may queue before it is skipped
+PENDING_PER_WORKER = 2  # records read ahead of the workers, so huge inputs aren't loaded at once
+
+OK = "ok"
+ERROR = "error"
+
+
+def load_records(path):
+    """
+    Read transcript records from a JSONL file or a directory of .json/.jsonl files.
+
+    Records without an "id" get one from their file name (and line number).
+
+    Args:
+        path (str): File or directory
+
+    Yields:
+        dict: One record per transcript
+    """
+    if os.path.isdir(path):
+        files = sorted(name for name in os.listdir(path) if name.endswith((".json", ".jsonl")))
+        for name in files:
+            stem = os.path.splitext(name)[0]
+            file_path = os.path.join(path, name)
+            if name.endswith(".json"):
+                with open(file_path, encoding="utf-8") as f:
+                    record = json.load(f)
+                record.setdefault("id", stem)
+                yield record
+            else:
+                yield from _read_jsonl(file_path, prefix=f"{stem}:")
+    else:
+        yield from _read_jsonl(path)
+
+
+def _read_jsonl(path, prefix=""):
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if line.strip():
+                record = json.loads(line)
+                record.setdefault("id", f"{prefix}{line_number}")
+                yield record
+
+
+def load_checkpoint(output):
+    """
+    Return the IDs already graded successfully in an earlier run's output.
+
+    Args:
+        output (str): Output JSONL path (may not exist yet)
+
+    Returns:
+        set: Record IDs to skip
+    """
+    done = set()
+    if not os.path.exists(output):
+        return done
+    with open(output, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                # A line cut short by an interrupted write; that record is graded again
+                continue
+            if result.get("status") == OK:
+                done.add(str(result["id"]))
+    return done
+
+
+def prepare(record, cases, transcript_tokens=FEEDBACK_TOKEN_BUDGET):
+    """
+    Work out a record's patient, feedback assistant and rendered transcript.
+
+    Records with "messages" are condensed to `transcript_tokens` the way the app
+    does it; a "transcript" that is already text is used as is.
+
+    Args:
+        record (dict): A record from load_records
+        cases (CaseRegistry): The cases to look the patient up in
+        transcript_tokens (int): Token budget for the transcript
+
+    Returns:
+        tuple: (patient_name, feedback assistant ID, transcript text, compaction dict or None)
+
+    Raises:
+        ValueError: If the record is missing the patient or the conversation
+    """
+    if record.get("patient"):
+        patient_name = record["patient"]
+    elif record.get("actor"):
+        case = cases.get(record["actor"])
+        if case is None:
+            raise ValueError(f"unknown case {record['actor']!r}")
+        patient_name = case.patient
+    else:
+        raise ValueError("record has neither 'patient' nor 'actor'")
+
+    assistant_id, _ = cases.feedback_assistant(patient_name)
+
+    compaction = None
+    if record.get("transcript"):
+        transcript = record["transcript"]
+    elif record.get("messages"):
+        transcript, compaction = Transcript.from_messages(record["messages"]).compact(transcript_tokens)
+    else:
+        raise ValueError("record has neither 'transcript' nor 'messages'")
+    return patient_name, assistant_id, transcript, compaction
+
+
+class ResultWriter:
+    """Appends results to the output JSONL, one flushed line each, from any thread."""
+
+    def __init__(self, path):
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def write(self, result):
+        line = json.dumps(result, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class BulkGrader:
+    """Grades records concurrently through the same rate limiter, breaker and poller wiring as the app."""
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, timeout=FEEDBACK_TIMEOUT,
+                 requests_per_minute=3000, tokens_per_minute=1000000, cache_dir=None,
+                 transcript_tokens=FEEDBACK_TOKEN_BUDGET, backend=ASSISTANTS):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.transcript_tokens = transcript_tokens
+        self.cases = load_registry()
+        self.backend = make_backend(backend)
+        self.limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self.breaker = CircuitBreaker()
+        limited_retrieve = self.limiter.limited(retrieve_run, POLL, timeout=POLL_ADMISSION_TIMEOUT)
+        self.poller = RunPoller(
+            retrieve=self.breaker.guard(limited_retrieve),
+            transient_errors=(AdmissionTimeout, CircuitOpen) + RETRYABLE_ERRORS,
+        )
+        # Off by default: a changed rubric keeps its assistant ID, so cached reports would be stale
+        self.cache = FeedbackCache(directory=cache_dir) if cache_dir else None
+
+    def admit(self, tokens=0):
+        # Batch work has nowhere better to be, so it waits for admission as long as it takes
+        self.limiter.admit(FEEDBACK, tokens)
+
+    def grade(self, record):
+        """
+        Grade one record.
+
+        Returns:
+            dict: The output line, with status "ok" and the feedback or "error" and the reason
+        """
+        started = time.perf_counter()
+        result = {"id": str(record["id"])}
+        try:
+            patient_name, assistant_id, transcript, compaction = prepare(record, self.cases, self.transcript_tokens)
+            result.update(patient=patient_name, feedback_assistant=assistant_id)
+            if compaction is not None:
+                result["compaction"] = compaction
+
+            def grade():
+                return request_feedback(
+                    assistant_id, patient_name, transcript, self.poller, self.timeout,
+                    admit=self.admit, reply_tokens=FEEDBACK_RUN_TOKENS, breaker=self.breaker,
+                    backend=self.backend,
+                )
+
+            if self.cache is not None:
+                key = self.cache.make_key(assistant_id, transcript)
+                feedback = self.cache.get(key)
+                if feedback is None:
+                    feedback = self.cache.compute(key, grade)
+            else:
+                feedback = grade()
+            result.update(status=OK, feedback=feedback)
+        except Exception as e:
+            result.update(status=ERROR, error=str(e) or type(e).__name__)
+        result["seconds"] = round(time.perf_counter() - started, 3)
+        result["graded_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        return result
+
+    def run(self, records, writer, skip=(), progress=None):
+        """
+        Grade every record not in `skip`, writing each result as it finishes.
+
+        Args:
+            records (iterable): Records from load_records
+            writer (ResultWriter): Destination for results
+            skip (set): IDs graded in an earlier run
+            progress (callable): Called with each result as it is written
+
+        Returns:
+            dict: Counts of graded, failed and skipped records
+        """
+        counts = {"graded": 0, "failed": 0, "skipped": 0}
+        pending = set()
+
+        def collect(block):
+            done, _ = wait(pending, return_when=FIRST_COMPLETED) if block else (
+                {future for future in pending if future.done()}, None)
+            for future in done:
+                pending.discard(future)
+                result = future.result()
+                writer.write(result)
+                counts["graded" if result["status"] == OK else "failed"] += 1
+                if progress is not None:
+                    progress(result)
+
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="bulk-grade")
+        try:
+            for record in records:
+                if str(record.get("id")) in skip:
+                    counts["skipped"] += 1
+                    continue
+                while len(pending) >= self.concurrency * PENDING_PER_WORKER:
+                    collect(block=True)
+                pending.add(executor.submit(self.grade, record))
+                collect(block=False)
+            while pending:
+                collect(block=True)
+        finally:
+            # On Ctrl-C, drop what hasn't started; whatever was written is kept for the resume
+            executor.shutdown(wait=False, cancel_futures=True)
+        return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Grade saved VPE transcripts with the feedback assistants.")
+    parser.add_argument("input", help="JSONL file or directory of .json/.jsonl transcript records")
+    parser.add_argument("--output", required=True, help="results JSONL; also the checkpoint that reruns resume from")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="feedback runs in flight at once")
+    parser.add_argument("--timeout", type=float, default=FEEDBACK_TIMEOUT, help="seconds allowed per transcript")
+    parser.add_argument("--requests-per-minute", type=int,
+                        default=int(os.environ.get("VPE_REQUESTS_PER_MINUTE", 3000)), help="OpenAI request budget")
+    parser.add_argument("--tokens-per-minute", type=int,
+                        default=int(os.environ.get("VPE_TOKENS_PER_MINUTE", 1000000)), help="OpenAI token budget")
+    parser.add_argument("--cache-dir", help="reuse and store reports in this feedback cache directory "
+                                            "(leave unset when regrading after a rubric change)")
+    parser.add_argument("--transcript-tokens", type=int,
+                        default=int(os.environ.get("VPE_FEEDBACK_TRANSCRIPT_TOKENS", FEEDBACK_TOKEN_BUDGET)),
+                        help="condense older turns of transcripts longer than this")
+    parser.add_argument("--backend", choices=BACKENDS, default=os.environ.get("VPE_CHAT_BACKEND", ASSISTANTS),
+                        help="grade with feedback threads and runs, or with one completion per transcript")
+    args = parser.parse_args()
+
+    if not os.environ.get("OPENAI_API_KEY"):
+        parser.error("OPENAI_API_KEY is not set")
+    # One keep-alive connection pool for every worker, with retries left to call_with_retry, as in the app
+    OpenAIConnectionPool(os.environ["OPENAI_API_KEY"], timeout=args.timeout,
+                         max_connections=max(MAX_CONNECTIONS, 2 * args.concurrency)).install()
+
+    skip = load_checkpoint(args.output)
+    grader = BulkGrader(args.concurrency, args.timeout, args.requests_per_minute,
+                        args.tokens_per_minute, args.cache_dir, args.transcript_tokens, args.backend)
+    writer = ResultWriter(args.output)
+    started = time.perf_counter()
+    finished = 0
+
+    def report(result):
+        nonlocal finished
+        finished += 1
+        detail = f"{result['seconds']:.1f}s" if result["status"] == OK else result["error"]
+        print(f"[{finished}] {result['id']} {result['status']} {detail}", file=sys.stderr)
+
+    try:
+        counts = grader.run(load_records(args.input), writer, skip, progress=report)
+    except KeyboardInterrupt:
+        print(f"Interrupted after {finished} transcripts; rerun the same command to resume.", file=sys.stderr)
+        sys.exit(130)
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - started
+    rate = counts["graded"] / elapsed * 60 if elapsed else 0.0
+    print(f"Graded {counts['graded']}, failed {counts['failed']}, skipped {counts['skipped']} "
+          f"(already done) in {elapsed:.0f}s, {rate:.1f} per minute", file=sys.stderr)
+    if counts["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+# case_registry.py
+
+import logging
+import os
+import threading
+import time
+import tomllib
+
+CASES_FILE = os.environ.get(  # TOML file with every case
+    "VPE_CASES_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cases.toml"))
+REQUIRED_FIELDS = ("label", "patient", "specialty", "assistant_id", "feedback_assistant_id", "prompt")
+RELOAD_CHECK_INTERVAL = 2  # seconds between checks of the data file for edits
+
+logger = logging.getLogger("vpe.cases")
+
+
+class CaseError(ValueError):
+    """Raised when the case data file is missing fields or contradicts itself."""
+
+
+class Case:
+    """One virtual patient encounter."""
+
+    def __init__(self, label, patient, specialty, assistant_id, feedback_assistant_id, prompt):
+        self.label = label
+        self.patient = patient
+        self.specialty = specialty
+        self.assistant_id = assistant_id
+        self.feedback_assistant_id = feedback_assistant_id
+        self.prompt = prompt
+
+
+class CaseRegistry:
+    """
+    Every case, with indexes built once so each lookup is a dict access.
+
+    Cases keep the order of the data file, which is the order the app lists them in.
+    """
+
+    def __init__(self, cases):
+        self.cases = tuple(cases)
+        self.labels = tuple(case.label for case in self.cases)
+        self._by_label = {case.label: case for case in self.cases}
+        self._by_patient = {case.patient: case for case in self.cases}
+        self._by_assistant = {}
+        self._by_specialty = {}
+        for case in self.cases:
+            self._by_assistant[case.assistant_id] = case
+            self._by_assistant[case.feedback_assistant_id] = case
+            self._by_specialty.setdefault(case.specialty, []).append(case)
+        self.specialties = tuple(self._by_specialty)
+        # Used for patients without a case of their own, e.g. transcripts from a retired case
+        self.default_feedback_assistant_id = self.cases[0].feedback_assistant_id if self.cases else None
+
+    def __len__(self):
+        return len(self.cases)
+
+    def __iter__(self):
+        return iter(self.cases)
+
+    def __contains__(self, label):
+        return label in self._by_label
+
+    def get(self, label):
+        """Return the case shown as `label`, or None."""
+        return self._by_label.get(label)
+
+    def by_patient(self, patient_name):
+        """Return the case for a patient, or None."""
+        return self._by_patient.get(patient_name)
+
+    def by_assistant(self, assistant_id):
+        """Return the case using a patient or feedback assistant ID, or None."""
+        return self._by_assistant.get(assistant_id)
+
+    def in_specialty(self, specialty):
+        """Return the cases in a specialty, in file order."""
+        return tuple(self._by_specialty.get(specialty, ()))
+
+    def feedback_assistant(self, patient_name):
+        """
+        Pick the feedback assistant for a patient.
+
+        Args:
+            patient_name (str): The name of the patient
+
+        Returns:
+            tuple: (feedback assistant ID or None if there are no cases, True if the
+                patient has no case of their own and the default was used)
+        """
+        case = self._by_patient.get(patient_name)
+        if case is not None:
+            return case.feedback_assistant_id, False
+        return self.default_feedback_assistant_id, True
+
+
+def validate(records):
+    """
+    Check raw case records and build Cases from them.
+
+    Args:
+        records (list): Dicts as read from the data file
+
+    Returns:
+        list: The cases, in file order
+
+    Raises:
+        CaseError: Listing every problem found, not just the first
+    """
+    problems = []
+    cases = []
+    seen = {"label": set(), "patient": set(), "assistant_id": set()}
+    for index, record in enumerate(records, 1):
+        name = record.get("label") or f"case #{index}"
+        missing = [field for field in REQUIRED_FIELDS if not str(record.get(field) or "").strip()]
+        if missing:
+            problems.append(f"{name}: missing {', '.join(missing)}")
+            continue
+        fields = {field: str(record[field]).strip() for field in REQUIRED_FIELDS}
+        for field, values in seen.items():
+            if fields[field] in values:
+                problems.append(f"{name}: duplicate {field} {fields[field]!r}")
+            values.add(fields[field])
+        cases.append(Case(**fields))
+    if not records:
+        problems.append("no cases defined")
+    if problems:
+        raise CaseError("Invalid case data: " + "; ".join(problems))
+    return cases
+
+
+def load_registry(path=CASES_FILE):
+    """
+    Read and validate the case data file.
+
+    Args:
+        path (str): TOML file with a [[cases]] entry per case
+
+    Returns:
+        CaseRegistry: The indexed cases
+
+    Raises:
+        CaseError: If the file can't be read or a case is invalid
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = tomllib.loads(f.read())
+    except (OSError, tomllib.TOMLDecodeError) as e:
+        raise CaseError(f"Could not read case data from {path}: {e}") from e
+    return CaseRegistry(validate(data.get("cases", [])))
+
+
+class CaseRegistryLoader:
+    """
+    Keeps the current CaseRegistry and reloads it when the data file changes.
+
+    The file's modification time is checked at most every `check_interval`
+    seconds. An edit that fails validation is logged and ignored, so a typo in
+    the file never takes the running app down; the last good registry stays in use.
+    """
+
+    def __init__(self, path=CASES_FILE, check_interval=RELOAD_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._mtime = os.stat(path).st_mtime_ns if os.path.exists(path) else None
+        # Fails loudly at startup; only later reloads are forgiving
+        self._registry = load_registry(path)
+        self._checked_at = time.monotonic()
+        self.loaded_at = time.time()
+        self.reloads = 0
+        self.last_error = None
+
+    def current(self):
+        """Return the registry, reloading it first if the data file has changed."""
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return self._registry
+        with self._lock:
+            if now - self._checked_at < self.check_interval:
+                return self._registry
+            self._checked_at = now
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError as e:
+                self.last_error = str(e)
+                return self._registry
+            if mtime != self._mtime:
+                self._mtime = mtime
+                try:
+                    self._registry = load_registry(self.path)
+                    self.loaded_at = time.time()
+                    self.reloads += 1
+                    self.last_error = None
+                    logger.info("Reloaded %d cases from %s", len(self._registry), self.path)
+                except CaseError as e:
+                    self.last_error = str(e)
+                    logger.error("Keeping previous cases: %s", e)
+        return self._registry
+
+    def stats(self):
+        """Return case count, reload count and the last reload error."""
+        return {
+            "cases": len(self._registry),
+            "loaded_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.loaded_at)),
+            "reloads": self.reloads,
+            "last_error": self.last_error,
+        }
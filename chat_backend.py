@@ -0,0 +1,197 @@
+# chat_backend.py
+
+import threading
+
+import openai
+
+from resilience import REQUEST_TAG, find_tagged_message, find_tagged_run
+from transcript import Transcript
+
+# Backend names, chosen per deployment with VPE_CHAT_BACKEND
+ASSISTANTS = "assistants"  # conversation kept in an Assistants API thread, one run per turn
+COMPLETIONS = "completions"  # conversation kept locally, one streamed chat completion per turn
+BACKENDS = (ASSISTANTS, COMPLETIONS)
+
+
+class Persona:
+    """The parts of an assistant's configuration needed to prompt its model directly."""
+
+    def __init__(self, assistant_id, model, instructions, temperature=None, top_p=None):
+        self.assistant_id = assistant_id
+        self.model = model
+        self.instructions = instructions
+        self.temperature = temperature
+        self.top_p = top_p
+
+
+def retrieve_persona(assistant_id):
+    """Read an assistant's model, instructions and sampling settings."""
+    assistant = openai.beta.assistants.retrieve(assistant_id)
+    return Persona(assistant.id, assistant.model, assistant.instructions or "",
+                   assistant.temperature, assistant.top_p)
+
+
+def stream_text(stream):
+    """
+    Yield the text of a streamed chat completion as it arrives.
+
+    Args:
+        stream: The stream returned by chat.completions.create(stream=True)
+
+    Yields:
+        str: Each non-empty piece of reply text
+    """
+    for chunk in stream:
+        for choice in chunk.choices:
+            if choice.delta and choice.delta.content:
+                yield choice.delta.content
+
+
+class AssistantsBackend:
+    """
+    Conversations held server-side in Assistants API threads.
+
+    Every turn posts the student's message to the session's thread and runs the
+    case assistant on it; writes are tagged so retries can reconcile.
+    """
+
+    name = ASSISTANTS
+    uses_threads = True
+
+    def post_message(self, thread_id, content, request_id):
+        """Add the student's message to a thread."""
+        return openai.beta.threads.messages.create(
+            thread_id=thread_id,
+            role="user",
+            content=content,
+            metadata={REQUEST_TAG: request_id},
+        )
+
+    def find_message(self, thread_id, request_id):
+        """Return the message an earlier attempt posted, or None."""
+        return find_tagged_message(thread_id, request_id)
+
+    def start_run(self, thread_id, assistant_id, request_id, stream=False, timeout=None):
+        """Run the case assistant on a thread; with stream=True, return the event stream instead."""
+        kwargs = {"stream": True, "timeout": timeout} if stream else {}
+        return openai.beta.threads.runs.create(
+            thread_id=thread_id,
+            assistant_id=assistant_id,
+            metadata={REQUEST_TAG: request_id},
+            **kwargs,
+        )
+
+    def find_run(self, thread_id, request_id):
+        """Return the run an earlier attempt started, or None."""
+        return find_tagged_run(thread_id, request_id)
+
+    def latest_reply(self, thread_id):
+        """Return the text of the thread's latest message if the assistant wrote it, else None."""
+        messages = openai.beta.threads.messages.list(thread_id=thread_id, limit=1)
+        if messages.data and messages.data[0].role == "assistant":
+            return messages.data[0].content[0].text.value
+        return None
+
+    def cancel_run(self, thread_id, run_id):
+        """Ask the server to stop a run."""
+        return openai.beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
+
+    def fetch_transcript(self, thread_id):
+        """Rebuild the conversation from its thread."""
+        return Transcript.fetch(thread_id)
+
+    def stats(self):
+        return {"backend": self.name}
+
+
+class CompletionsBackend:
+    """
+    Conversations kept by the app, each turn a single streamed chat completion.
+
+    Each case assistant's model, instructions and sampling settings are read once
+    per process and then used to prompt the model directly with the whole
+    conversation, so a turn is one request and no threads are left on the server.
+    Assistant tools (file search, code interpreter) are not carried over.
+    """
+
+    name = COMPLETIONS
+    uses_threads = False
+
+    def __init__(self, retrieve=retrieve_persona):
+        self._retrieve = retrieve
+        self._personas = {}
+        self._lock = threading.Lock()
+        self.persona_loads = 0
+
+    def persona(self, assistant_id):
+        """Return an assistant's Persona, reading it on first use."""
+        persona = self._personas.get(assistant_id)
+        if persona is None:
+            with self._lock:
+                persona = self._personas.get(assistant_id)
+                if persona is None:
+                    persona = self._personas[assistant_id] = self._retrieve(assistant_id)
+                    self.persona_loads += 1
+        return persona
+
+    def _request(self, assistant_id, messages):
+        persona = self.persona(assistant_id)
+        kwargs = {
+            "model": persona.model,
+            "messages": [{"role": "system", "content": persona.instructions}] + [
+                {"role": msg["role"], "content": msg["content"]} for msg in messages
+            ],
+        }
+        if persona.temperature is not None:
+            kwargs["temperature"] = persona.temperature
+        if persona.top_p is not None:
+            kwargs["top_p"] = persona.top_p
+        return kwargs
+
+    def stream_reply(self, assistant_id, messages, timeout=None):
+        """
+        Start the case assistant's reply to a conversation.
+
+        Args:
+            assistant_id (str): The case assistant whose persona answers
+            messages (list): Message dicts with "role" and "content", oldest first
+            timeout (float): Seconds allowed for the whole request
+
+        Returns:
+            Stream: Chunks of the reply; read the text with stream_text()
+        """
+        return openai.chat.completions.create(stream=True, timeout=timeout,
+                                              **self._request(assistant_id, messages))
+
+    def complete(self, assistant_id, content, timeout=None):
+        """
+        Have an assistant's persona answer a single prompt, e.g. a feedback request.
+
+        Args:
+            assistant_id (str): The assistant whose persona answers
+            content (str): The prompt
+            timeout (float): Seconds allowed for the request
+
+        Returns:
+            str: The reply text
+        """
+        completion = openai.chat.completions.create(
+            timeout=timeout, **self._request(assistant_id, [{"role": "user", "content": content}]))
+        return completion.choices[0].message.content or ""
+
+    def stats(self):
+        return {"backend": self.name, "personas_loaded": len(self._personas), "persona_loads": self.persona_loads}
+
+
+def make_backend(name):
+    """
+    Create the chat backend called `name`.
+
+    Raises:
+        ValueError: If `name` is not one of BACKENDS
+    """
+    if name == ASSISTANTS:
+        return AssistantsBackend()
+    if name == COMPLETIONS:
+        return CompletionsBackend()
+    raise ValueError(f"Unknown chat backend {name!r}; expected one of {', '.join(BACKENDS)}")
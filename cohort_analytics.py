@@ -0,0 +1,369 @@
+# cohort_analytics.py
+#
+# Cohort-level views of the interviews kept in the session store: how long each
+# case's patient takes to reply, how many questions students ask, how they score
+# and which cases are slow. Also a command line export:
+#
+#     python cohort_analytics.py vpe_sessions.db --output encounters.csv
+
+import argparse
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+from session_store import connect
+
+REFRESH_INTERVAL = 10  # seconds between checks of the store for new turns and reports
+SLOW_CASE_FACTOR = 1.5  # a case is slow when its median reply takes this many times the cohort's
+MIN_SLOW_CASE_REPLIES = 20  # replies a case needs before it can be called slow
+PERCENTILES = (0.5, 0.9, 0.95)
+QUESTION_BINS = (0, 5, 10, 15, 20, 30, 50, float("inf"))  # edges of the questions-per-encounter histogram
+
+# Lines such as "History taking: 4/5", "**Empathy** - 3 out of 5" or "Communication (score 7/10)"
+DOMAIN_SCORE = re.compile(
+    r"^[\s#*>\-\d.]*(?P<domain>[A-Za-z][A-Za-z &/,'-]{1,60}?)[\s*_]*(?:[:(\-–—]\s*)+(?:score\s*[:=]?\s*)?"
+    r"(?P<score>\d+(?:\.\d+)?)\s*(?:/|out of)\s*(?P<scale>\d+)",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+ENCOUNTER = ["token", "conversation"]
+
+logger = logging.getLogger("vpe.analytics")
+
+
+def parse_domain_scores(reports):
+    """
+    Pull per-domain scores out of feedback reports.
+
+    Args:
+        reports (Series): Report text, indexed by anything
+
+    Returns:
+        DataFrame: One row per score found, with the report's index, "domain"
+            (lower case) and "score" as a fraction of the domain's scale
+    """
+    found = reports.str.extractall(DOMAIN_SCORE)
+    if found.empty:
+        return pd.DataFrame({"domain": pd.Series(dtype=str), "score": pd.Series(dtype=float)})
+    scale = found["scale"].astype(float)
+    found = found[scale > 0]
+    scores = pd.DataFrame({
+        "domain": found["domain"].str.strip(" *_-").str.lower().str.replace(r"\s+", " ", regex=True),
+        "score": found["score"].astype(float) / scale[scale > 0],
+    })
+    # Each report counts once per domain, keeping the first score given
+    scores = scores.droplevel("match")
+    return scores[~scores.set_index("domain", append=True).index.duplicated()]
+
+
+class EncounterLog:
+    """
+    Columnar log of every encounter in a session store, ingested incrementally.
+
+    Turns and feedback reports are only ever appended to the store, so each
+    refresh() reads just the rows added since the last one (tracked by row ID)
+    and adds them to in-memory DataFrames. Only word counts and timings are read
+    for turns, never their text. The per-encounter summary, and the analytics
+    built on it, are recomputed only when new rows arrive.
+
+    With `cache_path`, ingested rows are also saved there, so a restarted
+    process picks up where the last one stopped instead of reading every row.
+
+    Args:
+        path (str): The session store's SQLite file
+        cases (CaseRegistry): Used for each case's patient and specialty
+        cache_path (str): Optional pickle file for ingested rows
+    """
+
+    def __init__(self, path, cases=None, cache_path=None, refresh_interval=REFRESH_INTERVAL):
+        self.path = path
+        self.cases = cases
+        self.cache_path = cache_path
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._turns = pd.DataFrame({
+            "token": pd.Series(dtype=str), "conversation": pd.Series(dtype="int64"),
+            "role": pd.Series(dtype=str), "words": pd.Series(dtype="int64"),
+            "seconds": pd.Series(dtype=float), "created_at": pd.Series(dtype=float),
+        })
+        self._actors = pd.DataFrame({"token": pd.Series(dtype=str), "conversation": pd.Series(dtype="int64"),
+                                     "actor": pd.Series(dtype=str)})
+        self._scores = pd.DataFrame({"token": pd.Series(dtype=str), "conversation": pd.Series(dtype="int64"),
+                                     "domain": pd.Series(dtype=str), "score": pd.Series(dtype=float)})
+        self._graded = pd.DataFrame({"token": pd.Series(dtype=str), "conversation": pd.Series(dtype="int64")})
+        self._last_turn = 0
+        self._last_feedback = 0
+        self._last_conversation = 0
+        self._checked_at = None
+        # Results computed from the current rows; replaced when new rows arrive
+        self._memo = {}
+        self.ingested_turns = 0
+        self.ingested_reports = 0
+        self.last_refresh_seconds = 0.0
+        if cache_path and os.path.exists(cache_path):
+            self._load_cache()
+
+    def refresh(self, force=False):
+        """Read rows added to the store since the last refresh; returns True if there were any."""
+        now = time.monotonic()
+        if not force and self._checked_at is not None and now - self._checked_at < self.refresh_interval:
+            return False
+        with self._lock:
+            if not force and self._checked_at is not None and now - self._checked_at < self.refresh_interval:
+                return False
+            self._checked_at = now
+            started = time.perf_counter()
+            conn = connect(self.path)
+            try:
+                turns = pd.read_sql_query(
+                    "SELECT id, token, conversation, role, "
+                    # Words counted by SQLite, so turn text never leaves the database
+                    "length(trim(content)) - length(replace(replace(trim(content), char(10), ''), ' ', '')) "
+                    "+ (length(trim(content)) > 0) AS words, "
+                    "seconds, created_at FROM turns WHERE id > ? ORDER BY id",
+                    # Replies without a timing are NULL; kept numeric even when a whole batch is
+                    conn, params=(self._last_turn,), dtype={"seconds": float, "created_at": float})
+                reports = pd.read_sql_query(
+                    "SELECT id, token, conversation, feedback FROM feedback WHERE id > ? ORDER BY id",
+                    conn, params=(self._last_feedback,))
+                actors = pd.read_sql_query(
+                    "SELECT rowid, token, conversation, actor FROM conversations WHERE rowid > ? ORDER BY rowid",
+                    conn, params=(self._last_conversation,))
+            except (sqlite3.Error, pd.errors.DatabaseError) as e:
+                logger.error("Could not read the session store: %s", e)
+                return False
+            finally:
+                conn.close()
+
+            self.last_refresh_seconds = time.perf_counter() - started
+            if turns.empty and reports.empty and actors.empty:
+                return False
+            if not turns.empty:
+                self._last_turn = int(turns["id"].iloc[-1])
+                self._turns = pd.concat([self._turns, turns.drop(columns="id")], ignore_index=True)
+                self.ingested_turns += len(turns)
+            if not reports.empty:
+                self._last_feedback = int(reports["id"].iloc[-1])
+                # A regraded encounter keeps only its latest report's scores
+                reports = reports.drop_duplicates(ENCOUNTER, keep="last")
+                regraded = self._scores.set_index(ENCOUNTER).index.isin(pd.MultiIndex.from_frame(reports[ENCOUNTER]))
+                scores = parse_domain_scores(reports.set_index(ENCOUNTER)["feedback"]).reset_index()
+                self._scores = pd.concat([self._scores[~regraded], scores], ignore_index=True)
+                self._graded = pd.concat([self._graded, reports[ENCOUNTER]]).drop_duplicates(ignore_index=True)
+                self.ingested_reports += len(reports)
+            if not actors.empty:
+                self._last_conversation = int(actors["rowid"].iloc[-1])
+                # A conversation rewritten in the store comes back with a new rowid; the newest wins
+                self._actors = pd.concat([self._actors, actors.drop(columns="rowid")]).drop_duplicates(
+                    ENCOUNTER, keep="last", ignore_index=True)
+            self._memo = {}
+            self.last_refresh_seconds = time.perf_counter() - started
+            if self.cache_path:
+                self._save_cache()
+            return True
+
+    def _load_cache(self):
+        try:
+            cached = pd.read_pickle(self.cache_path)
+            self._turns, self._scores = cached["turns"], cached["scores"]
+            self._graded, self._actors = cached["graded"], cached["actors"]
+            self._last_turn, self._last_feedback = cached["last_turn"], cached["last_feedback"]
+            self._last_conversation = cached["last_conversation"]
+        except Exception as e:
+            # Starting over is always safe; the store has every row
+            logger.warning("Ignoring analytics cache %s: %s", self.cache_path, e)
+
+    def _save_cache(self):
+        temp = f"{self.cache_path}.tmp"
+        pd.to_pickle({"turns": self._turns, "scores": self._scores, "graded": self._graded, "actors": self._actors,
+                      "last_turn": self._last_turn, "last_feedback": self._last_feedback,
+                      "last_conversation": self._last_conversation}, temp)
+        os.replace(temp, self.cache_path)
+
+    def memoized(self, key, compute):
+        """Return compute(), reusing its result until new rows arrive; callers must not modify it."""
+        self.refresh()
+        memo = self._memo
+        if key not in memo:
+            memo[key] = compute()
+        return memo[key]
+
+    def encounters(self):
+        """
+        Return one row per encounter.
+
+        Returns:
+            DataFrame: Indexed by (token, conversation), with actor, patient,
+                specialty, questions, replies, student_words, patient_words,
+                reply_seconds_median, reply_seconds_total, started_at,
+                duration_seconds, graded and a score_<domain> column per domain
+        """
+        return self.memoized("encounters", self._summarize)
+
+    def _summarize(self):
+        with self._lock:
+            turns, actors, scores, graded = self._turns, self._actors, self._scores, self._graded
+        user = turns["role"] == "user"
+        grouped = turns.assign(
+            questions=user,
+            replies=~user,
+            student_words=turns["words"].where(user, 0),
+            patient_words=turns["words"].where(~user, 0),
+            reply_seconds=turns["seconds"].where(~user),
+        ).groupby(ENCOUNTER)
+        summary = grouped.agg(
+            questions=("questions", "sum"),
+            replies=("replies", "sum"),
+            student_words=("student_words", "sum"),
+            patient_words=("patient_words", "sum"),
+            reply_seconds_median=("reply_seconds", "median"),
+            reply_seconds_total=("reply_seconds", "sum"),
+            started_at=("created_at", "min"),
+            ended_at=("created_at", "max"),
+        )
+        summary["duration_seconds"] = summary.pop("ended_at") - summary["started_at"]
+        summary = summary.join(actors.set_index(ENCOUNTER)["actor"])
+        summary["actor"] = summary["actor"].fillna("unknown")
+        labels = {case.label: case for case in self.cases or ()}
+        summary["patient"] = summary["actor"].map({label: case.patient for label, case in labels.items()})
+        summary["specialty"] = summary["actor"].map({label: case.specialty for label, case in labels.items()})
+
+        scores = scores.pivot_table(index=ENCOUNTER, columns="domain", values="score", aggfunc="last")
+        scores.columns = [f"score_{domain}" for domain in scores.columns]
+        summary = summary.join(scores)
+        summary["graded"] = summary.index.isin(pd.MultiIndex.from_frame(graded))
+        return summary
+
+    def reply_latencies(self):
+        """Return every timed patient reply with its case: columns actor and seconds."""
+        def compute():
+            with self._lock:
+                turns, actors = self._turns, self._actors
+            replies = turns[(turns["role"] == "assistant") & turns["seconds"].notna()]
+            replies = replies.merge(actors, on=ENCOUNTER, how="left")
+            return pd.DataFrame({"actor": replies["actor"].fillna("unknown"), "seconds": replies["seconds"]})
+        return self.memoized("reply_latencies", compute)
+
+    def domain_scores(self):
+        """Return every parsed score with its case: columns actor, domain and score (0-1)."""
+        def compute():
+            with self._lock:
+                scores, actors = self._scores, self._actors
+            scores = scores.merge(actors, on=ENCOUNTER, how="left")
+            return pd.DataFrame({"actor": scores["actor"].fillna("unknown"),
+                                 "domain": scores["domain"], "score": scores["score"]})
+        return self.memoized("domain_scores", compute)
+
+    def stats(self):
+        """Return ingested row counts and the cost of the last refresh."""
+        return {
+            "turns": self.ingested_turns,
+            "reports": self.ingested_reports,
+            "rows_in_memory": len(self._turns),
+            "last_refresh_seconds": self.last_refresh_seconds,
+        }
+
+
+def _quantiles(grouped):
+    return pd.DataFrame({f"p{round(q * 100)}": grouped.quantile(q) for q in PERCENTILES})
+
+
+def case_timing(log):
+    """
+    Patient reply time distribution per case.
+
+    Returns:
+        DataFrame: Indexed by case, with replies, mean and p50/p90/p95 seconds
+    """
+    def compute():
+        grouped = log.reply_latencies().groupby("actor")["seconds"]
+        return pd.concat([grouped.size().rename("replies"), grouped.mean().rename("mean"), _quantiles(grouped)],
+                         axis=1).sort_values("p95", ascending=False)
+    return log.memoized("case_timing", compute)
+
+
+def question_counts(log):
+    """
+    Questions asked per encounter, per case.
+
+    Returns:
+        DataFrame: Indexed by case, with encounters, mean and p50/p90/p95
+            questions, and a column per QUESTION_BINS bucket counting encounters
+    """
+    def compute():
+        encounters = log.encounters()
+        grouped = encounters.groupby("actor")["questions"]
+        buckets = pd.cut(encounters["questions"], QUESTION_BINS, right=False)
+        histogram = pd.crosstab(encounters["actor"], buckets)
+        histogram.columns = [f"{int(b.left)}+" if b.right == float("inf") else f"{int(b.left)}-{int(b.right) - 1}"
+                             for b in histogram.columns]
+        return pd.concat([grouped.size().rename("encounters"), grouped.mean().rename("mean"),
+                          _quantiles(grouped), histogram], axis=1)
+    return log.memoized("question_counts", compute)
+
+
+def score_percentiles(log):
+    """
+    Score percentiles per case and domain, as fractions of each domain's scale.
+
+    Returns:
+        DataFrame: Indexed by (case, domain), with graded encounters and p50/p90/p95
+    """
+    def compute():
+        grouped = log.domain_scores().groupby(["actor", "domain"])["score"]
+        return pd.concat([grouped.size().rename("graded"), _quantiles(grouped)], axis=1)
+    return log.memoized("score_percentiles", compute)
+
+
+def slow_cases(log, factor=SLOW_CASE_FACTOR, min_replies=MIN_SLOW_CASE_REPLIES):
+    """
+    Cases whose patient replies are markedly slower than the cohort's.
+
+    Args:
+        log (EncounterLog): The encounters
+        factor (float): How many times the cohort's median reply time a case's median must exceed
+        min_replies (int): Replies a case needs before it is judged
+
+    Returns:
+        DataFrame: The slow cases from case_timing(), with their median's ratio to the cohort's
+    """
+    def compute():
+        timing = case_timing(log)
+        timing = timing.assign(ratio=timing["p50"] / log.reply_latencies()["seconds"].median())
+        return timing[(timing["replies"] >= min_replies) & (timing["ratio"] > factor)].sort_values(
+            "ratio", ascending=False)
+    return log.memoized(("slow_cases", factor, min_replies), compute)
+
+
+def main():
+    from case_registry import load_registry
+
+    parser = argparse.ArgumentParser(description="Export per-encounter analytics from the session store.")
+    parser.add_argument("database", nargs="?", default=os.environ.get("VPE_SESSION_DB", "vpe_sessions.db"),
+                        help="the app's session store")
+    parser.add_argument("--output", help="write the per-encounter table here as CSV")
+    parser.add_argument("--cache", help="pickle file that keeps ingested rows between runs")
+    args = parser.parse_args()
+
+    log = EncounterLog(args.database, cases=load_registry(), cache_path=args.cache)
+    log.refresh(force=True)
+    encounters = log.encounters()
+    if args.output:
+        encounters.to_csv(args.output)
+    with pd.option_context("display.width", 160, "display.max_columns", 20):
+        print(f"{len(encounters)} encounters, {int(encounters['graded'].sum())} graded\n")
+        print("Reply time by case (seconds)\n", case_timing(log).round(2), "\n")
+        print("Questions per encounter\n", question_counts(log).round(1), "\n")
+        print("Scores\n", score_percentiles(log).round(2), "\n")
+        slow = slow_cases(log)
+        if not slow.empty:
+            print("Slow cases\n", slow.round(2))
+
+
+if __name__ == "__main__":
+    main()
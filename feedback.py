@@ -0,0 +1,357 @@
+# feedback.py
+
+import openai
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, as_completed, wait as wait_for_futures
+from run_poller import RunPollTimeout
+from metrics import REGISTRY as METRICS
+from rate_limiter import estimate_tokens
+from resilience import REQUEST_TAG, call_with_retry, find_tagged_message, find_tagged_run
+
+
+CANCEL_CHECK_INTERVAL = 0.5  # seconds between checks for cancellation while a run is in progress
+
+# Feedback modes, chosen per deployment with VPE_FEEDBACK_MODE
+WHOLE = "whole"  # one run grades every domain
+DOMAINS = "domains"  # one concurrent run per domain, merged into the report
+FEEDBACK_MODES = (WHOLE, DOMAINS)
+
+# The five domains of the assessment framework, in report order
+FEEDBACK_DOMAINS = (
+    "History of present illness",
+    "Review of systems",
+    "Past medical and social history",
+    "Communication and rapport",
+    "Clinical reasoning",
+)
+
+
+class FeedbackError(Exception):
+    """Raised when a feedback run does not produce a report; the message is shown to the student."""
+
+
+class FeedbackCancelled(FeedbackError):
+    """Raised when a feedback request is cancelled before it produced a report."""
+
+    def __init__(self, message="Feedback generation was cancelled."):
+        super().__init__(message)
+
+
+class PartialFeedback(Exception):
+    """Raised when only some domains could be graded; `report` still covers the ones that were."""
+
+    def __init__(self, report, errors):
+        super().__init__(f"{len(errors)} domain(s) could not be graded")
+        self.report = report
+        self.errors = errors
+
+
+def build_feedback_prompt(patient_name, transcript):
+    """
+    Build the prompt sent to a feedback assistant.
+
+    Args:
+        patient_name (str): The name of the patient
+        transcript (str): The rendered interview transcript
+
+    Returns:
+        str: The feedback prompt
+    """
+    return f"""
+You are an expert clinical skills rater. Use the five-domain assessment framework.
+
+Transcript of the student's chat with virtual standardized patient {patient_name}:
+
+{transcript}
+"""
+
+
+def build_domain_prompt(patient_name, transcript, domain):
+    """
+    Build the prompt asking a feedback assistant to grade a single domain.
+
+    The reply starts with a "<domain>: <score>/<scale>" heading, the form
+    cohort analytics reads scores from.
+
+    Args:
+        patient_name (str): The name of the patient
+        transcript (str): The rendered interview transcript
+        domain (str): The domain to grade
+
+    Returns:
+        str: The feedback prompt
+    """
+    return f"""
+You are an expert clinical skills rater. Use the five-domain assessment framework, but grade only the
+{domain} domain; the other domains are graded separately.
+
+Start your reply with the line "### {domain}: <score>/<maximum>", using the framework's scale for this
+domain, then give your feedback on this domain alone.
+
+Transcript of the student's chat with virtual standardized patient {patient_name}:
+
+{transcript}
+"""
+
+
+def merge_domain_feedback(domains, sections, errors):
+    """
+    Join graded domain sections into one report, in framework order.
+
+    Args:
+        domains (sequence): Every domain, in report order
+        sections (dict): Feedback text by domain, for the domains graded
+        errors (dict): Why each remaining domain wasn't graded
+
+    Returns:
+        str: The report
+    """
+    parts = []
+    for domain in domains:
+        if domain in sections:
+            parts.append(sections[domain].strip())
+        else:
+            parts.append(f"### {domain}\n\n*Not graded: {errors.get(domain, 'no feedback returned')}*")
+    return "\n\n".join(parts)
+
+
+def wait_for_run(future, timeout, cancel=None):
+    """
+    Wait for a poller's future, giving up early if `cancel` is set.
+
+    Args:
+        future (Future): From RunPoller.watch
+        timeout (float): Seconds to wait in total
+        cancel (threading.Event): Optional cancellation flag
+
+    Returns:
+        The final run status
+
+    Raises:
+        FutureTimeout: If the run isn't finished in time
+        FeedbackCancelled: If `cancel` was set first
+    """
+    if cancel is None:
+        return future.result(timeout=timeout)
+    deadline = time.monotonic() + timeout
+    while not cancel.is_set():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise FutureTimeout()
+        done, _ = wait_for_futures([future], timeout=min(CANCEL_CHECK_INTERVAL, remaining))
+        if done:
+            return future.result()
+    raise FeedbackCancelled()
+
+
+def request_feedback(assistant_id, patient_name, transcript, poller, timeout, thread_pool=None,
+                     admit=None, reply_tokens=0, breaker=None, cancel=None, backend=None, domain=None):
+    """
+    Run a feedback assistant over a transcript and return its report.
+
+    Safe to call from worker threads: it never touches Streamlit and reports
+    problems by raising FeedbackError.
+
+    Args:
+        assistant_id (str): The feedback assistant ID
+        patient_name (str): The name of the patient
+        transcript (str): The rendered interview transcript
+        poller (RunPoller): Poller used to wait for the run
+        timeout (float): Seconds to wait for the run to finish
+        thread_pool (OpenAIThreadPool): Optional pool to take the feedback thread from
+        admit (callable): Optional admission hook, called with a token estimate before each call
+        reply_tokens (int): Tokens expected on top of the prompt, for the run's estimate
+        breaker (CircuitBreaker): Optional circuit breaker for the OpenAI calls
+        cancel (threading.Event): Optional flag; once set, the request stops making calls,
+            returns a pooled thread it hasn't written to, cancels its run if one was started
+            and raises FeedbackCancelled
+        backend: Optional chat backend; one without threads grades with a single completion
+        domain (str): Optional; grade only this domain
+
+    Returns:
+        str: The feedback text
+    """
+    if admit is None:
+        def admit(tokens=0):
+            pass
+    if domain is None:
+        prompt = build_feedback_prompt(patient_name, transcript)
+    else:
+        prompt = build_domain_prompt(patient_name, transcript, domain)
+    # Transient failures are retried until the overall timeout; the tag keeps retries from duplicating writes
+    deadline = time.monotonic() + timeout
+    request_id = uuid.uuid4().hex
+
+    def call(operation, fn, tokens=0, reconcile=None, **kwargs):
+        if cancel is not None and cancel.is_set():
+            raise FeedbackCancelled()
+
+        def attempt():
+            admit(tokens)
+            with METRICS.timed(operation, patient=patient_name):
+                return fn(**kwargs)
+        return call_with_retry(attempt, deadline=deadline, breaker=breaker, reconcile=reconcile)
+
+    with METRICS.timed("feedback.generate", patient=patient_name) as total:
+        if backend is not None and not backend.uses_threads:
+            # The feedback assistant's persona answers the prompt directly; nothing to poll or clean up
+            feedback = call(
+                "openai.chat.completions.create", backend.complete,
+                tokens=estimate_tokens(prompt) + reply_tokens,
+                assistant_id=assistant_id,
+                content=prompt,
+                timeout=max(1.0, deadline - time.monotonic()),
+            )
+            if feedback:
+                return feedback
+            total.outcome = "failed"
+            raise FeedbackError("No feedback generated. Please try again.")
+
+        # Create new thread for feedback; not even a pooled one for a request already cancelled
+        if cancel is not None and cancel.is_set():
+            total.outcome = "cancelled"
+            raise FeedbackCancelled()
+        with METRICS.timed("thread.acquire", patient=patient_name):
+            if thread_pool is not None:
+                feedback_thread_id = call_with_retry(thread_pool.acquire, deadline=deadline)
+            else:
+                feedback_thread_id = call("openai.threads.create", openai.beta.threads.create).id
+
+        # Send transcript to feedback assistant
+        try:
+            call(
+                "openai.messages.create", openai.beta.threads.messages.create,
+                reconcile=lambda: find_tagged_message(feedback_thread_id, request_id),
+                thread_id=feedback_thread_id,
+                role="user",
+                content=prompt,
+                metadata={REQUEST_TAG: request_id},
+            )
+        except FeedbackCancelled:
+            total.outcome = "cancelled"
+            if thread_pool is not None:
+                # Cancelled before anything was written, so the thread can serve another request
+                thread_pool.release(feedback_thread_id)
+            raise
+
+        # Start feedback generation
+        feedback_run = call(
+            "openai.runs.create", openai.beta.threads.runs.create,
+            tokens=estimate_tokens(prompt) + reply_tokens,
+            reconcile=lambda: find_tagged_run(feedback_thread_id, request_id),
+            thread_id=feedback_thread_id,
+            assistant_id=assistant_id,
+            metadata={REQUEST_TAG: request_id},
+        )
+
+        # Wait for feedback completion
+        with METRICS.timed("wait.feedback_generation", patient=patient_name) as wait:
+            try:
+                run_status = wait_for_run(poller.watch(feedback_thread_id, feedback_run.id, timeout), timeout, cancel)
+            except (FutureTimeout, RunPollTimeout):
+                wait.outcome = total.outcome = "timeout"
+                raise FeedbackError(f"Feedback generation timed out after {timeout} seconds.")
+            except FeedbackCancelled:
+                wait.outcome = total.outcome = "cancelled"
+                try:
+                    # Best effort; the poller sees the run end either way
+                    openai.beta.threads.runs.cancel(thread_id=feedback_thread_id, run_id=feedback_run.id)
+                except Exception:
+                    pass
+                raise
+            wait.outcome = run_status.status
+
+        if run_status.status != "completed":
+            total.outcome = "failed"
+            message = f"Feedback generation failed with status: {run_status.status}"
+            if getattr(run_status, 'last_error', None):
+                message += f" ({run_status.last_error})"
+            raise FeedbackError(message)
+
+        # Get feedback
+        feedback_messages = call(
+            "openai.messages.list", openai.beta.threads.messages.list,
+            thread_id=feedback_thread_id,
+            limit=1
+        )
+
+        if feedback_messages.data and feedback_messages.data[0].role == "assistant":
+            return feedback_messages.data[0].content[0].text.value
+        total.outcome = "failed"
+        raise FeedbackError("No feedback generated. Please try again.")
+
+
+def request_domain_feedback(assistant_id, patient_name, transcript, poller, timeout, domains=FEEDBACK_DOMAINS,
+                            on_section=None, reply_tokens=0, cancel=None, **kwargs):
+    """
+    Grade each domain as its own feedback request, all at once, and merge the sections into a report.
+
+    Takes about as long as the slowest domain instead of one run writing every
+    section. A domain that fails or times out is noted in the report rather
+    than holding up the others.
+
+    Args:
+        assistant_id (str): The feedback assistant ID
+        patient_name (str): The name of the patient
+        transcript (str): The rendered interview transcript
+        poller (RunPoller): Poller used to wait for the runs
+        timeout (float): Seconds each domain's request may take
+        domains (sequence): The domains to grade, in report order
+        on_section (callable): Optional; called as on_section(domain, text) as each domain
+            finishes, with text None if it couldn't be graded
+        reply_tokens (int): Tokens expected for the whole report, shared between the domains
+        cancel (threading.Event): Optional flag; once set, every domain's request stops
+        **kwargs: Passed on to request_feedback for each domain
+
+    Returns:
+        str: The merged report
+
+    Raises:
+        FeedbackCancelled: If `cancel` was set
+        PartialFeedback: If some domains, but not all, could not be graded
+        FeedbackError: If no domain could be graded
+    """
+    sections = {}
+    errors = {}
+    with METRICS.timed("feedback.domains", patient=patient_name) as total, \
+            ThreadPoolExecutor(max_workers=len(domains), thread_name_prefix="feedback-domain") as executor:
+        futures = {
+            executor.submit(request_feedback, assistant_id, patient_name, transcript, poller, timeout,
+                            reply_tokens=reply_tokens // len(domains), cancel=cancel, domain=domain, **kwargs): domain
+            for domain in domains
+        }
+        for future in as_completed(futures):
+            domain = futures[future]
+            try:
+                sections[domain] = future.result()
+            except Exception as e:
+                errors[domain] = str(e)
+            if on_section is not None:
+                on_section(domain, sections.get(domain))
+
+        if cancel is not None and cancel.is_set():
+            total.outcome = "cancelled"
+            raise FeedbackCancelled()
+        if not sections:
+            total.outcome = "failed"
+            raise FeedbackError(errors[domains[0]])
+        report = merge_domain_feedback(domains, sections, errors)
+        if errors:
+            total.outcome = "partial"
+            raise PartialFeedback(report, errors)
+        return report
+
+
+def feedback_requester(mode):
+    """
+    Return the function that produces feedback in `mode`.
+
+    Raises:
+        ValueError: If `mode` is not one of FEEDBACK_MODES
+    """
+    if mode == WHOLE:
+        return request_feedback
+    if mode == DOMAINS:
+        return request_domain_feedback
+    raise ValueError(f"Unknown feedback mode {mode!r}; expected one of {', '.join(FEEDBACK_MODES)}")
@@ -0,0 +1,304 @@
+# feedback_cache.py
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from feedback import PartialFeedback
+
+MAX_MEMORY_ENTRIES = 512  # feedback reports kept in the in-memory LRU tier
+MAX_DISK_ENTRIES = 20000  # feedback reports kept in the on-disk tier
+CACHE_TTL = 30 * 24 * 3600  # seconds a cached report stays valid
+
+
+def normalize_transcript(transcript):
+    """
+    Normalize a transcript so formatting-only differences hash the same.
+
+    Args:
+        transcript (str): The rendered interview transcript
+
+    Returns:
+        str: The transcript with runs of whitespace collapsed
+    """
+    return " ".join(transcript.split())
+
+
+class FeedbackCache:
+    """
+    Content-addressed cache of feedback reports.
+
+    Entries are keyed on the feedback assistant ID and a hash of the normalized
+    transcript. A bounded in-memory LRU sits in front of an optional directory of
+    JSON files that survives restarts. Identical requests that arrive while a
+    report is still being generated attach to the pending job instead of
+    starting another run.
+
+    With `shared` (a SharedState), reports are also shared between replicas,
+    and each pending request is claimed there so identical requests on other
+    replicas attach to the same job.
+    """
+
+    def __init__(self, directory=None, max_entries=MAX_MEMORY_ENTRIES,
+                 max_disk_entries=MAX_DISK_ENTRIES, ttl=CACHE_TTL, shared=None):
+        self.directory = directory
+        self.shared = shared
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self._memory = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.deduplicated = 0
+        self.partial = 0
+        self.evictions = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._disk_count = sum(1 for name in os.listdir(directory) if name.endswith(".json"))
+        else:
+            self._disk_count = 0
+
+    @staticmethod
+    def make_key(assistant_id, transcript, mode=None):
+        """
+        Build the cache key for a feedback request.
+
+        Args:
+            assistant_id (str): The feedback assistant ID
+            transcript (str): The rendered interview transcript
+            mode (str): Optional feedback mode, for reports not produced by a single run
+
+        Returns:
+            str: Hex digest identifying the request
+        """
+        digest = hashlib.sha256()
+        digest.update(assistant_id.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(normalize_transcript(transcript).encode("utf-8"))
+        if mode is not None:
+            digest.update(b"\0")
+            digest.update(mode.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+        Look up a cached report.
+
+        Args:
+            key (str): Key from make_key
+
+        Returns:
+            str: The feedback text, or None on a miss
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, feedback = entry
+                if now - created_at < self.ttl:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return feedback
+                del self._memory[key]
+
+            entry = self.shared.get_report(key) if self.shared is not None else None
+            if entry is not None and now - entry[0] < self.ttl:
+                self._remember(key, *entry)
+                self.hits += 1
+                self.shared_hits += 1
+                return entry[1]
+
+            entry = self._read_disk(key, now)
+            if entry is not None:
+                self._remember(key, *entry)
+                self.hits += 1
+                self.disk_hits += 1
+                return entry[1]
+
+            self.misses += 1
+            return None
+
+    def put(self, key, feedback):
+        """
+        Store a report in every tier.
+
+        Args:
+            key (str): Key from make_key
+            feedback (str): The feedback text
+        """
+        created_at = time.time()
+        with self._lock:
+            self._remember(key, created_at, feedback)
+            self._write_disk(key, created_at, feedback)
+        if self.shared is not None:
+            self.shared.put_report(key, created_at, feedback)
+
+    def get_or_submit(self, key, submit, withdraw=None):
+        """
+        Return a cached report, or attach to / start the job that will produce it.
+
+        Args:
+            key (str): Key from make_key
+            submit (callable): Called with an in-flight token to start a job that runs
+                compute(key, ..., token=token); returns its job ID
+            withdraw (callable): Called with the ID of a job just started here if another
+                replica claimed the request first, to stop the duplicate
+
+        Returns:
+            tuple: (feedback, None) on a hit, otherwise (None, job_id) for the pending job
+        """
+        with self._lock:
+            feedback = self.get(key)
+            if feedback is not None:
+                return feedback, None
+            job_id = self._inflight.get(key, (None, None))[0]
+            if job_id is None and self.shared is not None:
+                # Being produced on another replica
+                job_id = self.shared.claimed(key)
+            if job_id is not None:
+                self.deduplicated += 1
+                return None, job_id
+            token = object()
+            job_id = submit(token)
+            if self.shared is not None:
+                holder = self.shared.claim(key, job_id)
+                if holder != job_id:
+                    # Another replica claimed it between the check above and now; follow its job instead
+                    if withdraw is not None:
+                        withdraw(job_id)
+                    self.deduplicated += 1
+                    return None, holder
+            self._inflight[key] = (job_id, token)
+            return None, job_id
+
+    def abandon(self, job_id):
+        """
+        Stop handing out a cancelled job, so the next identical request starts a new one.
+
+        Args:
+            job_id (str): A job started through get_or_submit
+        """
+        with self._lock:
+            keys = [key for key, (inflight_id, _) in self._inflight.items() if inflight_id == job_id]
+            for key in keys:
+                del self._inflight[key]
+        if self.shared is not None:
+            for key in keys:
+                self.shared.release(key, job_id)
+
+    def compute(self, key, fn, *args, token=None, **kwargs):
+        """
+        Produce a report, cache it and release the in-flight slot for its key.
+
+        Meant to be the function a job runs; exceptions propagate so the job fails.
+        A partial report is returned without being cached, so asking again regrades it.
+
+        Args:
+            key (str): Key from make_key
+            fn (callable): Function returning the feedback text
+            token: The token get_or_submit passed to submit; only the job holding the key's
+                in-flight slot releases it
+            *args, **kwargs: Passed through to fn
+
+        Returns:
+            str: The feedback text
+        """
+        try:
+            try:
+                feedback = fn(*args, **kwargs)
+            except PartialFeedback as e:
+                self.partial += 1
+                return e.report
+            self.put(key, feedback)
+            return feedback
+        finally:
+            with self._lock:
+                job_id, holder = self._inflight.get(key, (None, None))
+                owned = holder is not None and holder is token
+                if owned:
+                    del self._inflight[key]
+            if self.shared is not None and owned:
+                self.shared.release(key, job_id)
+
+    def stats(self):
+        """Return hit/miss counters and tier sizes."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "deduplicated": self.deduplicated,
+                "partial": self.partial,
+                "evictions": self.evictions,
+                "memory_entries": len(self._memory),
+                "disk_entries": self._disk_count,
+                "in_flight": len(self._inflight),
+            }
+
+    def _remember(self, key, created_at, feedback):
+        self._memory[key] = (created_at, feedback)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _read_disk(self, key, now):
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if now - entry["created_at"] >= self.ttl:
+            self._remove_disk(self._path(key))
+            return None
+        return entry["created_at"], entry["feedback"]
+
+    def _write_disk(self, key, created_at, feedback):
+        if not self.directory:
+            return
+        path = self._path(key)
+        existed = os.path.exists(path)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"created_at": created_at, "feedback": feedback}, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+        if not existed:
+            self._disk_count += 1
+            if self._disk_count > self.max_disk_entries:
+                self._evict_disk()
+
+    def _evict_disk(self):
+        # Drop the oldest tenth so eviction scans stay rare
+        paths = [
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory) if name.endswith(".json")
+        ]
+        paths.sort(key=os.path.getmtime)
+        for path in paths[:max(1, len(paths) // 10)]:
+            self._remove_disk(path)
+            self.evictions += 1
+
+    def _remove_disk(self, path):
+        try:
+            os.remove(path)
+            self._disk_count -= 1
+        except OSError:
+            pass
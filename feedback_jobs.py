@@ -0,0 +1,297 @@
+# feedback_jobs.py
+
+import itertools
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+FEEDBACK_WORKERS = 8  # feedback runs in flight at once across all sessions
+MAX_QUEUED_JOBS = 500  # submissions beyond this are refused instead of queued
+MAX_FINISHED_JOBS = 1000  # finished jobs kept around for sessions to pick up
+JOB_LOST_AFTER = 1800  # seconds without an update after which another replica's unfinished job is given up on
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+logger = logging.getLogger("vpe.feedback")
+
+
+class QueueFull(Exception):
+    """Raised when the feedback queue can't take another job."""
+
+
+class FeedbackJob:
+    """A single submitted feedback request and its outcome."""
+
+    def __init__(self, job_id):
+        self.id = job_id
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        # Domain sections graded so far, by domain (None when failed), if the job grades domains separately
+        self.sections = None
+        # Speculative work nobody is waiting on yet; queued behind every other job
+        self.background = False
+        # Event that stops the run when set, and how many sessions are waiting on the job
+        self.cancel = None
+        self.followers = 0
+
+    @classmethod
+    def from_record(cls, record):
+        """Rebuild a job published by another replica from its shared record."""
+        job = cls(record["id"])
+        job.status = record["status"]
+        job.result = record["result"]
+        job.error = record["error"]
+        job.submitted_at = record["submitted_at"]
+        job.started_at = record["started_at"]
+        job.finished_at = record["finished_at"]
+        if not job.finished and time.time() - record["updated_at"] > JOB_LOST_AFTER:
+            # The replica running it went away
+            job.status = FAILED
+            job.error = "Feedback generation was interrupted. Please try again."
+        return job
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED)
+
+    @property
+    def wait_time(self):
+        """Seconds spent queued (so far, if still queued)."""
+        return (self.started_at or time.time()) - self.submitted_at
+
+    @property
+    def run_time(self):
+        """Seconds spent running (so far, if still running), or None if not started."""
+        if self.started_at is None:
+            return None
+        return (self.finished_at or time.time()) - self.started_at
+
+
+class FeedbackJobQueue:
+    """
+    Bounded worker pool for feedback generation, shared by every session.
+
+    Sessions submit a job, keep its ID in session state and look the job up on
+    each rerun, so a slow feedback run never blocks the script that asked for it.
+    Background jobs start only when no job a student asked for is waiting.
+
+    With `shared` (a SharedState), every status change is also published there
+    and get() falls back to it, so a job can be followed from any replica.
+    """
+
+    def __init__(self, max_workers=FEEDBACK_WORKERS, max_queued=MAX_QUEUED_JOBS,
+                 max_finished=MAX_FINISHED_JOBS, shared=None):
+        self.shared = shared
+        # Keeps job IDs unique across replicas
+        self._prefix = f"fb-{uuid.uuid4().hex[:8]}"
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.max_finished = max_finished
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="feedback")
+        self._jobs = {}
+        self._queued = OrderedDict()
+        self._calls = {}
+        self._finished = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.completed_count = 0
+        self.failed_count = 0
+        self.cancelled_count = 0
+        self.total_wait_time = 0.0
+        self.total_run_time = 0.0
+
+    def submit(self, fn, *args, background=False, **kwargs):
+        """
+        Queue a feedback job.
+
+        Args:
+            fn (callable): Function producing the feedback text; raising marks the job failed
+            *args, **kwargs: Passed through to fn
+            background (bool): Start the job only once no other queued job is waiting
+
+        Returns:
+            str: The job ID
+        """
+        with self._lock:
+            if len(self._queued) >= self.max_queued:
+                raise QueueFull("Too many feedback requests are waiting. Please try again shortly.")
+            job = FeedbackJob(f"{self._prefix}-{next(self._ids)}")
+            job.background = background
+            self._jobs[job.id] = job
+            self._queued[job.id] = job
+            self._calls[job.id] = (fn, args, kwargs)
+        self._publish(job)
+        # Each worker task runs whichever job is next in line when a worker frees up
+        self._executor.submit(self._run_next)
+        return job.id
+
+    def promote(self, job_id):
+        """
+        Treat a background job as one a student is waiting on from now on.
+
+        Returns:
+            bool: True if the job is known here and still queued or running
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return False
+            job.background = False
+            return True
+
+    def follow(self, job_id):
+        """Note that one more session is waiting on a job run here."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.followers += 1
+
+    def release(self, job_id):
+        """
+        Note that a session stopped waiting on a job, cancelling it once no session is.
+
+        A job another replica runs is only let go of; that replica's sessions may still want it.
+        A cancelled job is counted under `cancelled` once it stops, not as a failure.
+
+        Returns:
+            bool: True if the job was cancelled
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.followers == 0:
+                return False
+            job.followers -= 1
+            if job.followers or job.finished or job.cancel is None or job.cancel.is_set():
+                return False
+            job.cancel.set()
+            return True
+
+    def record_result(self, result):
+        """
+        Register a job that is already done, e.g. feedback served from a cache.
+
+        Args:
+            result (str): The feedback text
+
+        Returns:
+            str: The job ID
+        """
+        with self._lock:
+            job = FeedbackJob(f"{self._prefix}-{next(self._ids)}")
+            job.started_at = job.finished_at = job.submitted_at
+            job.status = DONE
+            job.result = result
+            self._jobs[job.id] = job
+            self._remember_finished(job)
+        return job.id
+
+    def get(self, job_id):
+        """
+        Look up a job.
+
+        Args:
+            job_id (str): The job ID returned by submit
+
+        Returns:
+            FeedbackJob: The job, or None if unknown or already evicted
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self.shared is not None:
+            record = self.shared.get_job(job_id)
+            if record is not None:
+                return FeedbackJob.from_record(record)
+        return job
+
+    def position(self, job_id):
+        """
+        Get a queued job's place in line.
+
+        Returns:
+            int: 1 for the next job to start, or 0 if the job is not queued
+        """
+        with self._lock:
+            for index, queued in enumerate(self._in_line(), start=1):
+                if queued.id == job_id:
+                    return index
+        return 0
+
+    def stats(self):
+        """Return queue depth and job timing counters."""
+        with self._lock:
+            queued = len(self._queued)
+            running = sum(1 for job in self._jobs.values() if job.status == RUNNING)
+        finished = self.completed_count + self.failed_count
+        return {
+            "queued": queued,
+            "running": running,
+            "workers": self.max_workers,
+            "completed": self.completed_count,
+            "failed": self.failed_count,
+            "cancelled": self.cancelled_count,
+            "avg_wait_seconds": self.total_wait_time / finished if finished else 0.0,
+            "avg_run_seconds": self.total_run_time / finished if finished else 0.0,
+        }
+
+    def _in_line(self):
+        # Jobs students are waiting on first, then background jobs, each in submission order
+        return sorted(self._queued.values(), key=lambda job: job.background)
+
+    def _run_next(self):
+        with self._lock:
+            job = self._in_line()[0]
+            del self._queued[job.id]
+            fn, args, kwargs = self._calls.pop(job.id)
+            job.started_at = time.time()
+            job.status = RUNNING
+        self._publish(job)
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            job.error = str(e)
+            status = FAILED
+        else:
+            job.result = result
+            status = DONE
+
+        with self._lock:
+            job.finished_at = time.time()
+            job.status = status
+            # Stopped on purpose, so kept out of the failures and the timings
+            cancelled = status == FAILED and job.cancel is not None and job.cancel.is_set()
+            if status == DONE:
+                self.completed_count += 1
+            elif cancelled:
+                self.cancelled_count += 1
+            else:
+                self.failed_count += 1
+            if not cancelled:
+                self.total_wait_time += job.wait_time
+                self.total_run_time += job.run_time
+            self._remember_finished(job)
+        self._publish(job)
+
+    def _publish(self, job):
+        if self.shared is None:
+            return
+        try:
+            self.shared.publish_job(job)
+        except Exception:
+            # Other replicas lose sight of the job, but this one still has it
+            logger.exception("Failed to publish feedback job %s", job.id)
+
+    def _remember_finished(self, job):
+        self._finished[job.id] = job
+        while len(self._finished) > self.max_finished:
+            evicted_id, _ = self._finished.popitem(last=False)
+            self._jobs.pop(evicted_id, None)
@@ -0,0 +1,250 @@
+# metrics.py
+
+import bisect
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Bucket upper bounds in seconds for operation durations
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 21, 34, 55, 90, 180, 300)
+# Bucket upper bounds for counts, e.g. status polls per run
+COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+
+logger = logging.getLogger("vpe.metrics")
+
+
+class Histogram:
+    """Fixed-bucket histogram; observing a value is a bisect and three additions."""
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def quantile(self, q):
+        """
+        Estimate a quantile by interpolating inside the bucket that holds it.
+
+        Args:
+            q (float): Quantile between 0 and 1
+
+        Returns:
+            float: The estimate, or None if nothing was observed
+        """
+        with self._lock:
+            counts = list(self.counts)
+            total = self.count
+        if not total:
+            return None
+        target = q * total
+        seen = 0
+        for index, count in enumerate(counts):
+            if count and seen + count >= target:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (target - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+class Timer:
+    """
+    Context manager timing one operation.
+
+    The outcome defaults to "ok", becomes "error" if the block raises, and can be
+    set by the caller (e.g. "timeout" or "failed") before the block exits.
+    """
+
+    def __init__(self, registry, operation, breakdown, labels):
+        self.registry = registry
+        self.operation = operation
+        self.breakdown = breakdown
+        self.labels = labels
+        self.outcome = "ok"
+        self.start = None
+        self.duration = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        if exc_type is not None and self.outcome == "ok":
+            self.outcome = "error"
+        self.registry.observe("operation_seconds", self.duration,
+                              operation=self.operation, outcome=self.outcome, **self.labels)
+        if self.breakdown is not None:
+            self.breakdown[self.operation] = self.breakdown.get(self.operation, 0.0) + self.duration
+        return False
+
+
+class MetricsRegistry:
+    """Process-wide set of labelled histograms."""
+
+    def __init__(self, prefix="vpe"):
+        self.prefix = prefix
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name, buckets=DURATION_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram(buckets))
+        return histogram
+
+    def observe(self, name, value, buckets=DURATION_BUCKETS, **labels):
+        """
+        Record a value.
+
+        Args:
+            name (str): Metric name, e.g. "operation_seconds"
+            value (float): The observed value
+            buckets (tuple): Bucket bounds, only used the first time a label set is seen
+            **labels: Label values, e.g. operation="openai.runs.create"
+        """
+        self.histogram(name, buckets, **labels).observe(value)
+
+    def timed(self, operation, breakdown=None, **labels):
+        """
+        Time a block as `operation`.
+
+        Args:
+            operation (str): Operation name, e.g. "openai.messages.create"
+            breakdown (dict): Optional per-session dict the duration is added to
+            **labels: Extra labels, e.g. patient="Mr. Aiken"
+
+        Returns:
+            Timer: Context manager for the block
+        """
+        return Timer(self, operation, breakdown, {k: v for k, v in labels.items() if v is not None})
+
+    def instrument(self, operation, fn, **labels):
+        """Wrap fn so every call is timed as `operation`."""
+        def wrapper(*args, **kwargs):
+            with self.timed(operation, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    def snapshot(self):
+        """
+        Summarize every histogram.
+
+        Returns:
+            list: Dicts with name, labels, count, sum, mean, p50 and p95
+        """
+        with self._lock:
+            items = list(self._histograms.items())
+        rows = []
+        for (name, labels), histogram in sorted(items):
+            rows.append({
+                "name": name,
+                "labels": dict(labels),
+                "count": histogram.count,
+                "sum": histogram.sum,
+                "mean": histogram.sum / histogram.count if histogram.count else None,
+                "p50": histogram.quantile(0.5),
+                "p95": histogram.quantile(0.95),
+            })
+        return rows
+
+    def render_prometheus(self):
+        """Render every histogram in the Prometheus text exposition format."""
+        with self._lock:
+            items = list(self._histograms.items())
+        lines = []
+        typed = set()
+        for (name, labels), histogram in sorted(items):
+            metric = f"{self.prefix}_{name}"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} histogram")
+                typed.add(metric)
+            with histogram._lock:
+                counts = list(histogram.counts)
+                total, value_sum = histogram.count, histogram.sum
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                lines.append(f"{metric}_bucket{_labels(labels, le=le)} {cumulative}")
+            lines.append(f"{metric}_sum{_labels(labels)} {value_sum}")
+            lines.append(f"{metric}_count{_labels(labels)} {total}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+
+REGISTRY = MetricsRegistry()
+
+
+def start_metrics_server(port, registry=REGISTRY, host="0.0.0.0"):
+    """
+    Serve the registry at /metrics for a Prometheus scraper.
+
+    Args:
+        port (int): Port to listen on
+        registry (MetricsRegistry): Registry to expose
+        host (str): Interface to bind
+
+    Returns:
+        ThreadingHTTPServer: The running server
+    """
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+
+def start_log_dump(interval, registry=REGISTRY):
+    """
+    Log a JSON snapshot of the registry every `interval` seconds.
+
+    Args:
+        interval (float): Seconds between dumps
+        registry (MetricsRegistry): Registry to dump
+
+    Returns:
+        threading.Thread: The background thread
+    """
+    def dump_forever():
+        while True:
+            time.sleep(interval)
+            logger.info(json.dumps({"event": "metrics", "time": time.time(), "metrics": registry.snapshot()}))
+
+    thread = threading.Thread(target=dump_forever, name="metrics-log-dump", daemon=True)
+    thread.start()
+    return thread
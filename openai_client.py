@@ -0,0 +1,110 @@
+# openai_client.py
+
+import threading
+import weakref
+
+import httpx2
+import openai
+
+MAX_CONNECTIONS = 64  # open connections to OpenAI per process; calls beyond this wait for one to free up
+KEEPALIVE_EXPIRY = 120  # seconds an idle connection is kept for the next call, longer than a student's pause
+CONNECT_TIMEOUT = 5  # seconds allowed to open a connection (TCP and TLS)
+STREAM_END = b"[DONE]"  # last event of a streamed response
+
+
+class _FinishingStream(httpx2.SyncByteStream):
+    """
+    A response body that, once its stream has sent STREAM_END, reads the rest before closing.
+
+    The SDK stops reading a streamed response at STREAM_END, leaving the
+    end of the HTTP body unread, and a connection closed with unread data
+    can't go back to the pool. What follows STREAM_END is only the end of
+    the body, so reading it costs nothing; a stream abandoned earlier is
+    closed as before.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._tail = b""
+
+    def __iter__(self):
+        for chunk in self._stream:
+            self._tail = (self._tail + chunk)[-2 * len(STREAM_END):]
+            yield chunk
+
+    def close(self):
+        try:
+            if self._tail.rstrip().endswith(STREAM_END):
+                for _ in self._stream:
+                    pass
+        finally:
+            self._stream.close()
+
+
+class _FinishingTransport(httpx2.HTTPTransport):
+    def handle_request(self, request):
+        response = super().handle_request(request)
+        response.stream = _FinishingStream(response.stream)
+        return response
+
+
+class OpenAIConnectionPool:
+    """
+    One keep-alive HTTP connection pool for every OpenAI call the process makes.
+
+    Installed as the transport of the openai module's client, which every
+    component calls through, so chat turns, polling, feedback and voice all
+    reuse the same warm connections instead of opening (and handshaking) new
+    ones. Idle connections are kept long enough to outlast the gap between a
+    student's turns, so once the pool is warm a turn opens no connections.
+
+    Args:
+        api_key (str): The OpenAI API key
+        timeout (float): Seconds a call may wait for data before failing
+        max_connections (int): Connections kept open at most
+        keepalive_expiry (float): Seconds an idle connection is kept
+        connect_timeout (float): Seconds allowed to open a connection
+    """
+
+    def __init__(self, api_key, timeout, max_connections=MAX_CONNECTIONS,
+                 keepalive_expiry=KEEPALIVE_EXPIRY, connect_timeout=CONNECT_TIMEOUT):
+        self.api_key = api_key
+        self.timeout = openai.Timeout(timeout, connect=connect_timeout)
+        self.max_connections = max_connections
+        self._lock = threading.Lock()
+        # The connections responses have arrived on; one not seen before was opened for its request
+        self._connections = weakref.WeakSet()
+        self.requests = 0
+        self.connections_opened = 0
+        self.client = openai.DefaultHttpxClient(
+            timeout=self.timeout,
+            transport=_FinishingTransport(limits=httpx2.Limits(
+                max_connections=max_connections, max_keepalive_connections=max_connections,
+                keepalive_expiry=keepalive_expiry)),
+            event_hooks={"response": [self._record_response]},
+        )
+
+    def install(self):
+        """Route the openai module's calls through this pool."""
+        openai.api_key = self.api_key
+        openai.timeout = self.timeout
+        # Retries happen in call_with_retry, which knows the deadline and the circuit breaker
+        openai.max_retries = 0
+        openai.http_client = self.client
+        return self
+
+    def _record_response(self, response):
+        connection = response.extensions.get("network_stream")
+        with self._lock:
+            self.requests += 1
+            if connection is not None and connection not in self._connections:
+                self._connections.add(connection)
+                self.connections_opened += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "connections_opened": self.connections_opened,
+                "max_connections": self.max_connections,
+            }
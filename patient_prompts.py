@@ -1,123 +0,0 @@
-# patient_prompts.py
-
-PATIENT_PROMPTS = {
-    "Mr. Aiken": """You are about to begin an interview with Mr. Aiken, an AI-powered virtual patient. Please approach this conversation as you would with a real patient: ask appropriate questions to gather the clinical information you need to make decisions. You must ask at least five questions before proceeding in the case. After that, the "I don't have any more questions" button will become available--but you should only click it when you believe you've gathered enough information to move forward.
-
-Some responses may take longer than others, so please be patient with Mr. Aiken. If he appears to get stuck, simply ask another question.
-
-Your resident instructs you to conduct a history of present illness, review of appropriate systems, and social history. As you and your resident arrive in the ED, you find Mr. Aiken awake in his ED bed. His smile at your arrival becomes a brief grimace. He massages his abdomen. His son, Ben, is at his bedside.""",
-
-    "Mrs. Kelly": """You are about to begin an interview with Mrs. Kelly, the AI-powered mother of 10-month-old Anna. Please approach this conversation as you would with a real patient: ask appropriate questions to gather the clinical information you need to make decisions. You must ask at least five questions before proceeding in the case. After that, the "I don't have any more questions" button will become available--but you should only click it when you believe you've gathered enough information to move forward.
-
-Some responses may take longer than others, so please be patient with Mrs. Kelly. If she appears to get stuck, simply ask another question.
-
-Your preceptor instructs you to conduct a history of present illness, review of appropriate systems, family history, and social history. Having determined that Anna's condition does not require urgent intervention, you begin asking her mother questions.""",
-
-    "Albert Smitherman": """You are about to begin an interview with Mr. Smitherman, an AI-powered virtual patient. Please approach this conversation as you would with a real patient: ask appropriate questions to gather the clinical information you need to make decisions. You must ask at least five questions before proceeding in the case. After that, the "I don't have any more questions" button will become available--but you should only click it when you believe you've gathered enough information to move forward.
-
-Some responses may take longer than others, so please be patient with Mr. Smitherman. If he appears to get stuck, simply ask another question.
-
-Your preceptor instructs you to conduct a focused history of present illness, relevant review of systems, and appropriate social history for this follow-up visit. You enter the clinic exam room where Mr. Smitherman, an active and independent 87-year-old, is seated on the examination table. He greets you with a warm smile but shifts uncomfortably.""",
-
-    "Mrs. Ada Street": """You are about to begin an interview with Mrs. Ada Street, an AI-powered virtual patient. Please approach this conversation as you would with a real patient: ask appropriate questions to gather the clinical information you need to make decisions. You must ask at least five questions before proceeding in the case. After that, the "I don't have any more questions" button will become available--but you should only click it when you believe you've gathered enough information to move forward.
-
-Some responses may take longer than others, so please be patient with Mrs. Street. If she appears to get stuck, simply ask another question.
-
-Your preceptor instructs you to conduct a thorough history of present illness, relevant review of systems, and appropriate social history for her chief complaint of bladder problems. You enter the clinic exam room where Mrs. Ada Street is seated, ready to discuss her concerns.""",
-
-    "Betsy Pearce": """You are about to begin an interview with Betsy Pearce, a 16-year-old AI-powered virtual patient. Please approach this conversation as you would with a real patient: ask appropriate questions to gather the clinical information you need to make decisions. You must ask at least five questions before proceeding in the case. After that, the "I don't have any more questions" button will become available--but you should only click it when you believe you've gathered enough information to move forward.
-
-Some responses may take longer than others, so please be patient with Betsy. If she appears to get stuck, simply ask another question.
-
-You are about to meet Betsy, a 16-year-old who has come to the outpatient pediatric clinic in November for a checkup. Your preceptor, Dr. Blake, suggests that you start the interview with Betsy and her mother alone. You will then do the physical examination together. Dr. Blake reminds you not to forget the HEEADSSS interview! Before you enter the clinic room, you and Dr. Blake meet Mrs. Pearce, who is going back to work. She voices some concerns about Betsy: Mother reports Betsy is less active, fatigued, not doing as well as usual in school, paler than usual. Mother is concerned about possible depression. You enter the examining room and introduce yourself to Betsy: "Hi, Betsy, I'm a medical student working with Dr. Blake. She has asked me to start your office visit, and then she will join us." """,
-
-    "Chantel Newman": """You are about to begin working with an AI-powered virtual patient case. Please approach this conversation as you would with a real patient: ask appropriate questions to gather the clinical information you need to make decisions. You must ask at least five questions before proceeding in the case. After that, the "I don't have any more questions" button will become available--but you should only click it when you believe you've gathered enough information to move forward.
-
-Some responses may take longer than others, so please be patient. If the patient appears to get stuck, simply ask another question.
-
-You are a student working at Dr. Medel's family medicine office. The next patient is being brought back to an exam room. Dr. Medel says, "Oh, that's Althea Newman. I've been taking care of her ever since I delivered her five years ago. I haven't seen her in a while." Together, you and Dr. Medel look at Althea's prior appointments. Her last visit was about 18 months ago when she had gastroenteritis. Today, the nurse has entered a chief concern of "sore throat and fever." Dr. Medel continues, "Why don't you go see how Althea is doing? When you're done with your history and physical, come find me. Also, it looks like she missed her 4-year-old well-child exam and probably some immunizations as well, so we'll keep that in mind when we make our plan." You review the electronic medical record (EMR) and learn the following about Althea: Birth history: Born at term by vaginal delivery, birth weight 6 pounds 11 ounces. No problems in the hospital and went home on the second day of life. Breastfed for six months. Past medical history: No active medical problems. Past visit history shows that most encounters were for well-child exams and immunizations, but she also had visits for colic, otitis media, and vomiting. Medications: None, including over-the-counter medications, supplements, herbal products, or vitamins. Allergies: No known drug allergies. Althea's name changes color on the screen signifying that she is ready to be seen by the clinician, so you head to her exam room.""",
-
-    "Steve Monson": """You are about to interview an AI-powered virtual patient. Please approach this conversation as you would with a real patient: ask appropriate questions to gather the clinical information you need to make decisions. You must ask at least five questions before proceeding in the case. After that, the "I don't have any more questions" button will become available--but you should only click it when you believe you've gathered enough information to move forward.
-
-Some responses may take longer than others, so please be patient. If the patient appears to get stuck, simply ask another question.
-
-You are working with Dr. Heather Stanton. She asks you to see Steve Monson, a 49-year-old male in the emergency department (ED) with chest pain whom the emergency medicine physician wants to admit. Dr. Stanton tells you that Mr. Monson had an electrocardiogram (ECG) performed in the ED and pulls it up to review it with you before you go to meet him. She explains, "In an adult patient presenting with acute chest pain, it is always important to get an ECG as early as possible to evaluate for myocardial infarction. Many times this will be done by an Emergency Medical Services (EMS) member if a patient is arriving by ambulance or by the ED triage nurse when the patient registers. Even if the likelihood of acute coronary syndrome seems low, an ECG is an inexpensive and non-invasive test and the consequences of delayed identification of MI can be life-threatening." You arrive at Mr. Monson's room and see that he is lying comfortably in his bed reading the paper. His wife and two teenage children are at his bedside. He is on telemetry.""",
-
-    "Jessica Morales": """You are about to begin an interview with Ms. Jessica Morales, an AI-powered virtual patient. Please approach this conversation as you would with a real patient: ask appropriate questions to gather the clinical information you need to make decisions. You must ask at least five questions before proceeding in the case. After that, the "I don't have any more questions" button will become available--but you should only click it when you believe you've gathered enough information to move forward.
-
-Some responses may take longer than others, so please be patient with Ms. Morales. If she appears to get stuck, simply ask another question.
-
-Dr. Gray instructs you to gather a thorough history for this 2-week-old newborn visit, focusing on pregnancy history, birth history, feeding, and any parental concerns. You enter the exam room where Ms. Morales is seated, gently holding 2-week-old Olivia.""",
-
-    "Amanda Waters": """You are about to begin an interview with Ms. Amanda Waters, an AI-powered virtual patient. Please approach this conversation as you would with a real patient: ask appropriate questions to gather the clinical information you need to make decisions. You must ask at least five questions before proceeding in the case. After that, the "I don't have any more questions" button will become available--but you should only click it when you believe you've gathered enough information to move forward.
-
-Some responses may take longer than others, so please be patient with Ms. Waters. If she appears to get stuck, simply ask another question.
-
-Dr. Hill instructs you to conduct a thorough history of present illness and relevant review of systems for her chief complaint of palpitations. You and Dr. Hill enter the exam room where Ms. Waters, a 30-year-old female, is seated on the examination table. Her partner, Mary Jo Menutti, is seated nearby.""",
-
-    "Barbara Turner": """You are about to begin an interview with Mrs. Barbara Turner, an AI-powered virtual patient. Please approach this conversation as you would with a real patient: ask appropriate questions to gather the clinical information you need to make decisions. You must ask at least five questions before proceeding in the case. After that, the "I don't have any more questions" button will become available--but you should only click it when you believe you've gathered enough information to move forward.
-
-Some responses may take longer than others, so please be patient with Mrs. Turner. If she appears to get stuck, simply ask another question.
-
-Your senior resident, Dr. Okupa, asks you to conduct a thorough history of present illness and relevant review of systems for her chief complaint of abdominal pain and vomiting. You enter the ED room where Mrs. Turner, a 55-year-old female, is lying on the stretcher, visibly uncomfortable and holding her abdomen.""",
-
-    "Anna Pine": """You are about to begin an interview with Ms. Anna Pine, an AI-powered virtual patient. Please approach this conversation as you would with a real patient: ask appropriate questions to gather the clinical information you need to make decisions. You must ask at least five questions before proceeding in the case. After that, the "I don't have any more questions" button will become available--but you should only click it when you believe you've gathered enough information to move forward.
-
-Some responses may take longer than others, so please be patient with Ms. Pine. If she appears to get stuck, simply ask another question.
-
-Dr. Long instructs you to conduct a thorough history of present illness and relevant review of systems for her chief complaint of headaches. You enter the exam room where Ms. Pine, a 24-year-old college student, is seated and ready to discuss her concerns.""",
-
-    "Miriam Salaah": """You are about to interview an AI-powered virtual patient. Please approach this conversation as you would with a real patient: ask appropriate questions to gather the clinical information you need to make decisions. You must ask at least five questions before proceeding in the case. After that, the "I don't have any more questions" button will become available--but you should only click it when you believe you've gathered enough information to move forward.
-
-Some responses may take longer than others, so please be patient. If the patient appears to get stuck, simply ask another question.
-
-You are a medical student working with neurologist Dr. Bartlett in his outpatient clinic. Before seeing the next patient, Dr. Bartlett tells you that Ms. Stella, a 28-year-old woman, has come to the office complaining of dizziness, unsteadiness, and headache. He asks you to think broadly about the possible causes of dizziness before entering the room and to obtain a careful description of her symptoms during the initial interview. You review her chart and note that Ms. Stella has a past medical history of migraines beginning in her teenage years. Her migraines have generally been well controlled with as-needed over-the-counter medications, and there are no other significant medical issues documented. When you enter the exam room, you see Ms. Stella sitting very still on the examination table. Her facial expression appears tense, and she is holding her head and neck stiffly, as though movement might worsen her symptoms. After introducing yourself, you prepare to begin the interview to better understand the nature of her dizziness and headache.""",
-
-    "Lori Johnson": """You are about to begin an interview with Ms. Lori Johnson, an AI-powered virtual patient. Please approach this conversation as you would with a real patient: ask appropriate questions to gather the clinical information you need to make decisions. You must ask at least five questions before proceeding in the case. After that, the "I don't have any more questions" button will become available--but you should only click it when you believe you've gathered enough information to move forward.
-
-Some responses may take longer than others, so please be patient with Ms. Johnson. If she appears to get stuck, simply ask another question.
-
-Dr. Small instructs you to conduct a thorough history of present illness and relevant review of systems for her chief complaint of heavy, irregular menses. You enter the exam room where Ms. Johnson, a 42-year-old G2P2 with LMP two weeks ago, is seated and ready to discuss her concerns.""",
-
-    "Dolores Russell": """You are about to begin an interview with Ms. Dolores Russell, an AI-powered virtual patient. Please approach this conversation as you would with a real patient: ask appropriate questions to gather the clinical information you need to make decisions. You must ask at least five questions before proceeding in the case. After that, the "I don't have any more questions" button will become available--but you should only click it when you believe you've gathered enough information to move forward.
-
-Some responses may take longer than others, so please be patient with Ms. Russell. If she appears to get stuck, simply ask another question.
-
-Ms. Walker instructs you to conduct a thorough history of present illness and relevant review of systems for her chief complaint of pelvic pain. You enter the exam room where Ms. Russell, a 31-year-old new patient, is seated and ready to discuss her concerns.""",
-
-    "Kenny Johnson": """You are about to interview an AI-powered virtual patient. Please approach this conversation as you would with a real patient: ask appropriate questions to gather the clinical information you need to make decisions. You must ask at least five questions before proceeding in the case. After that, the "I don't have any more questions" button will become available--but you should only click it when you believe you've gathered enough information to move forward.
-
-Some responses may take longer than others, so please be patient. If the patient appears to get stuck, simply ask another question.
-
-You are a medical student on your psychiatry rotation. During a call shift, you are working with Dr. Fuji when the emergency department requests a psychiatric consultation. Dr. Simon, the ED physician, asks for help evaluating a patient with concerning behavioral changes. The patient, Kenny Jensen, has been brought to the ED by his mother, Kendra. She reports that over the past three weeks Kenny has not been himself—he has been unusually excited, speaking very rapidly, and behaving differently from his usual self. The ED team has some safety concerns and would like assistance assessing his condition. You review Kenny's medical record before entering the room. He has no significant past medical or psychiatric history. His most recent medical encounter was a routine physical for college athletics, which was normal. Laboratory tests from the ED visit, including thyroid studies, are currently pending. You and Dr. Fuji enter the room and introduce yourselves. Kenny is standing when you arrive. After confirming his name and date of birth, you offer him a seat, but he politely declines, saying he prefers to stand. You introduce yourself to his mother and explain that some sensitive questions may arise during the interview, asking Kenny whether he would like his mother to remain in the room. He nods and asks her to stay. Kenny appears both eager and slightly apprehensive to speak with you and Dr. Fuji. Dr. Fuji turns to you and asks you to begin the interview.""",
-
-    "Allison Killpatrick": """You are about to begin an interview with Ms. Allison Killpatrick, an AI-powered virtual patient. Please approach this conversation as you would with a real patient: ask appropriate questions to gather the clinical information you need to make decisions. You must ask at least five questions before proceeding in the case. After that, the "I don't have any more questions" button will become available--but you should only click it when you believe you've gathered enough information to move forward.
-
-Some responses may take longer than others, so please be patient with Ms. Killpatrick. If she appears to get stuck, simply ask another question.
-
-Dr. Williams instructs you to conduct a thorough psychiatric intake interview focusing on her presenting concerns of anxiety and relationship difficulties. You enter the room where Ms. Killpatrick, a 29-year-old seeking help for the first time, sits with her partner, Louisa, looking visibly nervous about this initial psychiatry appointment.""",
-
-    "Erica Patterson": """You are about to begin an interview with Ms. Erica Patterson, an AI-powered virtual patient. Please approach this conversation as you would with a real patient: ask appropriate questions to gather the clinical information you need to make decisions. You must ask at least five questions before proceeding in the case. After that, the "I don't have any more questions" button will become available--but you should only click it when you believe you've gathered enough information to move forward.
-
-Some responses may take longer than others, so please be patient with Ms. Patterson. If she appears to get stuck, simply ask another question.
-
-Dr. Jennings instructs you to conduct a comprehensive pain assessment for this palliative medicine consultation. You enter the exam room where Ms. Patterson, a 35-year-old with a recent diagnosis of metastatic breast cancer to T6, is seated. She was referred for persistent back pain management.""",
-
-    "Mrs. Miller": """You are about to begin using the teach-back method with Mrs. Miller, an AI-powered virtual patient. Please approach this conversation as you would with a real patient: deploy the teach-back technique. You must have at least five interactions before proceeding in the case. After that, the "I don't have any more questions" button will become available--but you should only click it when you believe you've finished.
-
-Some responses may take longer than others, so please be patient with Ms. Patterson. If she appears to get stuck, simply ask another question.
-
-You begin doing a pre-discharge teach-back of Mrs. Miller discharge plans. You enter the room where Mrs. Miller, an 80-year-old preparing for discharge awaits with her daughter."""
-}
-
-def get_patient_prompt(patient_name):
-    """
-    Get the intro prompt for a specific patient.
-    
-    Args:
-        patient_name (str): The name of the patient
-        
-    Returns:
-        str: The patient's intro prompt, or None if not found
-    """
-    return PATIENT_PROMPTS.get(patient_name)
\ No newline at end of file
@@ -0,0 +1,166 @@
+# rate_limiter.py
+
+import heapq
+import itertools
+import threading
+import time
+
+# Admission priorities, most urgent first
+CHAT = 0
+FEEDBACK = 1
+POLL = 2
+PREGRADE = 3  # speculative feedback, which nobody is waiting on yet
+PRIORITY_NAMES = {CHAT: "chat", FEEDBACK: "feedback", POLL: "poll", PREGRADE: "pregrade"}
+
+CHARS_PER_TOKEN = 4  # rough English average, good enough for budgeting
+WAIT_UPDATE_INTERVAL = 1.0  # seconds between queue-position callbacks
+
+
+class AdmissionTimeout(Exception):
+    """Raised when a call could not be admitted within its wait budget."""
+
+
+def estimate_tokens(chars):
+    """
+    Estimate the token count of some text.
+
+    Args:
+        chars (int | str): The text, or its length in characters
+
+    Returns:
+        int: Estimated tokens
+    """
+    if isinstance(chars, str):
+        chars = len(chars)
+    return chars // CHARS_PER_TOKEN + 1
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `per_minute / 60` per second."""
+
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount):
+        """Seconds until `amount` tokens are available (0 if they already are)."""
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate if self.rate else float("inf")
+
+    def take(self, amount):
+        self.tokens -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    """
+    Process-wide admission control for OpenAI calls.
+
+    Two token buckets, one for requests and one for estimated tokens, are shared by
+    every session. Callers queue in priority order (chat, then feedback, then status
+    polls, then speculative grading; first come first served within a priority) and only the head of the queue
+    may draw from the buckets, so bursts wait their turn instead of turning into 429s.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._seq = itertools.count()
+        self.admitted = {name: 0 for name in PRIORITY_NAMES.values()}
+        self.timeouts = {name: 0 for name in PRIORITY_NAMES.values()}
+        self.total_wait = 0.0
+
+    def admit(self, priority, tokens=0, timeout=None, on_wait=None, escalation=None):
+        """
+        Block until the call may proceed.
+
+        Args:
+            priority (int): CHAT, FEEDBACK, POLL or PREGRADE
+            tokens (int): Estimated tokens the call will consume
+            timeout (float): Maximum seconds to wait, or None to wait indefinitely
+            on_wait (callable): Called with the 1-based queue position while waiting
+            escalation (callable): Optional; returns the call's priority now, so a waiting
+                call can be moved up the line, keeping its place among calls of that priority
+
+        Raises:
+            AdmissionTimeout: If the call was not admitted in time
+        """
+        ticket = (priority, next(self._seq))
+        start = time.monotonic()
+        deadline = start + timeout if timeout is not None else None
+        reported = None
+
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+        try:
+            while True:
+                with self._cond:
+                    raised = escalation() if escalation is not None else priority
+                    if raised < priority:
+                        self._waiting.remove(ticket)
+                        priority, ticket = raised, (raised, ticket[1])
+                        self._waiting.append(ticket)
+                        heapq.heapify(self._waiting)
+                    now = time.monotonic()
+                    self.requests.refill(now)
+                    self.tokens.refill(now)
+                    if self._waiting[0] == ticket:
+                        delay = max(self.requests.time_until(1), self.tokens.time_until(tokens))
+                        if delay <= 0:
+                            self.requests.take(1)
+                            self.tokens.take(tokens)
+                            heapq.heappop(self._waiting)
+                            self.admitted[PRIORITY_NAMES[priority]] += 1
+                            self.total_wait += now - start
+                            self._cond.notify_all()
+                            return
+                    else:
+                        delay = WAIT_UPDATE_INTERVAL
+                    if deadline is not None and now >= deadline:
+                        self.timeouts[PRIORITY_NAMES[priority]] += 1
+                        raise AdmissionTimeout("The service is very busy right now. Please try again in a moment.")
+                    position = sum(1 for waiting in self._waiting if waiting < ticket) + 1
+                    wait = min(delay, WAIT_UPDATE_INTERVAL)
+                    if deadline is not None:
+                        wait = min(wait, deadline - now)
+                    self._cond.wait(wait)
+
+                if on_wait is not None and position != reported:
+                    reported = position
+                    on_wait(position)
+        finally:
+            with self._cond:
+                if ticket in self._waiting:
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                    self._cond.notify_all()
+
+    def limited(self, fn, priority, timeout=None):
+        """Wrap fn so every call is admitted at `priority` first."""
+        def wrapper(*args, **kwargs):
+            self.admit(priority, timeout=timeout)
+            return fn(*args, **kwargs)
+        return wrapper
+
+    def stats(self):
+        """Return queue length, admissions, timeouts and mean wait."""
+        with self._cond:
+            waiting = len(self._waiting)
+            admitted = sum(self.admitted.values())
+            return {
+                "waiting": waiting,
+                "admitted": dict(self.admitted),
+                "timeouts": dict(self.timeouts),
+                "avg_wait_seconds": self.total_wait / admitted if admitted else 0.0,
+                "requests_available": int(self.requests.tokens),
+                "tokens_available": int(self.tokens.tokens),
+            }
@@ -0,0 +1,273 @@
+# resilience.py
+
+import random
+import threading
+import time
+
+import openai
+
+MAX_ATTEMPTS = 4  # tries per call, including the first
+RETRY_BASE_DELAY = 0.5  # seconds before the first retry; doubles each time
+RETRY_MAX_DELAY = 8.0  # ceiling for a single backoff
+RETRYABLE_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+# Responses saying OpenAI itself is unwell; a 429 only says this org is over its limits, which the rate limiter handles
+UPSTREAM_FAILURE_STATUS_CODES = (408, 500, 502, 503, 504)
+# Exception types worth another try; used where a status code can't be inspected first
+RETRYABLE_ERRORS = (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)
+
+BREAKER_FAILURE_THRESHOLD = 5  # consecutive upstream failures before the breaker opens
+BREAKER_RESET_TIMEOUT = 30  # seconds the breaker stays open before letting a probe through
+
+# Breaker states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+DEGRADED_MESSAGE = (
+    "The virtual patient service can't reach OpenAI right now, so requests are paused "
+    f"briefly. Please try again in about {BREAKER_RESET_TIMEOUT} seconds."
+)
+
+# Metadata key tagging messages and runs, so a retry can tell whether the first attempt landed
+REQUEST_TAG = "client_request_id"
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling OpenAI while the circuit breaker is open."""
+
+    def __init__(self, message=DEGRADED_MESSAGE):
+        super().__init__(message)
+
+
+def is_retryable(exc):
+    """
+    Decide whether a failed OpenAI call is worth repeating.
+
+    Args:
+        exc (Exception): The error raised by the call
+
+    Returns:
+        bool: True for timeouts, dropped connections, rate limits and 5xx responses
+    """
+    if isinstance(exc, openai.APIConnectionError):
+        return True
+    if isinstance(exc, openai.APIStatusError):
+        return exc.status_code in RETRYABLE_STATUS_CODES or exc.status_code >= 500
+    return False
+
+
+def is_upstream_failure(exc):
+    """
+    Decide whether a failed OpenAI call says OpenAI is unavailable.
+
+    Args:
+        exc (Exception): The error raised by the call
+
+    Returns:
+        bool: True for timeouts, dropped connections and 5xx responses; False for rate limits
+    """
+    if isinstance(exc, openai.APIConnectionError):
+        return True
+    if isinstance(exc, openai.APIStatusError):
+        return exc.status_code in UPSTREAM_FAILURE_STATUS_CODES or exc.status_code >= 500
+    return False
+
+
+def backoff_delay(attempt, base=RETRY_BASE_DELAY, cap=RETRY_MAX_DELAY):
+    """
+    Capped exponential backoff with jitter.
+
+    Half of the delay is fixed and half random, so retries from many sessions
+    spread out without any of them retrying immediately.
+
+    Args:
+        attempt (int): 1 for the first retry, 2 for the second, ...
+        base (float): Delay before the first retry
+        cap (float): Largest delay returned
+
+    Returns:
+        float: Seconds to sleep
+    """
+    delay = min(cap, base * 2 ** (attempt - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def retry_after(exc):
+    """Return the server's Retry-After hint in seconds, if it sent one."""
+    response = getattr(exc, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """
+    Process-wide circuit breaker for OpenAI.
+
+    After `failure_threshold` consecutive upstream failures (errors that
+    is_upstream_failure() accepts) the breaker opens and every call fails fast
+    with CircuitOpen. Rate limit responses don't count: OpenAI answered them,
+    and backing off from them is the rate limiter's job. Once `reset_timeout` seconds have passed a single probe call is
+    let through; its success closes the breaker, its failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._probe_started = None
+        self._lock = threading.Lock()
+        self.trips = 0
+        self.rejected = 0
+
+    @property
+    def is_open(self):
+        """True while calls are being refused (including while a probe is out)."""
+        return self.state != CLOSED
+
+    def before_call(self):
+        """
+        Check that a call may go ahead.
+
+        Raises:
+            CircuitOpen: If the breaker is open and it isn't time for a probe yet
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            now = time.monotonic()
+            if self.state == OPEN and now - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._probe_started = None
+            # One probe at a time; a probe that never reported back is replaced after a while
+            if self.state == HALF_OPEN and (self._probe_started is None
+                                            or now - self._probe_started >= self.reset_timeout):
+                self._probe_started = now
+                return
+            self.rejected += 1
+        raise CircuitOpen()
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._probe_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self._probe_started = None
+                self.trips += 1
+
+    def record_error(self, exc):
+        """Count an error against the breaker if it says something about upstream health."""
+        if is_upstream_failure(exc):
+            self.record_failure()
+        elif isinstance(exc, openai.APIError):
+            # OpenAI answered, even if it was to refuse the request or slow this org down
+            self.record_success()
+
+    def guard(self, fn):
+        """Wrap fn so every call checks and updates the breaker."""
+        def wrapper(*args, **kwargs):
+            self.before_call()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                self.record_error(e)
+                raise
+            self.record_success()
+            return result
+        return wrapper
+
+    def stats(self):
+        """Return state, consecutive failures, trips and fast-failed calls."""
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "trips": self.trips,
+                "rejected": self.rejected,
+            }
+
+
+def call_with_retry(fn, deadline=None, breaker=None, reconcile=None, on_retry=None, max_attempts=MAX_ATTEMPTS):
+    """
+    Call fn, retrying transient OpenAI failures with backoff.
+
+    A failed call that wrote something (a message, a run) may still have reached
+    the server. Pass `reconcile` for such calls: before each retry it is asked for
+    the result of the earlier attempt and returns it, or None if the attempt
+    didn't land, so a retry never duplicates the write.
+
+    Args:
+        fn (callable): The call, taking no arguments
+        deadline (float): time.monotonic() value after which no retry is started
+        breaker (CircuitBreaker): Optional breaker checked before and updated after every attempt
+        reconcile (callable): Optional check for an earlier attempt's result
+        on_retry (callable): Called as on_retry(attempt, delay, error) before sleeping
+        max_attempts (int): Tries in total, including the first
+
+    Returns:
+        The result of fn (or of reconcile)
+
+    Raises:
+        CircuitOpen: If the breaker is open
+        Exception: The last error, once it isn't retryable or the attempts or time run out
+    """
+    attempt = 0
+    while True:
+        if breaker is not None:
+            breaker.before_call()
+        try:
+            result = reconcile() if attempt and reconcile is not None else None
+            if result is None:
+                result = fn()
+        except Exception as e:
+            if breaker is not None:
+                breaker.record_error(e)
+            if not is_retryable(e):
+                raise
+            attempt += 1
+            delay = max(backoff_delay(attempt), min(retry_after(e) or 0, RETRY_MAX_DELAY))
+            if attempt >= max_attempts or (deadline is not None and time.monotonic() + delay >= deadline):
+                raise
+            if on_retry is not None:
+                on_retry(attempt, delay, e)
+            time.sleep(delay)
+            continue
+        if breaker is not None:
+            breaker.record_success()
+        return result
+
+
+def _tag(obj):
+    return (getattr(obj, "metadata", None) or {}).get(REQUEST_TAG)
+
+
+def find_tagged_message(thread_id, request_id):
+    """
+    Return the thread's latest message if it carries `request_id`, else None.
+
+    Used to reconcile a messages.create whose response was lost.
+    """
+    latest = openai.beta.threads.messages.list(thread_id=thread_id, limit=1).data
+    return latest[0] if latest and _tag(latest[0]) == request_id else None
+
+
+def find_tagged_run(thread_id, request_id):
+    """
+    Return the thread's latest run if it carries `request_id`, else None.
+
+    Used to reconcile a runs.create whose response was lost.
+    """
+    latest = openai.beta.threads.runs.list(thread_id=thread_id, limit=1).data
+    return latest[0] if latest and _tag(latest[0]) == request_id else None
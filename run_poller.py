@@ -0,0 +1,148 @@
+# run_poller.py
+
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import openai
+
+# Statuses after which a run will not change any more
+TERMINAL_STATUSES = ("completed", "failed", "cancelled", "expired", "incomplete", "requires_action")
+
+INITIAL_POLL_DELAY = 0.5  # seconds before the first status check of a run
+BACKOFF_FACTOR = 1.5  # each check waits this much longer than the previous one
+MAX_POLL_DELAY = 2.0  # ceiling for the per-run backoff
+RETRIEVE_WORKERS = 8  # concurrent runs.retrieve calls across the whole process
+
+
+def retrieve_run(thread_id, run_id):
+    """Fetch a run's current state from the API."""
+    return openai.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run_id)
+
+
+class RunPollTimeout(TimeoutError):
+    """Raised on a watch future when no waiter is interested in the run any more."""
+
+
+class _Watch:
+    """Bookkeeping for one pending (thread_id, run_id)."""
+
+    def __init__(self, deadline):
+        self.future = Future()
+        self.deadline = deadline
+        self.polls = 0
+
+
+class RunPoller:
+    """
+    Process-wide run status poller.
+
+    A single asyncio loop on a background thread owns every pending run. Each run
+    is checked with its own adaptive backoff, and sessions waiting on the same run
+    share one watch instead of polling it separately.
+    """
+
+    def __init__(self, retrieve=retrieve_run, initial_delay=INITIAL_POLL_DELAY,
+                 max_delay=MAX_POLL_DELAY, workers=RETRIEVE_WORKERS, on_finish=None,
+                 transient_errors=()):
+        self._retrieve = retrieve
+        # Errors that only skip one check (e.g. the call wasn't admitted) rather than end the watch
+        self._transient_errors = tuple(transient_errors)
+        # Called as on_finish(outcome, polls) when a watch ends; outcome is the run status, "timeout" or "error"
+        self._on_finish = on_finish
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="run-poller-io")
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="run-poller", daemon=True)
+        self._thread.start()
+        self.retrieve_calls = 0
+        self.coalesced_watches = 0
+
+    def watch(self, thread_id, run_id, timeout):
+        """
+        Start (or join) polling of a run.
+
+        Args:
+            thread_id (str): The thread the run belongs to
+            run_id (str): The run to watch
+            timeout (float): Seconds this caller is willing to wait
+
+        Returns:
+            concurrent.futures.Future: Resolves to the run once it reaches a terminal
+            status, or fails with RunPollTimeout / the retrieve error
+        """
+        key = (thread_id, run_id)
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            watch = self._pending.get(key)
+            if watch is not None:
+                watch.deadline = max(watch.deadline, deadline)
+                self.coalesced_watches += 1
+                return watch.future
+            watch = _Watch(deadline)
+            self._pending[key] = watch
+        self._loop.call_soon_threadsafe(self._loop.create_task, self._poll(key, watch))
+        return watch.future
+
+    def stats(self):
+        """Return counters describing the poller's current load."""
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "pending_runs": pending,
+            "retrieve_calls": self.retrieve_calls,
+            "coalesced_watches": self.coalesced_watches,
+        }
+
+    async def _poll(self, key, watch):
+        loop = asyncio.get_running_loop()
+        delay = self.initial_delay
+        while True:
+            await asyncio.sleep(max(0, min(delay, watch.deadline - time.monotonic())))
+            with self._lock:
+                if time.monotonic() >= watch.deadline:
+                    self._pending.pop(key, None)
+                    expired = True
+                else:
+                    expired = False
+            if expired:
+                self._report(watch, "timeout")
+                watch.future.set_exception(RunPollTimeout(f"Run {key[1]} still pending"))
+                return
+
+            try:
+                run = await loop.run_in_executor(self._executor, self._retrieve, *key)
+            except self._transient_errors:
+                delay = min(delay * BACKOFF_FACTOR, self.max_delay)
+                continue
+            except Exception as e:
+                watch.polls += 1
+                self.retrieve_calls += 1
+                self._finish(key)
+                self._report(watch, "error")
+                watch.future.set_exception(e)
+                return
+            watch.polls += 1
+            self.retrieve_calls += 1
+
+            if run.status in TERMINAL_STATUSES:
+                self._finish(key)
+                self._report(watch, run.status)
+                watch.future.set_result(run)
+                return
+            delay = min(delay * BACKOFF_FACTOR, self.max_delay)
+
+    def _finish(self, key):
+        with self._lock:
+            self._pending.pop(key, None)
+
+    def _report(self, watch, outcome):
+        if self._on_finish is not None:
+            try:
+                self._on_finish(outcome, watch.polls)
+            except Exception:
+                pass
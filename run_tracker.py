@@ -0,0 +1,145 @@
+# run_tracker.py
+
+import hashlib
+import threading
+import time
+import uuid
+from collections import Counter
+
+ABANDONED_AFTER = 600  # seconds after which a run nobody finished or cancelled is forgotten
+
+# Why runs get cancelled, as counted in stats()
+SWITCHED = "switched"  # the student moved to another patient
+SUPERSEDED = "superseded"  # the student sent a different message before the reply came
+TIMED_OUT = "timed_out"  # no reply within the chat timeout
+
+
+def idempotency_key(thread_id, prompt):
+    """Key identifying a message to a thread, so a resubmission can be recognised while its run is going."""
+    return hashlib.sha256(f"{thread_id}\0{prompt.strip()}".encode("utf-8")).hexdigest()
+
+
+class TrackedRun:
+    """One chat turn's run, from posting the student's message until the reply arrives or the run is cancelled."""
+
+    def __init__(self, session, key, thread_id):
+        self.session = session
+        self.key = key
+        self.thread_id = thread_id
+        # Tags the message and run, so the run can be found even if its ID was never seen
+        self.request_id = uuid.uuid4().hex
+        self.run_id = None
+        self.started_at = time.monotonic()
+        # Until the message is on the thread, a resubmission has nothing to wait on and must post it itself
+        self.posted = False
+
+
+class RunTracker:
+    """
+    Process-wide record of the chat runs every session has in flight.
+
+    A script run that Streamlit stops part way (the student switched patient,
+    or submitted again) never sees its run finish, but the run goes on
+    producing, and billing for, a reply nobody will read. Runs stay tracked
+    until their turn ends normally, so the session's next script run can either
+    pick the same run up again, when the student resubmits the same message,
+    or cancel it.
+
+    Sessions are served by one process for as long as their connection lasts,
+    so the record is kept per process.
+    """
+
+    def __init__(self, abandoned_after=ABANDONED_AFTER):
+        self.abandoned_after = abandoned_after
+        self._runs = {}
+        self._lock = threading.Lock()
+        self.tracked = 0
+        self.deduplicated = 0
+        self.cancelled = Counter()
+
+    def begin(self, session, thread_id, prompt):
+        """
+        Track a new turn's run; it can be attached to once posted() is called.
+
+        Args:
+            session (str): The session token
+            thread_id (str): The thread the message is posted to
+            prompt (str): The student's message
+
+        Returns:
+            TrackedRun: The run; tag the message and run with its request_id
+        """
+        run = TrackedRun(session, idempotency_key(thread_id, prompt), thread_id)
+        with self._lock:
+            self._expire()
+            self._runs[run.request_id] = run
+            self.tracked += 1
+        return run
+
+    def attach(self, session, thread_id, prompt):
+        """
+        Find the run already answering this message, if the session has one in flight.
+
+        Returns:
+            TrackedRun: The run to wait on instead of starting another, or None
+        """
+        key = idempotency_key(thread_id, prompt)
+        with self._lock:
+            self._expire()
+            for run in self._runs.values():
+                if run.session == session and run.key == key and run.posted:
+                    self.deduplicated += 1
+                    return run
+        return None
+
+    def posted(self, request_id):
+        """Note that a tracked run's message is on its thread, so resubmissions can wait on the run."""
+        with self._lock:
+            run = self._runs.get(request_id)
+            if run is not None:
+                run.posted = True
+
+    def started(self, request_id, run_id):
+        """Note the ID of a tracked run once the API has reported it."""
+        with self._lock:
+            run = self._runs.get(request_id)
+            if run is not None:
+                run.run_id = run_id
+
+    def finish(self, request_id):
+        """Stop tracking a run whose turn has ended."""
+        with self._lock:
+            self._runs.pop(request_id, None)
+
+    def abandon(self, session):
+        """
+        Stop tracking every run a session has in flight.
+
+        Returns:
+            list: The TrackedRuns, for the caller to cancel
+        """
+        with self._lock:
+            runs = [run for run in self._runs.values() if run.session == session]
+            for run in runs:
+                del self._runs[run.request_id]
+        return runs
+
+    def record_cancelled(self, reason):
+        """Count a run cancelled for `reason` (SWITCHED, SUPERSEDED or TIMED_OUT)."""
+        with self._lock:
+            self.cancelled[reason] += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._runs),
+                "tracked": self.tracked,
+                "deduplicated": self.deduplicated,
+                "cancelled": dict(self.cancelled),
+                "cancelled_total": sum(self.cancelled.values()),
+            }
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.abandoned_after
+        for request_id in [request_id for request_id, run in self._runs.items() if run.started_at < cutoff]:
+            del self._runs[request_id]
@@ -0,0 +1,260 @@
+# session_store.py
+
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+BATCH_SIZE = 500  # writes committed together at most
+BUSY_TIMEOUT_MS = 5000  # how long a connection waits on a locked database
+
+logger = logging.getLogger("vpe.sessions")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    token TEXT PRIMARY KEY,
+    actor TEXT,
+    thread_id TEXT,
+    conversation INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0,
+    feedback_job TEXT
+);
+CREATE TABLE IF NOT EXISTS turns (
+    id INTEGER PRIMARY KEY,
+    token TEXT NOT NULL,
+    conversation INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    seconds REAL
+);
+CREATE INDEX IF NOT EXISTS turns_by_conversation ON turns (token, conversation, id);
+CREATE TABLE IF NOT EXISTS conversations (
+    token TEXT NOT NULL,
+    conversation INTEGER NOT NULL,
+    actor TEXT,
+    started_at REAL NOT NULL,
+    PRIMARY KEY (token, conversation)
+);
+CREATE TABLE IF NOT EXISTS feedback (
+    id INTEGER PRIMARY KEY,
+    token TEXT NOT NULL,
+    conversation INTEGER NOT NULL,
+    actor TEXT,
+    feedback TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS feedback_by_conversation ON feedback (token, conversation, id);
+"""
+
+
+def connect(path):
+    """Open a connection to the store in WAL mode."""
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # With WAL, NORMAL only risks the last commits on power loss, never corruption
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def migrate(conn):
+    """Bring a store created by an earlier version up to the current schema."""
+    session_columns = {row[1] for row in conn.execute("PRAGMA table_info(sessions)")}
+    if "version" not in session_columns:
+        with conn:
+            conn.execute("ALTER TABLE sessions ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            conn.execute("ALTER TABLE sessions ADD COLUMN feedback_job TEXT")
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(turns)")}
+    if "seconds" not in columns:
+        with conn:
+            conn.execute("ALTER TABLE turns ADD COLUMN seconds REAL")
+            # Only each session's latest conversation still says which case it was
+            conn.execute("INSERT OR IGNORE INTO conversations (token, conversation, actor, started_at) "
+                         "SELECT token, conversation, actor, created_at FROM sessions")
+
+
+class SessionStore:
+    """
+    Durable, append-only record of each browser session's interview.
+
+    Sessions are keyed by a random token. Turns and feedback reports are only ever
+    inserted; switching patients starts a new conversation number rather than
+    deleting anything, and load() returns the current conversation.
+
+    Writes are queued and committed by one background thread in batches, so
+    recording a turn costs a queue put however many sessions are writing.
+
+    Every write also bumps the session's version. Several replicas can share
+    the file: a replica compares version() with the version it last loaded or
+    wrote to tell whether another replica has moved the session on since.
+    """
+
+    def __init__(self, path, batch_size=BATCH_SIZE):
+        self.path = path
+        self.batch_size = batch_size
+        self._queue = queue.Queue()
+        self._conn = connect(path)
+        self._conn.executescript(SCHEMA)
+        migrate(self._conn)
+        # Separate from the writer's connection, for the reads done on every rerun
+        self._reader = connect(path)
+        self._read_lock = threading.Lock()
+        self.writes = 0
+        self.batches = 0
+        self.errors = 0
+        self._writer = threading.Thread(target=self._write_forever, name="session-store-writer", daemon=True)
+        self._writer.start()
+
+    def start_conversation(self, token, actor):
+        """Begin a new conversation with `actor` for the session, creating the session if needed."""
+        now = time.time()
+        self._queue.put((
+            "INSERT INTO sessions (token, actor, thread_id, conversation, created_at, updated_at, version) "
+            "VALUES (?, ?, NULL, 1, ?, ?, 1) "
+            "ON CONFLICT (token) DO UPDATE SET actor = excluded.actor, thread_id = NULL, feedback_job = NULL, "
+            "conversation = conversation + 1, version = version + 1, updated_at = excluded.updated_at",
+            (token, actor, now, now),
+        ))
+        self._queue.put((
+            "INSERT OR REPLACE INTO conversations (token, conversation, actor, started_at) "
+            "SELECT token, conversation, ?, ? FROM sessions WHERE token = ?",
+            (actor, now, token),
+        ))
+
+    def set_thread(self, token, thread_id):
+        """Record the OpenAI thread holding the session's current conversation."""
+        self._queue.put((
+            "UPDATE sessions SET thread_id = ?, version = version + 1, updated_at = ? WHERE token = ?",
+            (thread_id, time.time(), token),
+        ))
+
+    def set_feedback_job(self, token, job_id):
+        """Record the feedback job producing the report for the session's current conversation."""
+        self._queue.put((
+            "UPDATE sessions SET feedback_job = ?, version = version + 1, updated_at = ? WHERE token = ?",
+            (job_id, time.time(), token),
+        ))
+
+    def append_turn(self, token, role, content, seconds=None):
+        """Add a turn to the session's current conversation, with how long a reply took if known."""
+        self._queue.put((
+            "INSERT INTO turns (token, conversation, role, content, created_at, seconds) "
+            "SELECT token, conversation, ?, ?, ?, ? FROM sessions WHERE token = ?",
+            (role, content, time.time(), seconds, token),
+        ))
+        self._touch(token)
+
+    def record_feedback(self, token, actor, feedback):
+        """Keep a feedback report for the session's current conversation."""
+        self._queue.put((
+            "INSERT INTO feedback (token, conversation, actor, feedback, created_at) "
+            "SELECT token, conversation, ?, ?, ? FROM sessions WHERE token = ?",
+            (actor, feedback, time.time(), token),
+        ))
+        self._touch(token)
+
+    def _touch(self, token):
+        self._queue.put((
+            "UPDATE sessions SET version = version + 1, updated_at = ? WHERE token = ?",
+            (time.time(), token),
+        ))
+
+    def version(self, token):
+        """
+        Return the session's version as committed, 0 if it is unknown.
+
+        Writes still queued in this process are not counted.
+        """
+        with self._read_lock:
+            row = self._reader.execute("SELECT version FROM sessions WHERE token = ?", (token,)).fetchone()
+        return row[0] if row else 0
+
+    def load(self, token):
+        """
+        Read back a session's current conversation.
+
+        Waits for queued writes first, so a session always sees its own turns.
+
+        Args:
+            token (str): The session token
+
+        Returns:
+            dict: actor, thread_id, messages, the latest feedback (or None), the
+                feedback job still producing one (or None) and the version read,
+                or None if the session is unknown
+        """
+        self.flush()
+        conn = connect(self.path)
+        try:
+            # Read first: a write landing mid-load then shows up as a newer version, not a lost one
+            session = conn.execute(
+                "SELECT actor, thread_id, conversation, version, feedback_job FROM sessions WHERE token = ?", (token,)
+            ).fetchone()
+            if session is None:
+                return None
+            actor, thread_id, conversation, version, feedback_job = session
+            turns = conn.execute(
+                "SELECT role, content FROM turns WHERE token = ? AND conversation = ? ORDER BY id",
+                (token, conversation),
+            ).fetchall()
+            feedback = conn.execute(
+                "SELECT feedback FROM feedback WHERE token = ? AND conversation = ? ORDER BY id DESC LIMIT 1",
+                (token, conversation),
+            ).fetchone()
+        finally:
+            conn.close()
+        return {
+            "actor": actor,
+            "thread_id": thread_id,
+            "messages": [{"role": role, "content": content} for role, content in turns],
+            "feedback": feedback[0] if feedback else None,
+            "feedback_job": feedback_job,
+            "version": version,
+        }
+
+    def flush(self):
+        """Block until every queued write is committed."""
+        self._queue.join()
+
+    def stats(self):
+        """Return queued, written, batch and error counts."""
+        return {
+            "queued": self._queue.qsize(),
+            "writes": self.writes,
+            "batches": self.batches,
+            "avg_batch": self.writes / self.batches if self.batches else 0.0,
+            "errors": self.errors,
+        }
+
+    def _write_forever(self):
+        while True:
+            batch = [self._queue.get()]
+            # Whatever queued up during the last commit goes into this one
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with self._conn:
+                    for sql, params in batch:
+                        self._conn.execute(sql, params)
+                self.writes += len(batch)
+                self.batches += 1
+            except sqlite3.Error:
+                # Write one at a time so a single bad record doesn't take the batch with it
+                for sql, params in batch:
+                    try:
+                        with self._conn:
+                            self._conn.execute(sql, params)
+                        self.writes += 1
+                    except sqlite3.Error:
+                        self.errors += 1
+                        logger.exception("Failed to write session store record")
+                self.batches += 1
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
@@ -0,0 +1,281 @@
+# shared_state.py
+
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+
+from session_store import connect
+
+CLAIM_TTL = 600  # seconds a replica's claim on a feedback request lasts if it never finishes
+JOB_RETENTION = 24 * 3600  # seconds job records are kept after their last update
+REPORT_RETENTION = 30 * 24 * 3600  # seconds shared feedback reports are kept
+MAX_LOCAL_REPORTS = 512  # reports the in-process stand-in keeps
+PRUNE_EVERY = 200  # writes between sweeps for expired records
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    submitted_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS reports (
+    key TEXT PRIMARY KEY,
+    feedback TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS claims (
+    key TEXT PRIMARY KEY,
+    job_id TEXT NOT NULL,
+    claimed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    position REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS threads_by_position ON threads (position);
+"""
+
+JOB_FIELDS = ("id", "status", "result", "error", "submitted_at", "started_at", "finished_at", "updated_at")
+
+
+class LocalSharedState:
+    """
+    In-process stand-in for SharedState, for a single replica.
+
+    Same interface and semantics, kept in dicts, so the app and its tests need
+    no shared file when only one process serves students.
+    """
+
+    def __init__(self, max_reports=MAX_LOCAL_REPORTS):
+        self.max_reports = max_reports
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._reports = OrderedDict()
+        self._claims = {}
+        self._threads = deque()
+        self._writes = 0
+
+    def publish_job(self, job):
+        """Record a feedback job's current status so any replica can look it up."""
+        with self._lock:
+            self._jobs[job.id] = _job_record(job)
+            self._count_write()
+
+    def get_job(self, job_id):
+        """Return a job's last published record as a dict, or None."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def get_report(self, key):
+        """Return (created_at, feedback) for a cached report, or None."""
+        with self._lock:
+            return self._reports.get(key)
+
+    def put_report(self, key, created_at, feedback):
+        """Share a finished feedback report."""
+        with self._lock:
+            self._reports[key] = (created_at, feedback)
+            self._reports.move_to_end(key)
+            while len(self._reports) > self.max_reports:
+                self._reports.popitem(last=False)
+
+    def claim(self, key, job_id):
+        """
+        Mark a feedback request as being produced by `job_id`, unless someone already is.
+
+        Returns:
+            str: The job that holds the claim, `job_id` if the claim was taken
+        """
+        now = time.time()
+        with self._lock:
+            held = self._claims.get(key)
+            if held is not None and now - held[1] < CLAIM_TTL:
+                return held[0]
+            self._claims[key] = (job_id, now)
+            return job_id
+
+    def claimed(self, key):
+        """Return the job producing a feedback request, or None."""
+        with self._lock:
+            held = self._claims.get(key)
+        if held is None or time.time() - held[1] >= CLAIM_TTL:
+            return None
+        return held[0]
+
+    def release(self, key, job_id):
+        """Drop `job_id`'s claim on a feedback request."""
+        with self._lock:
+            if self._claims.get(key, (None,))[0] == job_id:
+                del self._claims[key]
+
+    def push_thread(self, thread_id, created_at, front=False, max_size=None):
+        """
+        Add an empty thread to the shared pool; `front` puts it next in line.
+
+        Returns:
+            bool: False if the pool already held `max_size` threads, so the thread was not added
+        """
+        with self._lock:
+            if max_size is not None and len(self._threads) >= max_size:
+                return False
+            if front:
+                self._threads.appendleft((thread_id, created_at))
+            else:
+                self._threads.append((thread_id, created_at))
+            return True
+
+    def pop_thread(self):
+        """Take the next pooled thread as (thread_id, created_at), or None if the pool is empty."""
+        with self._lock:
+            return self._threads.popleft() if self._threads else None
+
+    def thread_count(self):
+        """Return how many threads are pooled."""
+        with self._lock:
+            return len(self._threads)
+
+    def stats(self):
+        """Return record counts."""
+        with self._lock:
+            return {
+                "backend": "local",
+                "jobs": len(self._jobs),
+                "reports": len(self._reports),
+                "claims": len(self._claims),
+                "threads": len(self._threads),
+            }
+
+    def _count_write(self):
+        self._writes += 1
+        if self._writes % PRUNE_EVERY == 0:
+            cutoff = time.time() - JOB_RETENTION
+            for job_id in [job_id for job_id, job in self._jobs.items() if job["updated_at"] < cutoff]:
+                del self._jobs[job_id]
+
+
+class SharedState:
+    """
+    Coordination state shared by every replica through one SQLite file.
+
+    Holds what replicas need to agree on so students can be served by any of
+    them: feedback job status (a student whose next request lands on another
+    replica still sees their report arrive), finished reports and which job is
+    producing each pending one (so two replicas don't grade the same
+    transcript), and the pool of pre-created threads.
+
+    Writes go straight to the file (WAL mode), so other replicas see them on
+    their next read. Put the file on storage every replica can reach.
+
+    Args:
+        path (str): The SQLite file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = connect(path)
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _execute(self, sql, params=(), write=False):
+        with self._lock:
+            if write:
+                with self._conn:
+                    rows = self._conn.execute(sql, params).fetchall()
+                self._writes += 1
+                if self._writes % PRUNE_EVERY == 0:
+                    self._prune()
+                return rows
+            return self._conn.execute(sql, params).fetchall()
+
+    def publish_job(self, job):
+        record = _job_record(job)
+        self._execute(
+            f"INSERT OR REPLACE INTO jobs ({', '.join(JOB_FIELDS)}) VALUES ({', '.join('?' * len(JOB_FIELDS))})",
+            tuple(record[field] for field in JOB_FIELDS), write=True)
+
+    def get_job(self, job_id):
+        rows = self._execute(f"SELECT {', '.join(JOB_FIELDS)} FROM jobs WHERE id = ?", (job_id,))
+        return dict(zip(JOB_FIELDS, rows[0])) if rows else None
+
+    def get_report(self, key):
+        rows = self._execute("SELECT created_at, feedback FROM reports WHERE key = ?", (key,))
+        return rows[0] if rows else None
+
+    def put_report(self, key, created_at, feedback):
+        self._execute("INSERT OR REPLACE INTO reports (key, feedback, created_at) VALUES (?, ?, ?)",
+                      (key, feedback, created_at), write=True)
+
+    def claim(self, key, job_id):
+        now = time.time()
+        # Takes the claim if there is none or it has expired, in one statement so replicas can't both win
+        self._execute(
+            "INSERT INTO claims (key, job_id, claimed_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET job_id = excluded.job_id, claimed_at = excluded.claimed_at "
+            "WHERE claims.claimed_at < ?",
+            (key, job_id, now, now - CLAIM_TTL), write=True)
+        return self.claimed(key) or job_id
+
+    def claimed(self, key):
+        rows = self._execute("SELECT job_id FROM claims WHERE key = ? AND claimed_at >= ?",
+                             (key, time.time() - CLAIM_TTL))
+        return rows[0][0] if rows else None
+
+    def release(self, key, job_id):
+        self._execute("DELETE FROM claims WHERE key = ? AND job_id = ?", (key, job_id), write=True)
+
+    def push_thread(self, thread_id, created_at, front=False, max_size=None):
+        # Positions order the pool: the front is below every other entry, the back above
+        edge = "MIN(position) - 1" if front else "MAX(position) + 1"
+        # The size check is part of the insert, so replicas returning threads at once can't overfill the pool
+        rows = self._execute(
+            f"INSERT OR IGNORE INTO threads (thread_id, created_at, position) "
+            f"SELECT ?, ?, COALESCE((SELECT {edge} FROM threads), 0) "
+            f"WHERE ? IS NULL OR (SELECT COUNT(*) FROM threads) < ? RETURNING thread_id",
+            (thread_id, created_at, max_size, max_size), write=True)
+        return bool(rows)
+
+    def pop_thread(self):
+        rows = self._execute(
+            "DELETE FROM threads WHERE thread_id = (SELECT thread_id FROM threads ORDER BY position LIMIT 1) "
+            "RETURNING thread_id, created_at", write=True)
+        return rows[0] if rows else None
+
+    def thread_count(self):
+        return self._execute("SELECT COUNT(*) FROM threads")[0][0]
+
+    def stats(self):
+        counts = {table: self._execute(f"SELECT COUNT(*) FROM {table}")[0][0]
+                  for table in ("jobs", "reports", "claims", "threads")}
+        return {"backend": "sqlite", "path": self.path, **counts}
+
+    def _prune(self):
+        now = time.time()
+        try:
+            with self._conn:
+                self._conn.execute("DELETE FROM jobs WHERE updated_at < ?", (now - JOB_RETENTION,))
+                self._conn.execute("DELETE FROM reports WHERE created_at < ?", (now - REPORT_RETENTION,))
+                self._conn.execute("DELETE FROM claims WHERE claimed_at < ?", (now - CLAIM_TTL,))
+        except sqlite3.Error:
+            # Another replica holds the write lock; it or a later sweep will get to it
+            pass
+
+
+def _job_record(job):
+    return {
+        "id": job.id,
+        "status": job.status,
+        "result": job.result,
+        "error": job.error,
+        "submitted_at": job.submitted_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "updated_at": time.time(),
+    }
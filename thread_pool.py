@@ -0,0 +1,110 @@
+# thread_pool.py
+
+import threading
+import time
+
+import openai
+
+from shared_state import LocalSharedState
+
+THREAD_POOL_SIZE = 8  # pre-created threads kept ready for new conversations
+MAX_POOLED_THREADS = 32  # returned threads beyond this are dropped
+THREAD_MAX_AGE = 24 * 3600  # seconds before a pooled thread is considered stale
+REFILL_RETRY_DELAY = 5  # seconds to back off after a failed refill
+
+
+def create_thread():
+    """Create an empty thread and return its ID."""
+    return openai.beta.threads.create().id
+
+
+class OpenAIThreadPool:
+    """
+    Process-wide pool of pre-created, empty OpenAI threads.
+
+    A background task keeps the pool topped up to its target size so sessions can
+    take a thread without waiting on threads.create. Threads that were handed out
+    but never written to can be returned for reuse.
+
+    The threads are kept in `shared` (a SharedState), so replicas sharing it
+    draw from, and top up, one pool. By default the pool is this process's own.
+    """
+
+    def __init__(self, create=create_thread, target_size=THREAD_POOL_SIZE,
+                 max_size=MAX_POOLED_THREADS, max_age=THREAD_MAX_AGE, shared=None):
+        self._create = create
+        self.target_size = target_size
+        self.max_size = max_size
+        self.max_age = max_age
+        self._threads = shared if shared is not None else LocalSharedState()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self.hits = 0
+        self.misses = 0
+        self.returned = 0
+        self.created = 0
+        self._refiller = threading.Thread(target=self._refill_forever, name="thread-pool-refill", daemon=True)
+        self._refiller.start()
+        self._wakeup.set()
+
+    def acquire(self):
+        """
+        Take an empty thread, creating one on the spot if the pool has run dry.
+
+        Returns:
+            str: The thread ID
+        """
+        now = time.time()
+        while (pooled := self._threads.pop_thread()) is not None:
+            thread_id, created_at = pooled
+            if now - created_at < self.max_age:
+                with self._lock:
+                    self.hits += 1
+                self._wakeup.set()
+                return thread_id
+        with self._lock:
+            self.misses += 1
+        self._wakeup.set()
+        thread_id = self._create()
+        with self._lock:
+            self.created += 1
+        return thread_id
+
+    def release(self, thread_id):
+        """
+        Return a thread that was never written to; it is dropped if the pool is already full.
+
+        Args:
+            thread_id (str): The unused thread ID
+        """
+        if self._threads.push_thread(thread_id, time.time(), front=True, max_size=self.max_size):
+            with self._lock:
+                self.returned += 1
+
+    def stats(self):
+        """Return pool size and hit/miss counters."""
+        available = self._threads.thread_count()
+        with self._lock:
+            return {
+                "available": available,
+                "target_size": self.target_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "returned": self.returned,
+                "created": self.created,
+            }
+
+    def _refill_forever(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            while True:
+                try:
+                    if self._threads.thread_count() >= self.target_size:
+                        break
+                    thread_id = self._create()
+                    with self._lock:
+                        self.created += 1
+                    self._threads.push_thread(thread_id, time.time(), max_size=self.max_size)
+                except Exception:
+                    time.sleep(REFILL_RETRY_DELAY)
@@ -0,0 +1,217 @@
+# transcript.py
+
+import re
+import textwrap
+
+import openai
+
+from rate_limiter import CHARS_PER_TOKEN, estimate_tokens
+
+# Labels used for each role when the transcript is handed to a feedback assistant
+ROLE_LABELS = {
+    "user": "STUDENT",
+    "assistant": "PATIENT",
+}
+
+FEEDBACK_TOKEN_BUDGET = 6000  # estimated tokens a transcript may take up in a feedback prompt
+RECENT_TURNS = 12  # latest turns always given verbatim, even when the rest is condensed
+SUMMARY_STUDENT_CHARS = 240  # longest student question kept in the summary
+SUMMARY_PATIENT_CHARS = 120  # longest patient reply kept in the summary
+COMPACTION_NOTE_CHARS = 400  # allowance for the notes marking the summary and verbatim parts
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def summarize_turn(role, content):
+    """
+    Condense one turn to a summary line.
+
+    The student's questions are what the feedback grades, so they are kept (up to
+    SUMMARY_STUDENT_CHARS); the patient's replies are cut to their first sentence.
+    A line is never longer than the turn's rendered form.
+
+    Args:
+        role (str): "user" or "assistant"
+        content (str): The message text
+
+    Returns:
+        str: "ROLE: condensed text" and a newline
+    """
+    text = " ".join(content.split())
+    if role == "user":
+        width = SUMMARY_STUDENT_CHARS
+    else:
+        text = SENTENCE_END.split(text, 1)[0]
+        width = SUMMARY_PATIENT_CHARS
+    text = textwrap.shorten(text, width, placeholder=" ...") if len(text) > width else text
+    return f"{ROLE_LABELS.get(role, 'PATIENT')}: {text}\n"
+
+
+def _first(lo, hi, fits):
+    """Return the smallest i in [lo, hi] with fits(i), for fits that only ever turns True; None if none."""
+    if not fits(hi):
+        return None
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if fits(mid):
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
+
+
+class Transcript:
+    """
+    Append-only record of an interview, kept in step with the chat as turns complete.
+
+    Turns are stored as (role, content) tuples and only joined into text when the
+    transcript is rendered, so building it never re-reads the thread.
+
+    A rolling summary is kept alongside: each turn's summary line is written as the
+    turn is appended, so compact() only has to pick how much of it to use.
+    """
+
+    def __init__(self, turns=None):
+        self.turns = []
+        # Running size of the turn contents, used for token estimates
+        self.chars = 0
+        # Summary line per turn, and running sizes of the rendered turns and summary lines
+        self.summary = []
+        self._rendered_ends = [0]
+        self._summary_ends = [0]
+        for role, content in turns or ():
+            self.append(role, content)
+
+    def __len__(self):
+        return len(self.turns)
+
+    def append(self, role, content):
+        """
+        Record a completed turn.
+
+        Args:
+            role (str): "user" or "assistant"
+            content (str): The message text
+        """
+        self.turns.append((role, content))
+        self.chars += len(content)
+        label = ROLE_LABELS.get(role, "PATIENT")
+        self._rendered_ends.append(self._rendered_ends[-1] + len(label) + len(content) + 4)
+        line = summarize_turn(role, content)
+        self.summary.append(line)
+        self._summary_ends.append(self._summary_ends[-1] + len(line))
+
+    def render(self):
+        """
+        Format the transcript for a feedback prompt.
+
+        Returns:
+            str: One "ROLE: content" paragraph per turn, oldest first
+        """
+        return "".join(
+            f"{ROLE_LABELS.get(role, 'PATIENT')}: {content}\n\n" for role, content in self.turns
+        )
+
+    def compact(self, budget=FEEDBACK_TOKEN_BUDGET, recent=RECENT_TURNS):
+        """
+        Format the transcript for a feedback prompt within a token budget.
+
+        A transcript that fits is rendered as is. Otherwise the oldest turns are
+        replaced by their summary lines, as few as it takes to fit, keeping at least
+        the last `recent` turns verbatim. If the summary is itself too long its
+        oldest lines are left out. Either way the text says which turns were
+        condensed or left out, so the feedback assistant knows.
+
+        Args:
+            budget (int): Estimated tokens the text may take up
+            recent (int): Latest turns never condensed
+
+        Returns:
+            tuple: (text, compaction) where compaction is a dict with the turn count,
+                how many turns were "summarized", "omitted" and kept "verbatim", and
+                the estimated "tokens" of the text and of the full transcript
+        """
+        total = len(self.turns)
+        rendered = self._rendered_ends
+        summary = self._summary_ends
+        compaction = {"turns": total, "summarized": 0, "omitted": 0, "verbatim": total,
+                      "full_tokens": estimate_tokens(rendered[-1])}
+        room = budget * CHARS_PER_TOKEN - COMPACTION_NOTE_CHARS
+        if rendered[-1] <= budget * CHARS_PER_TOKEN:
+            text = self.render()
+            compaction["tokens"] = estimate_tokens(text)
+            return text, compaction
+
+        # Turns [omitted, condensed) are given as summary lines, [condensed, total) verbatim
+        last = max(total - recent, 0)
+        condensed = _first(0, last, lambda i: summary[i] + rendered[-1] - rendered[i] <= room)
+        if condensed is None:
+            condensed = last
+        verbatim = rendered[-1] - rendered[condensed]
+        omitted = _first(0, condensed, lambda i: summary[condensed] - summary[i] + verbatim <= room)
+        if omitted is None:
+            omitted = condensed
+
+        parts = []
+        if omitted:
+            parts.append(f"[Turns 1-{omitted} are left out for length.]\n")
+        if condensed > omitted:
+            parts.append(f"[Turns {omitted + 1}-{condensed} are condensed: the student's questions are kept "
+                         f"and the patient's replies shortened to their first sentence.]\n")
+            parts.extend(self.summary[omitted:condensed])
+        parts.append(f"\n[Turns {condensed + 1}-{total} verbatim:]\n\n")
+        parts.extend(f"{ROLE_LABELS.get(role, 'PATIENT')}: {content}\n\n"
+                     for role, content in self.turns[condensed:])
+        text = "".join(parts)
+        compaction.update(summarized=condensed - omitted, omitted=omitted, verbatim=total - condensed,
+                          tokens=estimate_tokens(text))
+        return text, compaction
+
+    def matches(self, messages):
+        """
+        Check that the transcript agrees with a list of chat messages.
+
+        Args:
+            messages (list): Message dicts as kept in st.session_state.messages
+
+        Returns:
+            bool: True if both hold the same turns in the same order
+        """
+        return len(self.turns) == len(messages) and all(
+            turn == (msg["role"], msg["content"]) for turn, msg in zip(self.turns, messages)
+        )
+
+    @classmethod
+    def from_messages(cls, messages):
+        """
+        Build a transcript from chat message dicts.
+
+        Args:
+            messages (list): Message dicts with "role" and "content" keys
+
+        Returns:
+            Transcript: A transcript holding the same turns
+        """
+        return cls((msg["role"], msg["content"]) for msg in messages)
+
+    @classmethod
+    def fetch(cls, thread_id, page_size=100):
+        """
+        Rebuild a transcript from the server copy of a thread.
+
+        Only meant for verification or recovery; every page of the thread is read,
+        so long interviews are not truncated.
+
+        Args:
+            thread_id (str): The thread to read
+            page_size (int): Messages requested per page
+
+        Returns:
+            Transcript: The thread's turns, oldest first
+        """
+        transcript = cls()
+        # The SDK's cursor page follows "after" links on iteration
+        for msg in openai.beta.threads.messages.list(thread_id=thread_id, order="asc", limit=page_size):
+            content = "".join(part.text.value for part in msg.content if part.type == "text")
+            transcript.append(msg.role, content)
+        return transcript
@@ -0,0 +1,691 @@
+# voice.py
+
+import io
+import logging
+import math
+import queue
+import re
+import threading
+import time
+import wave
+from collections import deque
+
+import numpy as np
+import openai
+
+SAMPLE_RATE = 16000  # rate used for voice activity detection and speech-to-text
+VAD_FRAME_SECONDS = 0.02  # analysis frame for voice activity detection
+VAD_THRESHOLD_DB = 12.0  # how far above the noise floor a frame must be to count as speech
+VAD_MIN_DB = -50.0  # frames quieter than this are never speech, however quiet the room
+VAD_START_SECONDS = 0.06  # continuous speech needed before an utterance starts
+VAD_HANGOVER_SECONDS = 0.5  # silence that ends an utterance
+VAD_NOISE_ADAPTATION = 0.05  # weight of each silent frame in the running noise floor
+PREROLL_SECONDS = 0.3  # audio kept from before the detected start, so first syllables aren't clipped
+STT_CHUNK_SECONDS = 0.5  # speech handed to the speech-to-text stream at a time
+MAX_UTTERANCE_SECONDS = 30  # an utterance is cut off here even if the student keeps talking
+CAPTURE_SECONDS = 60  # microphone audio kept in each session's ring buffer
+PLAYBACK_SECONDS = 120  # synthesized speech that can be queued for playback
+MAX_FRAME_SAMPLES = 48000  # largest WebRTC frame handled without allocating
+LATENCY_HISTORY = 50  # end-of-speech to first-audio latencies kept per session
+VOICE_IDLE_TIMEOUT = 60  # seconds without audio after which a session's voice pipeline is closed
+
+OPENAI = "openai"
+LOCAL = "local"  # stand-ins that need no network, for benchmarks and development
+
+STT_MODEL = "whisper-1"
+TTS_MODEL = "gpt-4o-mini-tts"
+TTS_SAMPLE_RATE = 24000  # OpenAI's "pcm" speech format: 24 kHz, 16-bit, mono
+TTS_CHUNK_BYTES = 4800  # 0.1 s of 24 kHz speech per streamed chunk
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+logger = logging.getLogger("vpe.voice")
+
+
+class RingBuffer:
+    """
+    Fixed-size circular buffer of samples, addressed by absolute sample position.
+
+    Storage is allocated once. Writers copy into it, and readers copy a range of
+    absolute positions out of it, which stays available until `capacity` newer
+    samples have been written.
+    """
+
+    def __init__(self, capacity, dtype=np.float32):
+        self.capacity = capacity
+        self._data = np.zeros(capacity, dtype=dtype)
+        self.written = 0  # samples written since creation
+
+    def write(self, samples):
+        """Append samples, overwriting the oldest once full."""
+        n = len(samples)
+        if n > self.capacity:
+            self.written += n - self.capacity
+            samples = samples[-self.capacity:]
+            n = self.capacity
+        start = self.written % self.capacity
+        first = min(n, self.capacity - start)
+        self._data[start:start + first] = samples[:first]
+        self._data[:n - first] = samples[first:]
+        self.written += n
+
+    def read(self, start, end, out=None):
+        """
+        Copy the samples at absolute positions [start, end).
+
+        Args:
+            start (int): First position
+            end (int): Position after the last
+            out (ndarray): Optional destination with room for end - start samples
+
+        Returns:
+            ndarray: The samples (a view of `out` if given)
+
+        Raises:
+            ValueError: If part of the range was already overwritten or not written yet
+        """
+        if start < self.written - self.capacity or end > self.written:
+            raise ValueError(f"samples {start}-{end} are not in the buffer")
+        n = end - start
+        out = np.empty(n, dtype=self._data.dtype) if out is None else out[:n]
+        offset = start % self.capacity
+        first = min(n, self.capacity - offset)
+        out[:first] = self._data[offset:offset + first]
+        out[first:] = self._data[:n - first]
+        return out
+
+
+class PlaybackBuffer:
+    """Queue of samples waiting to be played, written by the speaker and drained by the audio callback."""
+
+    def __init__(self, capacity, dtype=np.int16):
+        self._ring = RingBuffer(capacity, dtype)
+        self._read = 0
+        self._lock = threading.Lock()
+        self._space = threading.Condition(self._lock)
+
+    @property
+    def queued(self):
+        return self._ring.written - self._read
+
+    def write(self, samples, timeout=None):
+        """
+        Queue samples for playback, waiting for room if the buffer is full.
+
+        Returns:
+            bool: False if there was no room within `timeout` (the samples are dropped)
+        """
+        with self._space:
+            if not self._space.wait_for(lambda: self.queued + len(samples) <= self._ring.capacity, timeout):
+                return False
+            self._ring.write(samples)
+            return True
+
+    def read_into(self, out):
+        """Fill `out` with the next queued samples, padding with silence; returns how many were real."""
+        with self._lock:
+            n = min(len(out), self.queued)
+            if n:
+                self._ring.read(self._read, self._read + n, out)
+                self._read += n
+                self._space.notify_all()
+        out[n:] = 0
+        return n
+
+    def clear(self):
+        """Drop everything queued, e.g. when the student starts talking over the patient."""
+        with self._lock:
+            self._read = self._ring.written
+            self._space.notify_all()
+
+
+class Downmixer:
+    """
+    Turns interleaved 16-bit frames at any rate into mono float32 at SAMPLE_RATE.
+
+    The first channel is used (browsers send the same signal on both). Rates that
+    are a multiple of SAMPLE_RATE (48 kHz from WebRTC) are decimated by averaging
+    blocks of samples into a preallocated buffer; other rates are interpolated.
+    """
+
+    def __init__(self, max_samples=MAX_FRAME_SAMPLES):
+        self._out = np.zeros(max_samples, dtype=np.float32)
+
+    def process(self, pcm, channels, rate):
+        """
+        Convert one frame.
+
+        Args:
+            pcm (ndarray): Interleaved int16 samples
+            channels (int): Channels in `pcm`
+            rate (int): Sample rate of `pcm`
+
+        Returns:
+            ndarray: Mono float32 samples in [-1, 1), a view valid until the next call
+        """
+        mono = pcm[0::channels]
+        if rate % SAMPLE_RATE == 0:
+            factor = rate // SAMPLE_RATE
+            n = len(mono) // factor
+            out = self._out[:n]
+            np.mean(mono[:n * factor].reshape(n, factor), axis=1, dtype=np.float32, out=out)
+        else:
+            n = int(len(mono) * SAMPLE_RATE / rate)
+            out = self._out[:n]
+            out[:] = np.interp(np.arange(n) * (rate / SAMPLE_RATE), np.arange(len(mono)), mono)
+        out *= 1 / 32768
+        return out
+
+
+def resample(samples, rate, target_rate):
+    """Resample int16 mono speech for playback (integer factors repeat samples, others interpolate)."""
+    if rate == target_rate:
+        return samples
+    if target_rate % rate == 0:
+        return np.repeat(samples, target_rate // rate)
+    n = int(len(samples) * target_rate / rate)
+    return np.interp(np.arange(n) * (rate / target_rate), np.arange(len(samples)), samples).astype(np.int16)
+
+
+class VoiceActivityDetector:
+    """
+    Energy-based end-pointing over fixed-length frames.
+
+    A frame is speech when its level is VAD_THRESHOLD_DB above a running noise
+    floor (and above VAD_MIN_DB). An utterance starts after VAD_START_SECONDS of
+    speech and ends after VAD_HANGOVER_SECONDS of silence. The noise floor only
+    adapts during silence, so a long utterance doesn't raise it.
+    """
+
+    def __init__(self, frame_seconds=VAD_FRAME_SECONDS, threshold_db=VAD_THRESHOLD_DB, min_db=VAD_MIN_DB,
+                 start_seconds=VAD_START_SECONDS, hangover_seconds=VAD_HANGOVER_SECONDS):
+        self.threshold_db = threshold_db
+        self.min_db = min_db
+        self.start_frames = max(1, round(start_seconds / frame_seconds))
+        self.hangover_frames = max(1, round(hangover_seconds / frame_seconds))
+        self.noise_db = -60.0
+        self.speaking = False
+        self._loud = 0
+        self._quiet = 0
+
+    def update(self, frame):
+        """
+        Classify the next frame.
+
+        Returns:
+            str: "start" or "end" when an utterance starts or ends, else None
+        """
+        energy = float(np.dot(frame, frame)) / len(frame)
+        level = 10 * math.log10(energy + 1e-10)
+        loud = level > max(self.noise_db + self.threshold_db, self.min_db)
+        if not self.speaking:
+            if loud:
+                self._loud += 1
+                if self._loud >= self.start_frames:
+                    self.speaking = True
+                    self._quiet = 0
+                    return "start"
+            else:
+                self._loud = 0
+                self.noise_db += VAD_NOISE_ADAPTATION * (level - self.noise_db)
+        elif loud:
+            self._quiet = 0
+        else:
+            self._quiet += 1
+            if self._quiet >= self.hangover_frames:
+                self.speaking = False
+                self._loud = 0
+                return "end"
+        return None
+
+
+class Utterance:
+    """One transcribed stretch of the student's speech."""
+
+    def __init__(self, text, ended_at, seconds, error=None):
+        self.text = text
+        self.ended_at = ended_at  # time.monotonic() when the end of speech was detected
+        self.seconds = seconds
+        self.error = error
+
+
+class LocalSpeechToText:
+    """
+    Stand-in transcriber: returns scripted transcripts in turn, or a description of the audio.
+
+    Args:
+        transcripts (iterable): Texts to return, one per utterance
+        delay (float): Seconds to sleep in finish(), to simulate a remote service
+    """
+
+    def __init__(self, transcripts=(), delay=0.0):
+        self._transcripts = deque(transcripts)
+        self.delay = delay
+
+    def open(self):
+        return _LocalTranscription(self)
+
+
+class _LocalTranscription:
+    def __init__(self, backend):
+        self._backend = backend
+        self.samples = 0
+
+    def feed(self, samples):
+        self.samples += len(samples)
+
+    def finish(self):
+        time.sleep(self._backend.delay)
+        if self._backend._transcripts:
+            return self._backend._transcripts.popleft()
+        return f"(spoke for {self.samples / SAMPLE_RATE:.1f} seconds)"
+
+
+class OpenAISpeechToText:
+    """Transcribes utterances with OpenAI's transcription endpoint."""
+
+    def __init__(self, model=STT_MODEL):
+        self.model = model
+
+    def open(self):
+        return _OpenAITranscription(self.model)
+
+
+class _OpenAITranscription:
+    def __init__(self, model):
+        self.model = model
+        # The endpoint takes whole files, so chunks are written to a WAV as they arrive
+        self._buffer = io.BytesIO()
+        self._wav = wave.open(self._buffer, "wb")
+        self._wav.setnchannels(1)
+        self._wav.setsampwidth(2)
+        self._wav.setframerate(SAMPLE_RATE)
+
+    def feed(self, samples):
+        self._wav.writeframes(samples.tobytes())
+
+    def finish(self):
+        self._wav.close()
+        result = openai.audio.transcriptions.create(
+            model=self.model, file=("utterance.wav", self._buffer.getvalue(), "audio/wav"))
+        return result.text
+
+
+class LocalTextToSpeech:
+    """
+    Stand-in synthesizer: a quiet tone lasting about as long as the text would take to say.
+
+    Args:
+        seconds_per_char (float): Speech length per character of text
+        delay (float): Seconds before the first chunk, to simulate a remote service
+    """
+
+    sample_rate = TTS_SAMPLE_RATE
+
+    def __init__(self, seconds_per_char=0.06, delay=0.0, chunk_seconds=0.1):
+        self.seconds_per_char = seconds_per_char
+        self.delay = delay
+        self.chunk = int(chunk_seconds * self.sample_rate)
+
+    def stream(self, text):
+        time.sleep(self.delay)
+        total = int(len(text) * self.seconds_per_char * self.sample_rate)
+        for start in range(0, total, self.chunk):
+            t = np.arange(start, min(start + self.chunk, total)) / self.sample_rate
+            yield (np.sin(2 * np.pi * 220 * t) * 3000).astype(np.int16)
+
+
+class OpenAITextToSpeech:
+    """Streams speech from OpenAI's speech endpoint as raw 24 kHz PCM."""
+
+    sample_rate = TTS_SAMPLE_RATE
+
+    def __init__(self, voice="alloy", model=TTS_MODEL):
+        self.voice = voice
+        self.model = model
+
+    def stream(self, text):
+        with openai.audio.speech.with_streaming_response.create(
+                model=self.model, voice=self.voice, input=text, response_format="pcm") as response:
+            carry = b""
+            for data in response.iter_bytes(chunk_size=TTS_CHUNK_BYTES):
+                data = carry + data
+                usable = len(data) - len(data) % 2
+                carry = data[usable:]
+                if usable:
+                    yield np.frombuffer(data[:usable], dtype=np.int16)
+
+
+def make_speech_to_text(name):
+    """Create the speech-to-text backend called `name` ("openai" or "local")."""
+    if name == OPENAI:
+        return OpenAISpeechToText()
+    if name == LOCAL:
+        return LocalSpeechToText()
+    raise ValueError(f"Unknown speech-to-text backend {name!r}")
+
+
+def make_text_to_speech(name, voice="alloy"):
+    """Create the text-to-speech backend called `name` ("openai" or "local")."""
+    if name == OPENAI:
+        return OpenAITextToSpeech(voice)
+    if name == LOCAL:
+        return LocalTextToSpeech()
+    raise ValueError(f"Unknown text-to-speech backend {name!r}")
+
+
+class SpokenReply:
+    """
+    A patient reply being spoken as its text streams in.
+
+    Text is cut into sentences, and each complete sentence is queued for
+    synthesis right away, so speech starts before the reply has finished.
+    """
+
+    def __init__(self, session, ended_at):
+        self._session = session
+        self._ended_at = ended_at
+        self._text = ""
+        self._first = True
+        self.cancelled = False
+
+    def feed(self, text):
+        """Add the next piece of reply text."""
+        self._text += text
+        *sentences, self._text = SENTENCE_END.split(self._text)
+        for sentence in sentences:
+            self._say(sentence)
+
+    def close(self):
+        """Speak whatever is left of the reply."""
+        if self._text.strip():
+            self._say(self._text)
+        self._text = ""
+
+    def cancel(self):
+        """Stop speaking the reply, e.g. because the turn failed partway through."""
+        self.cancelled = True
+        self._text = ""
+        self._session.playback.clear()
+
+    def _say(self, sentence):
+        if self.cancelled:
+            # Talked over, or the turn failed; the rest of the reply's text is only shown
+            return
+        # Only the reply's first sentence counts towards end-of-speech to first-audio latency
+        self._session._speech.put((self, sentence, self._ended_at if self._first else None))
+        self._first = False
+
+
+class VoiceSession:
+    """
+    One student's voice interview: capture, end-pointing, transcription and playback.
+
+    process_frame() runs on the WebRTC thread for every incoming frame. It only
+    copies the frame into preallocated buffers, runs the detector over it and
+    fills the outgoing frame from the playback buffer. Transcription and
+    synthesis happen on the session's own worker threads.
+
+    Finished transcripts arrive on `utterances`. reply() returns a SpokenReply
+    to stream the patient's answer into.
+    """
+
+    def __init__(self, stt, tts, latency_target=None, on_latency=None):
+        self.stt = stt
+        self.tts = tts
+        self.latency_target = latency_target
+        self.on_latency = on_latency
+        self.utterances = queue.SimpleQueue()
+        self.capture = RingBuffer(int(CAPTURE_SECONDS * SAMPLE_RATE))
+        self.playback = PlaybackBuffer(int(PLAYBACK_SECONDS * 48000))
+        self.vad = VoiceActivityDetector()
+        self._downmix = Downmixer()
+        self._vad_frame = np.zeros(int(VAD_FRAME_SECONDS * SAMPLE_RATE), dtype=np.float32)
+        self._play_frame = np.zeros(MAX_FRAME_SAMPLES, dtype=np.int16)
+        self._vad_pos = 0
+        self._utterance_start = None
+        self._sent = 0
+        self.output_rate = 48000
+        self._events = queue.SimpleQueue()
+        self._speech = queue.SimpleQueue()
+        self._speaking = None
+        self._closed = False
+        self.last_active = time.monotonic()
+        self.frames = 0
+        self.cpu_seconds = 0.0
+        self.audio_seconds = 0.0
+        self.utterance_count = 0
+        self.latencies = deque(maxlen=LATENCY_HISTORY)
+        self.errors = 0
+        self._transcriber = threading.Thread(target=self._transcribe_forever, name="voice-stt", daemon=True)
+        self._speaker = threading.Thread(target=self._speak_forever, name="voice-tts", daemon=True)
+        self._transcriber.start()
+        self._speaker.start()
+
+    def process_frame(self, frame):
+        """
+        WebRTC audio callback: take in the microphone frame and return the frame to play back.
+
+        Args:
+            frame (av.AudioFrame): Interleaved 16-bit microphone audio
+
+        Returns:
+            av.AudioFrame: Patient speech (or silence) in the same format
+        """
+        import av
+
+        channels = len(frame.layout.channels)
+        pcm = np.frombuffer(frame.planes[0], dtype=np.int16)[:frame.samples * channels]
+        out = av.AudioFrame(format="s16", layout=frame.layout.name, samples=frame.samples)
+        out.sample_rate = frame.sample_rate
+        out.pts = frame.pts
+        out.time_base = frame.time_base
+        out_pcm = np.frombuffer(out.planes[0], dtype=np.int16)[:frame.samples * channels]
+        self.process_pcm(pcm, channels, frame.sample_rate, out_pcm)
+        return out
+
+    def process_pcm(self, pcm, channels, rate, out):
+        """
+        Handle one frame of interleaved int16 audio, writing the playback frame into `out`.
+
+        Args:
+            pcm (ndarray): Microphone samples
+            channels (int): Channels in `pcm` and `out`
+            rate (int): Sample rate of both
+            out (ndarray): Same shape as `pcm`; receives the patient's speech
+        """
+        started = time.perf_counter()
+        self.output_rate = rate
+        self.last_active = time.monotonic()
+        self.capture.write(self._downmix.process(pcm, channels, rate))
+        self._detect()
+
+        samples = len(out) // channels
+        play = self._play_frame[:samples]
+        self.playback.read_into(play)
+        out.reshape(samples, channels)[:] = play[:, None]
+
+        self.frames += 1
+        self.audio_seconds += samples / rate
+        self.cpu_seconds += time.perf_counter() - started
+
+    def _detect(self):
+        frame_len = len(self._vad_frame)
+        while self.capture.written - self._vad_pos >= frame_len:
+            event = self.vad.update(self.capture.read(self._vad_pos, self._vad_pos + frame_len, self._vad_frame))
+            self._vad_pos += frame_len
+            if event == "start":
+                # Barge-in: the student talking over the patient stops the patient
+                self.interrupt()
+                lead = int(PREROLL_SECONDS * SAMPLE_RATE) + self.vad.start_frames * frame_len
+                start = max(self._vad_pos - lead, self.capture.written - self.capture.capacity, 0)
+                self._utterance_start = self._sent = start
+                self._events.put(("start",))
+            elif self._utterance_start is not None:
+                too_long = self._vad_pos - self._utterance_start >= MAX_UTTERANCE_SECONDS * SAMPLE_RATE
+                if event == "end" or too_long or self._vad_pos - self._sent >= STT_CHUNK_SECONDS * SAMPLE_RATE:
+                    self._events.put(("audio", self.capture.read(self._sent, self._vad_pos)))
+                    self._sent = self._vad_pos
+                if event == "end" or too_long:
+                    seconds = (self._vad_pos - self._utterance_start) / SAMPLE_RATE
+                    self._events.put(("end", time.monotonic(), seconds))
+                    self._utterance_start = None
+                    if too_long:
+                        self.vad.speaking = False
+
+    def reply(self, ended_at):
+        """Start speaking a patient reply to the utterance that ended at `ended_at`."""
+        self._speaking = SpokenReply(self, ended_at)
+        return self._speaking
+
+    def interrupt(self):
+        """Stop the patient mid-reply: cancel the reply, drop its unspoken sentences and what is queued to play."""
+        reply = self._speaking
+        if reply is not None:
+            # The speaker stops the synthesis in flight at its next chunk
+            reply.cancelled = True
+        try:
+            while True:
+                if self._speech.get_nowait() is None:
+                    # close() was called; keep the stop signal for the speaker
+                    self._speech.put(None)
+                    break
+        except queue.Empty:
+            pass
+        self.playback.clear()
+
+    def close(self):
+        """Stop the worker threads."""
+        self._closed = True
+        self._events.put(None)
+        self._speech.put(None)
+
+    def _transcribe_forever(self):
+        transcription = None
+        while True:
+            event = self._events.get()
+            if event is None:
+                return
+            try:
+                if event[0] == "start":
+                    transcription = self.stt.open()
+                elif event[0] == "audio" and transcription is not None:
+                    # Chunks go to the transcriber while the student is still talking
+                    transcription.feed((event[1] * 32767).astype(np.int16))
+                elif event[0] == "end" and transcription is not None:
+                    _, ended_at, seconds = event
+                    text = transcription.finish().strip()
+                    transcription = None
+                    self.utterance_count += 1
+                    if text:
+                        self.utterances.put(Utterance(text, ended_at, seconds))
+            except Exception as e:
+                transcription = None
+                self.errors += 1
+                logger.exception("Speech-to-text failed")
+                self.utterances.put(Utterance(None, time.monotonic(), 0.0, error=str(e)))
+
+    def _speak_forever(self):
+        while True:
+            item = self._speech.get()
+            if item is None:
+                return
+            reply, sentence, ended_at = item
+            if reply.cancelled:
+                continue
+            stream = self.tts.stream(sentence)
+            try:
+                for chunk in stream:
+                    if self._closed:
+                        return
+                    if reply.cancelled:
+                        # A chunk written while the reply was being cancelled mustn't play either
+                        self.playback.clear()
+                        break
+                    self.playback.write(resample(chunk, self.tts.sample_rate, self.output_rate), timeout=5)
+                    if ended_at is not None:
+                        latency = time.monotonic() - ended_at
+                        self.latencies.append(latency)
+                        if self.on_latency is not None:
+                            self.on_latency(latency)
+                        ended_at = None
+            except Exception:
+                self.errors += 1
+                logger.exception("Text-to-speech failed")
+            finally:
+                # Ends the synthesis request rather than letting it run on unread
+                stream.close()
+
+    def stats(self):
+        """Return frame, CPU, utterance and latency figures for this session."""
+        latencies = sorted(self.latencies)
+        return {
+            "frames": self.frames,
+            "audio_seconds": self.audio_seconds,
+            "cpu_share": self.cpu_seconds / self.audio_seconds if self.audio_seconds else 0.0,
+            "utterances": self.utterance_count,
+            "first_audio_p50": latencies[len(latencies) // 2] if latencies else None,
+            "first_audio_max": latencies[-1] if latencies else None,
+            "over_target": sum(1 for latency in latencies
+                               if self.latency_target is not None and latency > self.latency_target),
+            "errors": self.errors,
+        }
+
+
+class VoiceSessionRegistry:
+    """
+    Process-wide set of open voice sessions, capped so voice CPU stays bounded.
+
+    Sessions that have had no audio for `idle_timeout` seconds (a closed tab, a
+    stopped microphone) are closed to make room.
+    """
+
+    def __init__(self, max_sessions, idle_timeout=VOICE_IDLE_TIMEOUT):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self.refused = 0
+
+    def open(self, key, factory):
+        """
+        Return the voice session for `key`, creating it with factory() if there is room.
+
+        Returns:
+            VoiceSession: The session, or None if every slot is taken
+        """
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is not None:
+                return session
+            now = time.monotonic()
+            for idle_key, idle in list(self._sessions.items()):
+                if now - idle.last_active > self.idle_timeout:
+                    idle.close()
+                    del self._sessions[idle_key]
+            if len(self._sessions) >= self.max_sessions:
+                self.refused += 1
+                return None
+            session = self._sessions[key] = factory()
+            return session
+
+    def close(self, key):
+        """Close and forget the voice session for `key`, if any."""
+        with self._lock:
+            session = self._sessions.pop(key, None)
+        if session is not None:
+            session.close()
+
+    def stats(self):
+        """Return session counts and the CPU share and latency of the busiest sessions."""
+        with self._lock:
+            sessions = list(self._sessions.values())
+        per_session = [session.stats() for session in sessions]
+        return {
+            "sessions": len(sessions),
+            "max_sessions": self.max_sessions,
+            "refused": self.refused,
+            "max_cpu_share": max((s["cpu_share"] for s in per_session), default=0.0),
+            "first_audio_max": max((s["first_audio_max"] for s in per_session
+                                    if s["first_audio_max"] is not None), default=None),
+        }